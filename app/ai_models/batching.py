@@ -0,0 +1,139 @@
+"""
+Micro-batching
+
+Gom các request đồng thời trong một cửa sổ thời gian ngắn thành một batch duy nhất
+để chạy model, rồi trả kết quả riêng cho từng request.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+
+class MicroBatcher:
+    """Dynamic micro-batching scheduler backed by a single worker thread"""
+
+    def __init__(
+        self,
+        name: str,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int,
+        max_wait_ms: float
+    ):
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue: "queue.Queue[Optional[Tuple[Any, Future, float]]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+
+        self._batches = 0
+        self._items = 0
+        self._total_queue_wait_s = 0.0
+        self._max_queue_wait_s = 0.0
+        self._total_batch_time_s = 0.0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            with self._start_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(
+                        target=self._run,
+                        name=f"{self.name}-batcher",
+                        daemon=True
+                    )
+                    self._worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Đưa một item vào hàng đợi, trả về Future sẽ nhận kết quả của riêng item đó"""
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def _collect_batch(self) -> Optional[List[Tuple[Any, Future, float]]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            queue_waits = [started - enqueued for _, _, enqueued in batch]
+
+            try:
+                results = self.process_batch([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name} batch returned {len(results)} results for {len(batch)} items"
+                    )
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+
+            self._record(len(batch), queue_waits, time.perf_counter() - started)
+
+    def _record(self, batch_size: int, queue_waits: List[float], batch_time_s: float) -> None:
+        with self._metrics_lock:
+            self._batches += 1
+            self._items += batch_size
+            self._total_queue_wait_s += sum(queue_waits)
+            self._max_queue_wait_s = max(self._max_queue_wait_s, max(queue_waits))
+            self._total_batch_time_s += batch_time_s
+
+    def metrics(self) -> Dict[str, Any]:
+        """Thống kê batch fill ratio, queue wait và thời gian chạy batch"""
+        with self._metrics_lock:
+            batches = self._batches
+            items = self._items
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait_s * 1000, 2),
+                "queue_depth": self._queue.qsize(),
+                "batches": batches,
+                "items": items,
+                "avg_batch_size": round(items / batches, 2) if batches else 0.0,
+                "avg_fill_ratio": round(items / (batches * self.max_batch_size), 3) if batches else 0.0,
+                "avg_queue_wait_ms": round(self._total_queue_wait_s / items * 1000, 2) if items else 0.0,
+                "max_queue_wait_ms": round(self._max_queue_wait_s * 1000, 2),
+                "avg_batch_time_ms": round(self._total_batch_time_s / batches * 1000, 2) if batches else 0.0,
+            }
+
+    def stop(self) -> None:
+        """Dừng worker sau khi xử lý hết các item đang chờ"""
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        self._worker = None
@@ -1,13 +1,24 @@
+from concurrent.futures import Future
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import math
+import threading
+import time
 import cv2
+import numpy as np
 import easyocr
+from easyocr.recognition import get_text
+from easyocr.utils import get_image_list, reformat_input
 import torch
 import torch.nn as nn
 from torchvision import models
-from PIL import Image
+from PIL import Image, ImageOps
 import torchvision.transforms as T
 from loguru import logger
 from app.config import settings
+from app.ai_models.bill_preprocess import get_profile, preprocess_for_ocr
+from app.ai_models.batching import MicroBatcher
+from app.ai_models.bill_onnx import load_onnx_classifier, run_onnx_classifier
 import io
 
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
@@ -46,69 +57,468 @@ else:
 
 loaded_model = base_model.to(device)
 
+# Không có checkpoint thì network chỉ có trọng số ngẫu nhiên: gate phải bỏ qua thay vì phân loại
+_checkpoint_loaded = False
 try:
     checkpoint = torch.load(MODEL_PATH, map_location=device)
     loaded_model.load_state_dict(checkpoint['model_state_dict'])
     loaded_model.eval()
+    _checkpoint_loaded = True
 except Exception as e:
     logger.error(f"Error loading bill classifier model: {e}")
 
-THRESHOLD = 0.85
+CLASSIFIER_INPUT_SIZE = 224
 transform_inference = T.Compose([
+    T.Resize((CLASSIFIER_INPUT_SIZE, CLASSIFIER_INPUT_SIZE)),
     T.ToTensor(),
     T.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
 ])
 
 ocr_reader = easyocr.Reader(['en', 'vi'])
 
+_gate_metrics_lock = threading.Lock()
+_gate_metrics = {
+    "checks": 0,
+    "rejections": 0,
+    "skipped": 0,
+    "total_latency_ms": 0.0,
+    "max_latency_ms": 0.0,
+}
+
+_onnx_classifier = None
+_onnx_classifier_lock = threading.Lock()
+_onnx_missing_logged = False
+
+def get_onnx_classifier():
+    """
+    Get the int8 ONNX Runtime session of the classifier (Singleton).
+    File ONNX phải được export trước bằng scripts/export_bill_classifier_onnx.py (static QDQ).
+    """
+    global _onnx_classifier
+
+    if _onnx_classifier is None:
+        with _onnx_classifier_lock:
+            if _onnx_classifier is None:
+                onnx_path = Path(settings.BILL_CLASSIFIER_ONNX_PATH)
+                if not onnx_path.exists():
+                    raise FileNotFoundError(
+                        f"Bill classifier ONNX file not found: {onnx_path}. "
+                        "Export it with: python -m scripts.export_bill_classifier_onnx --calibration-dir DIR"
+                    )
+                _onnx_classifier = load_onnx_classifier(onnx_path, settings.BILL_CLASSIFIER_ONNX_THREADS)
+                logger.success(f"Bill classifier loaded with ONNX Runtime from {onnx_path}")
+    return _onnx_classifier
+
+def _gate_backend() -> Optional[str]:
+    """
+    Backend thực sự dùng cho gate: onnx nếu được cấu hình và file đã export, nếu không thì
+    pytorch khi checkpoint đã load; None khi không có classifier đã train nào
+    """
+    global _onnx_missing_logged
+
+    if settings.BILL_CLASSIFIER_BACKEND == "onnx":
+        if Path(settings.BILL_CLASSIFIER_ONNX_PATH).exists():
+            return "onnx"
+        if not _onnx_missing_logged:
+            _onnx_missing_logged = True
+            logger.error(
+                f"BILL_CLASSIFIER_BACKEND=onnx but {settings.BILL_CLASSIFIER_ONNX_PATH} does not exist, "
+                "falling back to PyTorch. Run scripts/export_bill_classifier_onnx.py"
+            )
+    return "pytorch" if _checkpoint_loaded else None
+
+def _classifier_logits(batch: torch.Tensor, backend: Optional[str] = None) -> np.ndarray:
+    """Chạy classifier trên batch (N, 3, H, W) đã normalize, trả về logit shape (N,)"""
+    backend = backend or _gate_backend() or "pytorch"
+
+    if backend == "onnx":
+        return run_onnx_classifier(get_onnx_classifier(), batch.numpy())
+
+    with torch.inference_mode():
+        return loaded_model(batch.to(device)).float().cpu().numpy().reshape(-1)
+
 def is_bill_model_ready() -> bool:
-    """Kiểm tra xem model có load thành công và inference được không"""
-    if loaded_model is None:
+    """
+    Kiểm tra EasyOCR và backend gate thực sự dùng (_gate_backend). Không có classifier đã train
+    thì gate được bỏ qua (fail open) nên không chặn startup
+    """
+    if ocr_reader is None:
         return False
+
+    backend = _gate_backend()
+    if backend is None:
+        logger.warning("No trained bill classifier available (checkpoint not loaded), bill gate will be skipped")
+        return True
+
     try:
-        dummy = torch.zeros(1, 3, 224, 224).to(device)
+        dummy = torch.zeros(1, 3, CLASSIFIER_INPUT_SIZE, CLASSIFIER_INPUT_SIZE)
         loaded_model.eval()
-        with torch.no_grad():
-            _ = loaded_model(dummy)
+        _classifier_logits(dummy, backend)
         return True
-    except Exception:
+    except Exception as e:
+        logger.error(f"Bill classifier ({backend}) not ready: {e}")
         return False
 
-def is_bill(file_bytes: bytes) -> bool:
-    """Classify image bytes to determine if it's a valid bill/invoice"""
-    img_pil = Image.open(io.BytesIO(file_bytes)).convert('RGB')
-    img_tensor = transform_inference(img_pil).unsqueeze(0).to(device)
+def _load_classifier_image(image: Union[bytes, np.ndarray]) -> Image.Image:
+    """
+    Chuẩn bị ảnh ở độ phân giải vừa đủ cho classifier: ndarray BGR đã decode được thu nhỏ
+    trực tiếp, bytes JPEG được giải mã thu nhỏ bằng draft mode
+    """
+    if isinstance(image, np.ndarray):
+        small = cv2.resize(image, (CLASSIFIER_INPUT_SIZE, CLASSIFIER_INPUT_SIZE), interpolation=cv2.INTER_AREA)
+        return Image.fromarray(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
 
-    loaded_model.eval()
-    with torch.no_grad():
-        output_logit = loaded_model(img_tensor)
-        P_NOT_BILL = torch.sigmoid(output_logit).item()
-        P_BILL = 1 - P_NOT_BILL
+    img_pil = Image.open(io.BytesIO(image))
+    img_pil.draft('RGB', (CLASSIFIER_INPUT_SIZE * 2, CLASSIFIER_INPUT_SIZE * 2))
+    return img_pil.convert('RGB')
 
-    return P_BILL >= THRESHOLD or (P_BILL > P_NOT_BILL)
+def predict_bill_probabilities(
+    images: Sequence[Union[bytes, np.ndarray]],
+    backend: Optional[str] = None
+) -> List[float]:
+    """Return the probability that each image is a bill/invoice, in one batched forward pass"""
+    if not images:
+        return []
+
+    batch = torch.stack([transform_inference(_load_classifier_image(image)) for image in images])
+    p_not_bill = 1.0 / (1.0 + np.exp(-_classifier_logits(batch, backend)))
+
+    return [float(1 - p) for p in p_not_bill]
+
+def predict_bill_probability(image: Union[bytes, np.ndarray], backend: Optional[str] = None) -> float:
+    """Return the probability that the image is a bill/invoice"""
+    return predict_bill_probabilities([image], backend)[0]
+
+def is_bill(image: Union[bytes, np.ndarray], threshold: Optional[float] = None) -> bool:
+    """Classify image bytes or a decoded BGR ndarray to determine if it's a valid bill/invoice"""
+    return is_any_bill([image], threshold)
+
+def is_any_bill(images: Sequence[Union[bytes, np.ndarray]], threshold: Optional[float] = None) -> bool:
+    """
+    Batched gate for a document made of several photos: accepted if at least one image is a bill
+    (các phần giữa của hóa đơn dài có thể không giống một hóa đơn hoàn chỉnh)
+    """
+    threshold = settings.BILL_CLASSIFIER_THRESHOLD if threshold is None else threshold
+
+    backend = _gate_backend()
+    if backend is None:
+        # Fail open: không chặn hóa đơn thật bằng một network chưa được train
+        with _gate_metrics_lock:
+            _gate_metrics["skipped"] += 1
+        logger.warning("Bill gate skipped: classifier checkpoint is not loaded")
+        return True
+
+    start = time.perf_counter()
+    p_bill = max(predict_bill_probabilities(images, backend))
+    latency_ms = (time.perf_counter() - start) * 1000
+    accepted = p_bill >= threshold
+
+    with _gate_metrics_lock:
+        _gate_metrics["checks"] += 1
+        _gate_metrics["rejections"] += 0 if accepted else 1
+        _gate_metrics["total_latency_ms"] += latency_ms
+        _gate_metrics["max_latency_ms"] = max(_gate_metrics["max_latency_ms"], latency_ms)
+
+    logger.info(f"Bill gate: p_bill={p_bill:.3f}, accepted={accepted}, latency={latency_ms:.1f}ms")
+    return accepted
+
+def get_bill_gate_metrics() -> Dict[str, Any]:
+    """Thống kê latency và tỉ lệ từ chối của bill classifier gate"""
+    backend = _gate_backend()
+    if not settings.BILL_GATE_ENABLED:
+        gate = "disabled"
+    else:
+        gate = "active" if backend is not None else "skipped"
+
+    with _gate_metrics_lock:
+        checks = _gate_metrics["checks"]
+        return {
+            "enabled": settings.BILL_GATE_ENABLED,
+            "gate": gate,
+            "backend": backend,
+            "threshold": settings.BILL_CLASSIFIER_THRESHOLD,
+            "checkpoint_loaded": _checkpoint_loaded,
+            "checks": checks,
+            "rejections": _gate_metrics["rejections"],
+            "skipped": _gate_metrics["skipped"],
+            "avg_latency_ms": round(_gate_metrics["total_latency_ms"] / checks, 2) if checks else 0.0,
+            "max_latency_ms": round(_gate_metrics["max_latency_ms"], 2),
+        }
+
+_EXIF_ORIENTATION_TAG = 0x0112
+
+def _apply_exif_orientation(img: np.ndarray, orientation: int) -> np.ndarray:
+    """Xoay/lật ảnh theo EXIF orientation (tương đương PIL.ImageOps.exif_transpose)"""
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(img), -1)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+def decode_image(file_bytes: bytes) -> np.ndarray:
+    """
+    Decode image bytes in memory into a BGR ndarray with EXIF orientation normalised.
+    Định dạng OpenCV không hỗ trợ (ví dụ GIF) được decode qua PIL.
+    """
+    img = cv2.imdecode(
+        np.frombuffer(file_bytes, dtype=np.uint8),
+        cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+    )
 
-# Hàm trích xuất OCR
-def extract_bill_using_ocr_model(file_path: str) -> str:
-    """Extract text from bill image using EasyOCR"""
-    img = cv2.imread(file_path)
     if img is None:
-        raise FileNotFoundError(f"Không tìm thấy file: {file_path}")
+        try:
+            img_pil = ImageOps.exif_transpose(Image.open(io.BytesIO(file_bytes))).convert('RGB')
+        except Exception:
+            raise ValueError("Không thể đọc được file hình ảnh")
+        return cv2.cvtColor(np.asarray(img_pil), cv2.COLOR_RGB2BGR)
 
-    results = ocr_reader.readtext(img)
+    try:
+        # Chỉ đọc header, không decode lại pixel
+        orientation = Image.open(io.BytesIO(file_bytes)).getexif().get(_EXIF_ORIENTATION_TAG, 1)
+    except Exception:
+        orientation = 1
+    return _apply_exif_orientation(img, orientation)
 
-    extracted_texts = []
-    LINE_COLOR = (0, 255, 0)
-    THICKNESS = 2
+def encode_image_for_vision(
+    image: np.ndarray,
+    max_side: Optional[int] = None,
+    jpeg_quality: Optional[int] = None
+) -> bytes:
+    """
+    Downscale a decoded BGR bill image so its longest side fits max_side, then JPEG-encode it
+    for the Bedrock vision mode (ảnh lớn hơn không giúp Claude đọc tốt hơn mà tốn token)
+    """
+    max_side = max_side or settings.BILL_VISION_MAX_SIDE
+    jpeg_quality = jpeg_quality or settings.BILL_VISION_JPEG_QUALITY
+
+    scale = max_side / max(image.shape[:2])
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+    if not ok:
+        raise ValueError("Không thể nén hình ảnh hóa đơn")
+    return encoded.tobytes()
 
+def load_pdf_pages(content: bytes, dpi: Optional[int] = None, max_pages: Optional[int] = None) -> List[Union[str, np.ndarray]]:
+    """
+    Load every page of a PDF for OCR: trang có text layer trả về text, trang scan được
+    rasterize thành ảnh BGR ở `dpi`. Cần PyMuPDF (import khi dùng tới).
+    """
+    import fitz
+
+    dpi = dpi or settings.BILL_PDF_DPI
+    max_pages = max_pages or settings.BILL_DOCUMENT_MAX_PAGES
+
+    try:
+        document = fitz.open(stream=content, filetype="pdf")
+    except Exception:
+        raise ValueError("Không thể đọc được file PDF")
+
+    with document:
+        if document.page_count > max_pages:
+            raise ValueError(f"PDF có {document.page_count} trang, tối đa {max_pages} trang")
+
+        pages: List[Union[str, np.ndarray]] = []
+        for page in document:
+            text = page.get_text().strip()
+            if len(text) >= 20:
+                pages.append(text)
+                continue
+
+            pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+            rgb = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(pixmap.height, pixmap.width, 3)
+            pages.append(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+        return pages
+
+# Chiều cao crop chuẩn của recognizer EasyOCR (imgH)
+RECOGNITION_HEIGHT = 64
+
+_ocr_batcher: Optional[MicroBatcher] = None
+_ocr_batcher_lock = threading.Lock()
+_ocr_metrics_lock = threading.Lock()
+_ocr_metrics = {
+    "detections": 0,
+    "total_detection_ms": 0.0,
+    "recognition_calls": 0,
+    "crops": 0,
+    "total_recognition_ms": 0.0,
+}
+
+def _format_ocr_results(results: List[Tuple[Any, str, float]]) -> List[Dict[str, Any]]:
+    extracted_texts = []
     for (bbox, text, prob) in results:
         top_left = tuple([int(val) for val in bbox[0]])
         bottom_right = tuple([int(val) for val in bbox[2]])
-        cv2.rectangle(img, top_left, bottom_right, LINE_COLOR, THICKNESS)
 
         extracted_texts.append({
             "text": text,
             "confidence": float(prob),
             "bbox": [top_left, bottom_right]
         })
-
     return extracted_texts
+
+def detect_text_regions(
+    image: Union[bytes, np.ndarray],
+    profile: Optional[str] = None
+) -> List[Tuple[Any, np.ndarray]]:
+    """
+    Detection stage: preprocess + CRAFT detector, then cut every text box into a
+    grey crop of height RECOGNITION_HEIGHT ready for the recognizer.
+    """
+    img = decode_image(image) if isinstance(image, (bytes, bytearray)) else image
+
+    ocr_profile = get_profile(profile or settings.OCR_PREPROCESS_PROFILE)
+    img = preprocess_for_ocr(img, ocr_profile)
+    img, img_cv_grey = reformat_input(img)
+
+    start = time.perf_counter()
+    horizontal_list, free_list = ocr_reader.detect(
+        img,
+        canvas_size=ocr_profile.canvas_size,
+        mag_ratio=ocr_profile.mag_ratio,
+        reformat=False
+    )
+    image_list, _ = get_image_list(
+        horizontal_list[0], free_list[0], img_cv_grey, model_height=RECOGNITION_HEIGHT
+    )
+    detection_ms = (time.perf_counter() - start) * 1000
+
+    with _ocr_metrics_lock:
+        _ocr_metrics["detections"] += 1
+        _ocr_metrics["total_detection_ms"] += detection_ms
+
+    return image_list
+
+def _recognize_batch(requests: List[List[Tuple[Any, np.ndarray]]]) -> List[List[Dict[str, Any]]]:
+    """
+    Recognition stage cho nhiều request cùng lúc: gom crop của tất cả request, sắp theo
+    chiều rộng để mỗi sub-batch padding ít nhất, rồi trả kết quả về đúng request
+    """
+    flat = [
+        (request_index, crop_index, item)
+        for request_index, image_list in enumerate(requests)
+        for crop_index, item in enumerate(image_list)
+    ]
+    flat.sort(key=lambda entry: entry[2][1].shape[1])
+
+    results: List[List[Any]] = [[None] * len(image_list) for image_list in requests]
+    ignore_char = ''.join(set(ocr_reader.character) - set(ocr_reader.lang_char))
+    batch_size = settings.OCR_RECOGNITION_BATCH_SIZE
+
+    start = time.perf_counter()
+    for offset in range(0, len(flat), batch_size):
+        chunk = flat[offset:offset + batch_size]
+        image_list = [item for _, _, item in chunk]
+        max_ratio = max(crop.shape[1] / crop.shape[0] for _, crop in image_list)
+
+        # Cùng tham số mặc định với easyocr.Reader.recognize (easyocr==1.7.2)
+        recognized = get_text(
+            character=ocr_reader.character,
+            imgH=RECOGNITION_HEIGHT,
+            imgW=int(math.ceil(max_ratio) * RECOGNITION_HEIGHT),
+            recognizer=ocr_reader.recognizer,
+            converter=ocr_reader.converter,
+            image_list=image_list,
+            ignore_char=ignore_char,
+            decoder='greedy',
+            beamWidth=5,
+            batch_size=len(image_list),
+            contrast_ths=0.1,
+            adjust_contrast=0.5,
+            filter_ths=0.003,
+            workers=0,
+            device=ocr_reader.device
+        )
+        for (request_index, crop_index, _), result in zip(chunk, recognized):
+            results[request_index][crop_index] = result
+
+        with _ocr_metrics_lock:
+            _ocr_metrics["recognition_calls"] += 1
+            _ocr_metrics["crops"] += len(chunk)
+
+    with _ocr_metrics_lock:
+        _ocr_metrics["total_recognition_ms"] += (time.perf_counter() - start) * 1000
+
+    return [_format_ocr_results(request_results) for request_results in results]
+
+def get_ocr_batcher() -> MicroBatcher:
+    """Get the cross-request recognition batcher (Singleton)"""
+    global _ocr_batcher
+
+    if _ocr_batcher is None:
+        with _ocr_batcher_lock:
+            if _ocr_batcher is None:
+                _ocr_batcher = MicroBatcher(
+                    name="ocr",
+                    process_batch=_recognize_batch,
+                    max_batch_size=settings.OCR_BATCH_MAX_REQUESTS,
+                    max_wait_ms=settings.OCR_BATCH_MAX_WAIT_MS
+                )
+    return _ocr_batcher
+
+def submit_recognition(image_list: List[Tuple[Any, np.ndarray]]) -> Future:
+    """
+    Queue the crops of one receipt for batched recognition.
+    Returns a Future resolving to the OCR result of this receipt only.
+    """
+    if not image_list:
+        future: Future = Future()
+        future.set_result([])
+        return future
+    return get_ocr_batcher().submit(image_list)
+
+def get_ocr_metrics() -> Dict[str, Any]:
+    """Thống kê latency detection/recognition và kích thước batch của OCR worker"""
+    with _ocr_metrics_lock:
+        detections = _ocr_metrics["detections"]
+        calls = _ocr_metrics["recognition_calls"]
+        crops = _ocr_metrics["crops"]
+        metrics = {
+            "enabled": settings.OCR_BATCH_ENABLED,
+            "detections": detections,
+            "avg_detection_ms": round(_ocr_metrics["total_detection_ms"] / detections, 2) if detections else 0.0,
+            "recognition_calls": calls,
+            "crops": crops,
+            "avg_crops_per_call": round(crops / calls, 2) if calls else 0.0,
+            "avg_recognition_ms_per_crop": round(_ocr_metrics["total_recognition_ms"] / crops, 2) if crops else 0.0,
+        }
+    metrics["requests"] = get_ocr_batcher().metrics()
+    return metrics
+
+# Hàm trích xuất OCR
+def extract_bill_using_ocr_model(
+    image: Union[bytes, np.ndarray],
+    profile: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Extract text from bill image (encoded bytes or decoded BGR ndarray) using EasyOCR.
+    Ảnh được tiền xử lý theo profile (mặc định settings.OCR_PREPROCESS_PROFILE),
+    bbox trả về theo tọa độ của ảnh đã tiền xử lý.
+    Khi OCR_BATCH_ENABLED, recognition đi qua batcher chung (hàm này block tới khi có kết quả;
+    code async nên gọi detect_text_regions + submit_recognition để không giữ thread).
+    """
+    if settings.OCR_BATCH_ENABLED:
+        return submit_recognition(detect_text_regions(image, profile)).result()
+
+    img = decode_image(image) if isinstance(image, (bytes, bytearray)) else image
+
+    ocr_profile = get_profile(profile or settings.OCR_PREPROCESS_PROFILE)
+    img = preprocess_for_ocr(img, ocr_profile)
+
+    if ocr_profile.enabled:
+        results = ocr_reader.readtext(img, canvas_size=ocr_profile.canvas_size, mag_ratio=ocr_profile.mag_ratio)
+    else:
+        results = ocr_reader.readtext(img)
+
+    return _format_ocr_results(results)
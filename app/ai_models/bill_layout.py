@@ -0,0 +1,117 @@
+"""
+OCR Layout
+
+Dựng lại các dòng của hóa đơn từ output EasyOCR: gom box theo hàng (chồng lấn theo trục y),
+sắp xếp trái sang phải và gộp mỗi hàng thành một dòng gọn "mô tả | SL | thành tiền".
+Fragment có confidence thấp bị loại bỏ để prompt gửi Bedrock ngắn và sạch hơn.
+"""
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Sequence
+
+# Hai box cùng hàng nếu tâm lệch nhau không quá tỉ lệ này của chiều cao box thấp hơn
+_ROW_CENTER_TOLERANCE = 0.5
+# Khoảng trống lớn hơn tỉ lệ này của chiều cao chữ được coi là ranh giới cột
+_COLUMN_GAP_RATIO = 1.5
+_COLUMN_SEPARATOR = " | "
+# Số dòng tối đa bị trùng giữa hai ảnh chụp nối tiếp của cùng một hóa đơn dài
+_MAX_OVERLAP_LINES = 12
+_OVERLAP_LINE_SIMILARITY = 0.8
+
+
+def _box_geometry(entry: Dict[str, Any]) -> Optional[Dict[str, float]]:
+    try:
+        (x0, y0), (x1, y1) = entry["bbox"][0], entry["bbox"][1]
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+    x0, x1 = sorted((float(x0), float(x1)))
+    y0, y1 = sorted((float(y0), float(y1)))
+    return {"x0": x0, "x1": x1, "yc": (y0 + y1) / 2, "h": max(1.0, y1 - y0)}
+
+
+def _is_noise(text: str) -> bool:
+    # Fragment không có chữ/số nào (ví dụ "|", "..", "-") chỉ tốn token
+    return not re.search(r"\w", text)
+
+
+def group_rows(ocr_output: List[Dict[str, Any]], min_confidence: float = 0.0) -> List[List[Dict[str, Any]]]:
+    """
+    Group OCR fragments into rows ordered top to bottom, each row ordered left to right.
+    Fragment không có bbox (không biết vị trí) được đặt sau tất cả các hàng có bbox, theo thứ
+    tự xuất hiện, mỗi fragment một hàng.
+    """
+    boxes, unplaced = [], []
+    for entry in ocr_output:
+        if not isinstance(entry, dict) or "text" not in entry:
+            continue
+        text = " ".join(str(entry["text"]).split())
+        if not text or _is_noise(text) or float(entry.get("confidence", 1.0)) < min_confidence:
+            continue
+
+        geometry = _box_geometry(entry)
+        if geometry is None:
+            unplaced.append([{"text": text}])
+        else:
+            boxes.append({"text": text, **geometry})
+
+    boxes.sort(key=lambda box: box["yc"])
+    box_rows: List[List[Dict[str, Any]]] = []
+    for box in boxes:
+        if box_rows:
+            row = box_rows[-1]
+            row_yc = sum(item["yc"] for item in row) / len(row)
+            row_h = sorted(item["h"] for item in row)[len(row) // 2]
+            if abs(box["yc"] - row_yc) <= _ROW_CENTER_TOLERANCE * min(box["h"], row_h):
+                row.append(box)
+                continue
+        box_rows.append([box])
+
+    return [sorted(row, key=lambda box: box["x0"]) for row in box_rows] + unplaced
+
+
+def _render_row(row: List[Dict[str, Any]]) -> str:
+    parts = [row[0]["text"]]
+    for previous, current in zip(row, row[1:]):
+        gap = current.get("x0", 0.0) - previous.get("x1", 0.0)
+        char_height = min(previous.get("h", 1.0), current.get("h", 1.0))
+        separator = _COLUMN_SEPARATOR if gap > _COLUMN_GAP_RATIO * char_height else " "
+        parts.append(separator + current["text"])
+    return "".join(parts)
+
+
+def ocr_to_layout_text(ocr_output: List[Dict[str, Any]], min_confidence: float = 0.0) -> str:
+    """Convert EasyOCR output into compact layout-ordered lines for the LLM prompt"""
+    return "\n".join(_render_row(row) for row in group_rows(ocr_output, min_confidence))
+
+
+def _normalize_line(line: str) -> str:
+    return " ".join(line.replace(_COLUMN_SEPARATOR, " ").lower().split())
+
+
+def _overlap_length(previous: List[str], current: List[str]) -> int:
+    """Số dòng cuối của trang trước lặp lại ở đầu trang sau (so khớp gần đúng vì OCR hai ảnh khác nhau)"""
+    for length in range(min(_MAX_OVERLAP_LINES, len(previous), len(current)), 0, -1):
+        pairs = zip(previous[-length:], current[:length])
+        if all(
+            SequenceMatcher(None, _normalize_line(a), _normalize_line(b)).ratio() >= _OVERLAP_LINE_SIMILARITY
+            for a, b in pairs
+        ):
+            return length
+    return 0
+
+
+def stitch_pages(page_texts: Sequence[str], continuous: Sequence[bool]) -> str:
+    """
+    Stitch per-page text of one document in order.
+    Trang có continuous=True là phần tiếp theo của ảnh trước (hóa đơn dài chụp nhiều lần):
+    được nối liền và bỏ các dòng trùng ở chỗ nối. Các trang khác được đánh dấu số trang.
+    """
+    lines: List[str] = []
+    for index, (text, is_continuation) in enumerate(zip(page_texts, continuous)):
+        page_lines = [line for line in text.splitlines() if line.strip()]
+        if index > 0 and is_continuation:
+            page_lines = page_lines[_overlap_length(lines, page_lines):]
+        elif len(page_texts) > 1:
+            lines.append(f"--- Trang {index + 1} ---")
+        lines.extend(page_lines)
+    return "\n".join(lines)
@@ -0,0 +1,109 @@
+"""
+ONNX Runtime backend cho bill classifier
+
+Export MobileNetV2/EfficientNet-B0 classifier sang ONNX (batch dimension động), lượng tử hóa
+int8 bằng static quantization (QDQ, per-channel, cần ảnh calibration) và load lại bằng ONNX
+Runtime. Không dùng dynamic quantization: với CNN nó sinh ConvInteger, trên CPU thường chậm
+hơn float32 và kém chính xác hơn.
+"""
+import copy
+import tempfile
+from pathlib import Path
+from typing import Any, Iterable, Optional, Union
+import numpy as np
+from loguru import logger
+
+INPUT_NAME = "input"
+OUTPUT_NAME = "logit"
+
+
+class _CalibrationReader:
+    """CalibrationDataReader cho onnxruntime.quantization.quantize_static"""
+
+    def __init__(self, batches: Iterable[np.ndarray]):
+        self._batches = iter(batches)
+
+    def get_next(self) -> Optional[dict]:
+        batch = next(self._batches, None)
+        return None if batch is None else {INPUT_NAME: batch.astype(np.float32)}
+
+
+def export_quantized_classifier(
+    model: Any,
+    output_path: Union[str, Path],
+    input_size: int,
+    calibration_batches: Iterable[np.ndarray]
+) -> Path:
+    """
+    Export a PyTorch bill classifier to int8 ONNX.
+
+    Args:
+        model: torch.nn.Module đã load checkpoint
+        output_path: Đường dẫn file .onnx int8
+        input_size: Kích thước ảnh đầu vào của classifier
+        calibration_batches: Các batch (N, 3, H, W) đã normalize dùng cho static quantization
+
+    Returns:
+        Path: File ONNX đã lượng tử hóa
+    """
+    import torch
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    if calibration_batches is None:
+        raise ValueError("calibration_batches is required for static int8 quantization")
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Export bản sao trên CPU để không đụng tới model đang phục vụ request
+    export_model = copy.deepcopy(model).cpu().eval()
+    dummy = torch.zeros(1, 3, input_size, input_size)
+
+    with tempfile.TemporaryDirectory(prefix="bill_classifier_onnx_") as tmp_dir:
+        fp32_path = Path(tmp_dir) / "bill_classifier_fp32.onnx"
+        logger.info("Exporting bill classifier to ONNX...")
+        torch.onnx.export(
+            export_model,
+            dummy,
+            str(fp32_path),
+            input_names=[INPUT_NAME],
+            output_names=[OUTPUT_NAME],
+            dynamic_axes={INPUT_NAME: {0: "batch"}, OUTPUT_NAME: {0: "batch"}},
+            opset_version=17
+        )
+
+        logger.info("Quantizing bill classifier to int8 (static, per-channel)...")
+        quantize_static(
+            str(fp32_path),
+            str(output_path),
+            _CalibrationReader(calibration_batches),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8
+        )
+
+    logger.success(f"Quantized bill classifier saved to {output_path}")
+    return output_path
+
+
+def load_onnx_classifier(model_path: Union[str, Path], num_threads: int = 0) -> Any:
+    """Tạo InferenceSession (CPU) cho classifier int8"""
+    import onnxruntime
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads > 0:
+        session_options.intra_op_num_threads = num_threads
+
+    return onnxruntime.InferenceSession(
+        str(model_path),
+        sess_options=session_options,
+        providers=["CPUExecutionProvider"]
+    )
+
+
+def run_onnx_classifier(session: Any, batch: np.ndarray) -> np.ndarray:
+    """Chạy classifier trên batch (N, 3, H, W) float32, trả về logit shape (N,)"""
+    logits = session.run([OUTPUT_NAME], {INPUT_NAME: np.ascontiguousarray(batch, dtype=np.float32)})[0]
+    return logits.reshape(-1)
@@ -0,0 +1,183 @@
+"""
+OCR Preprocessing
+
+Chuẩn bị ảnh hóa đơn chụp bằng điện thoại trước khi đưa vào EasyOCR: crop vùng hóa đơn,
+chỉnh nghiêng, thu nhỏ về chiều cao chữ mục tiêu và (tùy chọn) nhị phân hóa.
+Chi phí CRAFT detector tăng theo số pixel nên thu nhỏ ảnh là bước tiết kiệm nhiều nhất.
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+import cv2
+import numpy as np
+from loguru import logger
+
+# Ảnh phân tích (crop, chiều cao chữ, góc nghiêng) được thu nhỏ về cạnh dài này cho nhanh
+_ANALYSIS_MAX_SIDE = 1000
+
+
+@dataclass(frozen=True)
+class OcrPreprocessProfile:
+    """Quality/speed profile for the OCR preprocessing stage"""
+    name: str
+    enabled: bool = True
+    target_text_height: int = 24
+    max_side: int = 1600
+    max_upscale: float = 1.5
+    crop: bool = True
+    deskew: bool = True
+    binarize: bool = False
+    canvas_size: int = 2560
+    mag_ratio: float = 1.0
+
+
+OCR_PREPROCESS_PROFILES: Dict[str, OcrPreprocessProfile] = {
+    "none": OcrPreprocessProfile(name="none", enabled=False),
+    "fast": OcrPreprocessProfile(
+        name="fast", target_text_height=18, max_side=1280, deskew=False, canvas_size=1280
+    ),
+    "balanced": OcrPreprocessProfile(
+        name="balanced", target_text_height=24, max_side=1600, canvas_size=1600
+    ),
+    "quality": OcrPreprocessProfile(
+        name="quality", target_text_height=32, max_side=2560, binarize=True, canvas_size=2560
+    ),
+}
+
+
+def get_profile(name: str) -> OcrPreprocessProfile:
+    """Lấy profile theo tên, báo lỗi nếu không tồn tại"""
+    try:
+        return OCR_PREPROCESS_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown OCR preprocess profile: {name}")
+
+
+def _analysis_view(gray: np.ndarray) -> Tuple[np.ndarray, float]:
+    scale = min(1.0, _ANALYSIS_MAX_SIDE / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return gray, scale
+
+
+def _text_mask(gray: np.ndarray) -> np.ndarray:
+    return cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 25, 15
+    )
+
+
+def find_receipt_region(gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Tìm bounding box (x, y, w, h) của tờ hóa đơn: vùng sáng lớn nhất chiếm 15-98% ảnh.
+    Trả về None nếu không tìm thấy (ví dụ ảnh đã được crop sát).
+    """
+    small, scale = _analysis_view(gray)
+    blurred = cv2.GaussianBlur(small, (5, 5), 0)
+    _, paper = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    paper = cv2.morphologyEx(paper, cv2.MORPH_CLOSE, np.ones((15, 15), np.uint8))
+
+    contours, _ = cv2.findContours(paper, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+
+    largest = max(contours, key=cv2.contourArea)
+    area_ratio = cv2.contourArea(largest) / float(small.shape[0] * small.shape[1])
+    if not 0.15 <= area_ratio <= 0.98:
+        return None
+
+    x, y, w, h = cv2.boundingRect(largest)
+    margin = int(0.02 * max(w, h))
+    x, y = max(0, x - margin), max(0, y - margin)
+    w = min(small.shape[1] - x, w + 2 * margin)
+    h = min(small.shape[0] - y, h + 2 * margin)
+    return int(x / scale), int(y / scale), int(w / scale), int(h / scale)
+
+
+def _row_profile_sharpness(mask: np.ndarray) -> float:
+    # Dòng chữ nằm ngang cho histogram theo hàng có phương sai lớn nhất
+    return float(np.var(mask.sum(axis=1, dtype=np.float64)))
+
+
+def estimate_skew_angle(gray: np.ndarray) -> float:
+    """
+    Góc (độ) cần xoay để khối chữ nằm ngang. Độ lớn lấy từ minAreaRect của các pixel chữ,
+    chiều xoay được chọn bằng projection profile nên không phụ thuộc quy ước góc của OpenCV.
+    """
+    small, _ = _analysis_view(gray)
+    mask = _text_mask(small)
+    points = cv2.findNonZero(mask)
+    if points is None or len(points) < 50:
+        return 0.0
+
+    angle = cv2.minAreaRect(points)[-1] % 90
+    if angle > 45:
+        angle -= 90
+    if abs(angle) < 0.5:
+        return 0.0
+
+    return max((angle, -angle), key=lambda a: _row_profile_sharpness(_rotate(mask, a)))
+
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """Chiều cao chữ trung vị (pixel) ước lượng từ connected components của ảnh nhị phân"""
+    small, scale = _analysis_view(gray)
+    n_labels, _, stats, _ = cv2.connectedComponentsWithStats(_text_mask(small), connectivity=8)
+    if n_labels <= 1:
+        return None
+
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    max_height = small.shape[0] / 8
+    is_glyph = (heights >= 4) & (heights <= max_height) & (widths <= heights * 4) & (widths >= 1)
+    if is_glyph.sum() < 10:
+        return None
+
+    return float(np.median(heights[is_glyph])) / scale
+
+
+def _rotate(image: np.ndarray, angle: float) -> np.ndarray:
+    h, w = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(image, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def preprocess_for_ocr(image: np.ndarray, profile: OcrPreprocessProfile) -> np.ndarray:
+    """
+    Apply the preprocessing stage to a decoded BGR receipt photo.
+    Nếu một bước bị lỗi, trả về ảnh gốc (không phải ảnh đã biến đổi dở dang).
+    """
+    if not profile.enabled:
+        return image
+
+    original = image
+    try:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+        if profile.crop:
+            region = find_receipt_region(gray)
+            if region is not None:
+                x, y, w, h = region
+                image, gray = image[y:y + h, x:x + w], gray[y:y + h, x:x + w]
+
+        if profile.deskew:
+            angle = estimate_skew_angle(gray)
+            if 0.5 <= abs(angle) <= 15:
+                image, gray = _rotate(image, angle), _rotate(gray, angle)
+
+        text_height = estimate_text_height(gray)
+        scale = profile.target_text_height / text_height if text_height else 1.0
+        scale = min(scale, profile.max_upscale, profile.max_side / max(gray.shape[:2]))
+        if abs(scale - 1.0) > 0.05:
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=interpolation)
+
+        if profile.binarize:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+            image = cv2.adaptiveThreshold(
+                gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15
+            )
+
+        return np.ascontiguousarray(image)
+
+    except Exception as e:
+        logger.warning(f"OCR preprocessing ({profile.name}) failed, using original image: {e}")
+        return original
@@ -0,0 +1,128 @@
+"""
+Voice Activity Detection
+
+Energy-based VAD chạy trên CPU: loại bỏ các đoạn im lặng (đầu, cuối và giữa)
+trước khi đưa audio vào PhoWhisper.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import settings
+
+# Ngưỡng không bao giờ vượt quá frame lớn nhất trừ đi khoảng này, để audio
+# toàn tiếng nói (không có noise floor thật) không bị cắt nhầm
+_PEAK_HEADROOM_DB = 25.0
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "requests": 0,
+    "input_seconds": 0.0,
+    "removed_seconds": 0.0,
+}
+
+
+def _frame_energy_db(audio: np.ndarray, frame_size: int) -> np.ndarray:
+    n_frames = len(audio) // frame_size
+    frames = audio[:n_frames * frame_size].reshape(n_frames, frame_size)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def detect_speech_segments(
+    audio: np.ndarray,
+    sample_rate: int = 16000,
+    frame_ms: int = 30,
+    threshold_db: Optional[float] = None,
+    padding_ms: Optional[int] = None,
+    min_silence_ms: Optional[int] = None
+) -> List[Tuple[int, int]]:
+    """
+    Trả về danh sách (start, end) theo sample của các đoạn có tiếng nói.
+
+    Một frame được coi là tiếng nói khi năng lượng của nó cao hơn noise floor
+    (percentile thấp của năng lượng các frame) ít nhất `threshold_db`.
+    Các đoạn cách nhau ít hơn `min_silence_ms` được gộp lại và mỗi đoạn
+    được nới thêm `padding_ms` ở hai đầu.
+    """
+    threshold_db = settings.VAD_THRESHOLD_DB if threshold_db is None else threshold_db
+    padding_ms = settings.VAD_PADDING_MS if padding_ms is None else padding_ms
+    min_silence_ms = settings.VAD_MIN_SILENCE_MS if min_silence_ms is None else min_silence_ms
+
+    frame_size = max(1, int(sample_rate * frame_ms / 1000))
+    if len(audio) < frame_size:
+        return [(0, len(audio))] if len(audio) else []
+
+    energy_db = _frame_energy_db(audio, frame_size)
+    noise_floor = np.percentile(energy_db, 10)
+    speech_threshold = min(noise_floor + threshold_db, energy_db.max() - _PEAK_HEADROOM_DB)
+    speech_threshold = max(speech_threshold, settings.VAD_MIN_SPEECH_DB)
+    is_speech = energy_db > speech_threshold
+
+    if not is_speech.any():
+        return []
+
+    padding_frames = int(np.ceil(padding_ms / frame_ms))
+    min_silence_frames = int(np.ceil(min_silence_ms / frame_ms))
+
+    segments: List[Tuple[int, int]] = []
+    speech_frames = np.flatnonzero(is_speech)
+    seg_start = seg_end = speech_frames[0]
+    for frame in speech_frames[1:]:
+        if frame - seg_end > min_silence_frames:
+            segments.append((seg_start, seg_end))
+            seg_start = frame
+        seg_end = frame
+    segments.append((seg_start, seg_end))
+
+    n_frames = len(energy_db)
+    sample_segments: List[Tuple[int, int]] = []
+    for start, end in segments:
+        start = max(0, start - padding_frames) * frame_size
+        end = min(n_frames, end + 1 + padding_frames) * frame_size
+        if end >= n_frames * frame_size:
+            end = len(audio)
+        if sample_segments and start <= sample_segments[-1][1]:
+            sample_segments[-1] = (sample_segments[-1][0], end)
+        else:
+            sample_segments.append((start, end))
+    return sample_segments
+
+
+def trim_silence(audio: np.ndarray, sample_rate: int = 16000) -> Tuple[np.ndarray, float]:
+    """
+    Drop non-speech regions and concatenate the speech segments.
+    Returns the trimmed audio and the number of seconds removed.
+    """
+    if not settings.VAD_ENABLED or audio.size == 0:
+        return audio, 0.0
+
+    segments = detect_speech_segments(audio, sample_rate)
+    if not segments:
+        trimmed = audio[:0]
+    elif len(segments) == 1:
+        trimmed = audio[segments[0][0]:segments[0][1]]
+    else:
+        trimmed = np.concatenate([audio[start:end] for start, end in segments])
+
+    input_seconds = len(audio) / sample_rate
+    removed_seconds = (len(audio) - len(trimmed)) / sample_rate
+
+    with _metrics_lock:
+        _metrics["requests"] += 1
+        _metrics["input_seconds"] += input_seconds
+        _metrics["removed_seconds"] += removed_seconds
+
+    return trimmed, removed_seconds
+
+
+def get_vad_metrics() -> Dict[str, Any]:
+    """Thống kê tổng số giây im lặng đã loại bỏ trước ASR"""
+    with _metrics_lock:
+        input_seconds = _metrics["input_seconds"]
+        return {
+            "enabled": settings.VAD_ENABLED,
+            "requests": _metrics["requests"],
+            "input_seconds": round(input_seconds, 2),
+            "removed_seconds": round(_metrics["removed_seconds"], 2),
+            "removed_ratio": round(_metrics["removed_seconds"] / input_seconds, 3) if input_seconds else 0.0,
+        }
@@ -1,65 +1,250 @@
-from transformers import pipeline
+from transformers import AutoModelForSpeechSeq2Seq, pipeline
 import torch
-from typing import Optional
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
 import threading
+from difflib import SequenceMatcher
 from loguru import logger
+from app.config import settings
+from app.ai_models.batching import MicroBatcher
+
+DEFAULT_MODEL_NAME = "vinai/PhoWhisper-small"
 
 _model_lock = threading.Lock()
 _transcriber = None
+_transcriber_model_name: Optional[str] = None
+_assistant_model = None
+_batcher: Optional[MicroBatcher] = None
+
+def _load_pytorch_transcriber(model_name: str, device: Optional[str] = None):
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+                    
+    model_kwargs = {
+        "low_cpu_mem_usage": True
+    }
+
+    if device == "cuda":
+        model_kwargs["torch_dtype"] = torch.float16
+    else:
+        model_kwargs["torch_dtype"] = torch.float32 
+
+    try:
+        return pipeline(
+            "automatic-speech-recognition",
+            model=model_name,
+            device=device,
+            model_kwargs=model_kwargs 
+        )
+    except Exception as e:
+        logger.error(f"Error loading model: {str(e)}")
+        raise e
+
+def _load_onnx_transcriber(model_name: str):
+    try:
+        from app.ai_models.voice_onnx import load_onnx_transcriber
+        return load_onnx_transcriber(
+            model_name=model_name,
+            model_dir=settings.ASR_ONNX_DIR,
+            num_threads=settings.ASR_ONNX_THREADS
+        )
+    except Exception as e:
+        logger.error(f"Error loading ONNX model: {str(e)}")
+        raise e
+
+def _load_assistant_model(assistant_name: str, transcriber):
+    """Load the smaller Whisper-family draft model on the same device/dtype as the main model"""
+    main_model = transcriber.model
+    try:
+        assistant = AutoModelForSpeechSeq2Seq.from_pretrained(
+            assistant_name,
+            torch_dtype=main_model.dtype,
+            low_cpu_mem_usage=True
+        )
+        assistant.to(main_model.device)
+        assistant.eval()
+        return assistant
+    except Exception as e:
+        logger.error(f"Error loading assistant model: {str(e)}")
+        raise e
 
-def get_transcriber(model_name: str = "vinai/PhoWhisper-small", device: Optional[str] = None):
-    """Get PhoWhisper transcriber instance (Singleton and Thread-safe initialization)"""
-    global _transcriber
+def get_transcriber(model_name: str = DEFAULT_MODEL_NAME, device: Optional[str] = None):
+    """
+    Get PhoWhisper transcriber instance (Singleton and Thread-safe initialization).
+    Backend được chọn qua settings.ASR_BACKEND: "pytorch" (float32/float16) hoặc "onnx" (int8, CPU).
+    """
+    global _transcriber, _transcriber_model_name, _assistant_model
     
     if _transcriber is None:
         with _model_lock:
             if _transcriber is None:
-                if device is None:
-                    device = "cuda" if torch.cuda.is_available() else "cpu"
-                                
-                model_kwargs = {
-                    "low_cpu_mem_usage": True
-                }
-
-                if device == "cuda":
-                    model_kwargs["torch_dtype"] = torch.float16
+                if settings.ASR_BACKEND == "onnx":
+                    if settings.ASR_ASSISTANT_MODEL:
+                        logger.warning("ASR_ASSISTANT_MODEL is ignored with the onnx backend")
+                    _transcriber = _load_onnx_transcriber(model_name)
+                    _transcriber_model_name = f"{model_name}@onnx-int8"
                 else:
-                    model_kwargs["torch_dtype"] = torch.float32 
-
-                try:
-                    _transcriber = pipeline(
-                        "automatic-speech-recognition",
-                        model=model_name,
-                        device=device,
-                        model_kwargs=model_kwargs 
-                    )
-
-                except Exception as e:
-                    logger.error(f"Error loading model: {str(e)}")
-                    raise e
+                    transcriber = _load_pytorch_transcriber(model_name, device)
+                    if settings.ASR_ASSISTANT_MODEL:
+                        _assistant_model = _load_assistant_model(settings.ASR_ASSISTANT_MODEL, transcriber)
+                    _transcriber = transcriber
+                    _transcriber_model_name = model_name
     
     return _transcriber
 
+def _assistant_enabled() -> bool:
+    return bool(settings.ASR_ASSISTANT_MODEL) and settings.ASR_BACKEND == "pytorch"
+
 def is_transcriber_ready() -> bool:
-    """Kiểm tra xem transcriber đã được tải chưa"""
-    return _transcriber is not None
+    """Kiểm tra xem transcriber (và draft model nếu bật speculative decoding) đã được tải chưa"""
+    if _transcriber is None:
+        return False
+    return _assistant_model is not None or not _assistant_enabled()
+
+def get_transcriber_status() -> Dict[str, Any]:
+    """Trạng thái model chính và draft model dùng cho health check"""
+    return {
+        "backend": settings.ASR_BACKEND,
+        "model": get_transcriber_model_id(),
+        "model_ready": _transcriber is not None,
+        "assistant_model": settings.ASR_ASSISTANT_MODEL if _assistant_enabled() else None,
+        "assistant_ready": _assistant_model is not None,
+        "ready": is_transcriber_ready(),
+    }
+
+def get_transcriber_model_id() -> str:
+    """Identifier of the loaded ASR model, used to key cached transcripts"""
+    return _transcriber_model_name or DEFAULT_MODEL_NAME
+
+def _extract_text(result: Any) -> str:
+    if isinstance(result, dict):
+        return result.get("text", "")
+    if isinstance(result, list) and len(result) > 0:
+        return result[0].get("text", "") if isinstance(result[0], dict) else ""
+    return ""
+
+def _transcribe_batch(inputs: List[Any]) -> List[str]:
+    """Run one padded forward pass of the pipeline over clips from concurrent requests"""
+    transcriber = get_transcriber()
+    if _assistant_model is not None:
+        # Assisted generation chỉ hỗ trợ batch size 1: draft model đề xuất token,
+        # PhoWhisper xác nhận bằng greedy decoding nên transcript không thay đổi
+        results = transcriber(
+            inputs,
+            batch_size=1,
+            generate_kwargs={"assistant_model": _assistant_model}
+        )
+    else:
+        results = transcriber(inputs, batch_size=len(inputs))
+    return [_extract_text(result) for result in results]
+
+def get_transcription_batcher() -> MicroBatcher:
+    """Get the micro-batching scheduler in front of the transcriber (Singleton)"""
+    global _batcher
+
+    if _batcher is None:
+        with _model_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(
+                    name="asr",
+                    process_batch=_transcribe_batch,
+                    max_batch_size=settings.ASR_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.ASR_BATCH_MAX_WAIT_MS
+                )
+    return _batcher
+
+def get_transcription_metrics() -> Dict[str, Any]:
+    """Thống kê batching của transcriber (fill ratio, queue wait)"""
+    return get_transcription_batcher().metrics()
 
-def transcribe_audio_file(wav_file_path: str, model_name: str = "vinai/PhoWhisper-small") -> dict:
+def submit_transcription(audio: Any) -> Future:
     """
-    Transcribe audio file using PhoWhisper model
+    Queue audio for batched transcription.
+    Returns a Future resolving to the transcript text of this clip only.
+    """
+    return get_transcription_batcher().submit(audio)
+
+def split_audio_windows(
+    audio: np.ndarray,
+    sample_rate: int = 16000,
+    chunk_length_s: Optional[float] = None,
+    stride_s: Optional[float] = None
+) -> List[np.ndarray]:
+    """
+    Split long audio into overlapping windows (views, không copy dữ liệu).
+    Audio ngắn hơn một window được trả về nguyên vẹn.
+    """
+    chunk_length_s = chunk_length_s or settings.ASR_CHUNK_LENGTH_S
+    stride_s = settings.ASR_CHUNK_STRIDE_S if stride_s is None else stride_s
+
+    window = int(chunk_length_s * sample_rate)
+    overlap = min(int(stride_s * sample_rate), window // 2)
+    if len(audio) <= window:
+        return [audio]
+
+    step = window - overlap
+    return [audio[start:start + window] for start in range(0, len(audio) - overlap, step)]
+
+def _normalize_word(word: str) -> str:
+    return word.strip(".,!?;:\"'()").lower()
+
+def merge_chunk_transcripts(texts: List[str], max_overlap_words: Optional[int] = None) -> str:
+    """
+    Merge transcripts of overlapping windows.
+    The tail of each text is aligned with the head of the next one and the words
+    heard twice in the overlap are kept only once.
+    """
+    if max_overlap_words is None:
+        max_overlap_words = max(4, int(settings.ASR_CHUNK_STRIDE_S * 4))
+
+    merged: List[str] = []
+    for text in texts:
+        words = text.split()
+        if not words:
+            continue
+        if not merged:
+            merged = words
+            continue
+
+        tail_start = max(0, len(merged) - max_overlap_words)
+        tail = [_normalize_word(w) for w in merged[tail_start:]]
+        head = [_normalize_word(w) for w in words[:max_overlap_words]]
+
+        match = SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+        if match.size >= 2 or (match.size == 1 and match.a == len(tail) - 1 and match.b == 0):
+            merged = merged[:tail_start + match.a] + words[match.b:]
+        else:
+            merged = merged + words
+
+    return " ".join(merged)
+
+def submit_chunked_transcription(audio: np.ndarray, sample_rate: int = 16000) -> List[Future]:
+    """
+    Queue every window of a (possibly long) clip at once so the batcher decodes
+    them together. Returns one Future per window, in order.
+    """
+    return [
+        submit_transcription({"raw": window, "sampling_rate": sample_rate})
+        for window in split_audio_windows(audio, sample_rate)
+    ]
+
+def transcribe_audio_file(
+    audio: Union[str, np.ndarray],
+    model_name: str = DEFAULT_MODEL_NAME,
+    sample_rate: int = 16000
+) -> dict:
+    """
+    Transcribe audio using PhoWhisper model.
+    Accepts a file path or decoded mono float32 samples at `sample_rate`.
     """
     try:
-        transcriber = get_transcriber(model_name=model_name)
-        
-        with _model_lock:
-            result = transcriber(wav_file_path, batch_size=1)
-        
-        if isinstance(result, dict):
-            text = result.get("text", "")
-        elif isinstance(result, list) and len(result) > 0:
-            text = result[0].get("text", "") if isinstance(result[0], dict) else ""
+        get_transcriber(model_name=model_name)
+        if isinstance(audio, np.ndarray):
+            futures = submit_chunked_transcription(audio, sample_rate)
+            text = merge_chunk_transcripts([future.result() for future in futures])
         else:
-            text = ""
+            text = submit_transcription(audio).result()
         
         return {
             "text": text,
@@ -68,4 +253,4 @@ def transcribe_audio_file(wav_file_path: str, model_name: str = "vinai/PhoWhispe
         
     except Exception as e:
         logger.error(f"CRITICAL ERROR in transcribe: {str(e)}")
-        raise Exception(f"Lỗi khi transcribe audio: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Lỗi khi transcribe audio: {str(e)}")
@@ -0,0 +1,106 @@
+"""
+ONNX Runtime backend cho PhoWhisper
+
+Export encoder/decoder của PhoWhisper sang ONNX, lượng tử hóa int8 (dynamic quantization)
+và load lại bằng ONNX Runtime. Model trả về tương thích với transformers pipeline nên
+dùng chung được `transcribe_audio_file` và micro-batcher.
+"""
+import platform
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Union
+from loguru import logger
+
+QUANTIZED_SUFFIX = "_quantized"
+
+
+def _quantization_config():
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return AutoQuantizationConfig.arm64(is_static=False, per_channel=False)
+    return AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+
+
+def export_quantized_whisper(model_name: str, output_dir: Union[str, Path]) -> Path:
+    """
+    Export a Whisper-family model to ONNX and apply int8 dynamic quantization.
+
+    Args:
+        model_name: HF model id, ví dụ "vinai/PhoWhisper-small"
+        output_dir: Thư mục lưu các file *_quantized.onnx cùng config và processor
+
+    Returns:
+        Path: Thư mục chứa model đã lượng tử hóa
+    """
+    from optimum.onnxruntime import ORTModelForSpeechSeq2Seq, ORTQuantizer
+    from transformers import AutoProcessor
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(prefix="phowhisper_onnx_") as fp32_dir:
+        logger.info(f"Exporting {model_name} to ONNX...")
+        model = ORTModelForSpeechSeq2Seq.from_pretrained(model_name, export=True)
+        model.save_pretrained(fp32_dir)
+
+        quantization_config = _quantization_config()
+        for onnx_file in sorted(Path(fp32_dir).glob("*.onnx")):
+            logger.info(f"Quantizing {onnx_file.name} to int8...")
+            quantizer = ORTQuantizer.from_pretrained(fp32_dir, file_name=onnx_file.name)
+            quantizer.quantize(save_dir=output_dir, quantization_config=quantization_config)
+
+        for extra_file in Path(fp32_dir).glob("*.json"):
+            if not (output_dir / extra_file.name).exists():
+                shutil.copy(extra_file, output_dir / extra_file.name)
+
+    AutoProcessor.from_pretrained(model_name).save_pretrained(output_dir)
+    logger.success(f"Quantized ONNX model saved to {output_dir}")
+    return output_dir
+
+
+def _file_names(model_dir: Path) -> Dict[str, str]:
+    names = {
+        "encoder_file_name": f"encoder_model{QUANTIZED_SUFFIX}.onnx",
+        "decoder_file_name": f"decoder_model{QUANTIZED_SUFFIX}.onnx",
+        "decoder_with_past_file_name": f"decoder_with_past_model{QUANTIZED_SUFFIX}.onnx",
+    }
+    return {key: name for key, name in names.items() if (model_dir / name).exists()}
+
+
+def load_onnx_transcriber(model_name: str, model_dir: Union[str, Path], num_threads: int = 0) -> Any:
+    """
+    Build an ASR pipeline backed by the int8 ONNX model.
+    Model phải được export trước bằng scripts/export_phowhisper_onnx.py.
+    """
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+    from transformers import AutoProcessor, pipeline
+
+    model_dir = Path(model_dir)
+    if not (model_dir / f"encoder_model{QUANTIZED_SUFFIX}.onnx").exists():
+        raise FileNotFoundError(
+            f"PhoWhisper ONNX model not found in {model_dir}. "
+            f"Export it with: python -m scripts.export_phowhisper_onnx --model {model_name} --output {model_dir}"
+        )
+
+    session_options = onnxruntime.SessionOptions()
+    session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads > 0:
+        session_options.intra_op_num_threads = num_threads
+
+    model = ORTModelForSpeechSeq2Seq.from_pretrained(
+        model_dir,
+        provider="CPUExecutionProvider",
+        session_options=session_options,
+        **_file_names(model_dir)
+    )
+    processor = AutoProcessor.from_pretrained(model_dir)
+
+    return pipeline(
+        "automatic-speech-recognition",
+        model=model,
+        tokenizer=processor.tokenizer,
+        feature_extractor=processor.feature_extractor
+    )
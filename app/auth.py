@@ -1,4 +1,5 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Depends, HTTPException, WebSocket, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 from jwt.algorithms import RSAAlgorithm
@@ -22,27 +23,48 @@ async def get_jwks():
 # Security
 security = HTTPBearer()
 
+async def decode_token(token: str) -> dict:
+    """Xác thực JWT của Cognito và trả về payload"""
+    jwks = await get_jwks()
+    unverified_header = jwt.get_unverified_header(token)
+    kid = unverified_header['kid']
+    key_data = next(k for k in jwks['keys'] if k['kid'] == kid)
+    public_key = RSAAlgorithm.from_jwk(key_data)
+
+    return jwt.decode(
+        token,
+        key=public_key,
+        algorithms=[key_data['alg']],
+        audience=settings.APP_CLIENT_ID
+    )
+
 async def verify_jwt(token: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        jwks = await get_jwks()
-        unverified_header = jwt.get_unverified_header(token.credentials)
-        kid = unverified_header['kid']
-        key_data = next(k for k in jwks['keys'] if k['kid'] == kid)
-        public_key = RSAAlgorithm.from_jwk(key_data)
-
-        payload = jwt.decode(
-            token.credentials,
-            key=public_key,
-            algorithms=[key_data['alg']],
-            audience=settings.APP_CLIENT_ID
-        )
-        return payload
+        return await decode_token(token.credentials)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Invalid token: {str(e)}"
         )
 
+async def verify_websocket_jwt(websocket: WebSocket) -> Optional[dict]:
+    """
+    Xác thực WebSocket bằng query param `token` hoặc header `Authorization: Bearer`.
+    Đóng kết nối với code 1008 và trả về None nếu token không hợp lệ.
+    """
+    token = websocket.query_params.get("token")
+    auth_header = websocket.headers.get("authorization", "")
+    if not token and auth_header.lower().startswith("bearer "):
+        token = auth_header[7:]
+
+    try:
+        if not token:
+            raise ValueError("Missing token")
+        return await decode_token(token)
+    except Exception:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return None
+
 async def verify_admin(user = Depends(verify_jwt)):
     """Kiểm tra user có role admin không"""
     role = user.get("custom:role")
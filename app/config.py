@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from loguru import logger
@@ -21,6 +21,19 @@ class Settings(BaseSettings):
 
     BEDROCK_MODEL_ID: str = Field(default="anthropic.claude-3-5-sonnet-20240620-v1:0")
     BEDROCK_TIMEOUT: int = Field(default=60)
+    BEDROCK_CONNECT_TIMEOUT: int = Field(default=5, ge=1, description="Timeout (giây) khi mở kết nối tới Bedrock")
+    BEDROCK_MAX_POOL_CONNECTIONS: int = Field(default=50, ge=1, description="Số connection (và thread) tối đa tới Bedrock dùng chung cho mọi extractor")
+    BEDROCK_MAX_ATTEMPTS: int = Field(default=3, ge=1, description="Số lần thử tối đa cho một lời gọi Bedrock khi bị throttle/lỗi tạm thời")
+    BEDROCK_RETRY_DEADLINE_S: float = Field(default=20.0, gt=0, description="Tổng thời gian (giây) tối đa dành cho retry một lời gọi Bedrock")
+    BEDROCK_BACKOFF_BASE_S: float = Field(default=0.5, gt=0, description="Thời gian chờ (giây) cơ sở của exponential backoff")
+    BEDROCK_BACKOFF_CAP_S: float = Field(default=8.0, gt=0, description="Thời gian chờ (giây) tối đa giữa hai lần retry")
+    BEDROCK_HEDGE_AFTER_S: float = Field(default=0.0, ge=0, description="Gửi thêm một request song song nếu sau số giây này chưa có kết quả (0 = tắt)")
+    BEDROCK_BREAKER_WINDOW: int = Field(default=20, ge=1, description="Số lời gọi gần nhất circuit breaker dùng để tính tỉ lệ lỗi")
+    BEDROCK_BREAKER_MIN_CALLS: int = Field(default=10, ge=1, description="Số lời gọi tối thiểu trong cửa sổ trước khi breaker có thể mở")
+    BEDROCK_BREAKER_FAILURE_RATE: float = Field(default=0.5, gt=0, le=1, description="Tỉ lệ lỗi để circuit breaker mở")
+    BEDROCK_BREAKER_COOLDOWN_S: float = Field(default=30.0, gt=0, description="Thời gian (giây) breaker mở trước khi cho request thăm dò")
+    BEDROCK_PROMPT_CACHE_ENABLED: bool = Field(default=True, description="Đánh dấu system prompt tĩnh để Bedrock cache prefix (prompt caching)")
+    BEDROCK_SINGLE_FLIGHT_ENABLED: bool = Field(default=True, description="Gộp các lời gọi extraction giống hệt nhau đang chạy đồng thời thành một lần gọi Bedrock")
     BEDROCK_TEMPERATURE: float = Field(default=0.0)
     AWS_ACCESS_KEY_ID: Optional[str] = Field(default=None)
     AWS_SECRET_ACCESS_KEY: Optional[str] = Field(default=None)
@@ -32,14 +45,79 @@ class Settings(BaseSettings):
     REGION: str = Field(default="ap-southeast-1") 
 
     MODEL_BILL_FILE_NAME: str = Field(default="pytorch-bill_classifier_v1.pth")
-    
+    BILL_GATE_ENABLED: bool = Field(default=True, description="Chặn ảnh không phải hóa đơn trước khi chạy OCR")
+    BILL_CLASSIFIER_THRESHOLD: float = Field(default=0.5, ge=0, le=1, description="Xác suất tối thiểu để ảnh được coi là hóa đơn")
+    BILL_CLASSIFIER_BACKEND: Literal["pytorch", "onnx"] = Field(default="pytorch", description="Backend chạy bill classifier: pytorch hoặc onnx (int8)")
+    BILL_CLASSIFIER_ONNX_PATH: str = Field(default="app/ai_models/saved_models/bill_classifier_int8.onnx", description="File ONNX int8 của bill classifier")
+    BILL_CLASSIFIER_ONNX_THREADS: int = Field(default=0, ge=0, description="Số thread intra-op của ONNX Runtime cho classifier (0 = mặc định)")
+    OCR_PREPROCESS_PROFILE: Literal["none", "fast", "balanced", "quality"] = Field(default="balanced", description="Profile tiền xử lý ảnh trước OCR: none, fast, balanced hoặc quality")
+    BILL_STRUCTURED_FAST_PATH_ENABLED: bool = Field(default=True, description="Đọc QR code / hóa đơn điện tử trước khi chạy OCR + Bedrock")
+    BILL_LAYOUT_ENABLED: bool = Field(default=True, description="Dựng lại dòng hóa đơn theo layout trước khi gửi Bedrock")
+    OCR_MIN_CONFIDENCE: float = Field(default=0.3, ge=0, le=1, description="Confidence tối thiểu của fragment OCR được gửi cho Bedrock")
+    BILL_EXTRACTION_MODE: Literal["ocr", "vision"] = Field(default="ocr", description="Cách trích xuất hóa đơn mặc định: ocr (EasyOCR + text) hoặc vision (gửi ảnh trực tiếp cho Claude)")
+    BILL_VISION_MAX_SIDE: int = Field(default=1568, ge=256, description="Cạnh dài tối đa (pixel) của ảnh gửi Bedrock ở vision mode")
+    BILL_VISION_JPEG_QUALITY: int = Field(default=85, ge=30, le=100, description="Chất lượng JPEG của ảnh gửi Bedrock ở vision mode")
+    BILL_DOCUMENT_MAX_PAGES: int = Field(default=20, ge=1, description="Số trang/ảnh tối đa của một hóa đơn nhiều trang")
+    BILL_PDF_DPI: int = Field(default=200, ge=72, le=600, description="Độ phân giải (DPI) khi rasterize trang PDF scan để OCR")
+
+    # Bill Cache Configuration
+    BILL_CACHE_ENABLED: bool = Field(default=True, description="Bật/tắt cache OCR + extraction cho ảnh hóa đơn trùng hoặc gần giống")
+    BILL_CACHE_MAX_ENTRIES: int = Field(default=512, ge=1, description="Số hóa đơn tối đa trong LRU cache")
+    BILL_CACHE_MAX_DISTANCE: int = Field(default=8, ge=0, le=256, description="Khoảng cách Hamming tối đa (trên 256 bit) để hai ảnh được coi là cùng hóa đơn (chỉ dùng lại OCR)")
+
+    # Extraction Cache Configuration
+    EXTRACTION_CACHE_ENABLED: bool = Field(default=True, description="Bật/tắt cache kết quả Bedrock extraction (MongoDB) theo transcript / OCR text đã chuẩn hóa")
+    EXTRACTION_CACHE_MAX_ENTRIES: int = Field(default=50000, ge=1, description="Số entry tối đa của extraction cache, entry ít dùng gần đây nhất bị xóa trước")
+    EXTRACTION_CACHE_TTL_HOURS: float = Field(default=720.0, gt=0, description="Thời gian (giờ) sống của một entry extraction cache (TTL index MongoDB)")
+
+    # OCR Micro-batching Configuration
+    OCR_BATCH_ENABLED: bool = Field(default=True, description="Gom crop recognition của nhiều hóa đơn đồng thời thành batch")
+    OCR_BATCH_MAX_REQUESTS: int = Field(default=4, ge=1, description="Số hóa đơn tối đa gom chung một batch recognition")
+    OCR_BATCH_MAX_WAIT_MS: float = Field(default=30.0, ge=0, description="Thời gian (ms) tối đa chờ gom batch OCR")
+    OCR_RECOGNITION_BATCH_SIZE: int = Field(default=32, ge=1, description="Số crop tối đa trong một lần chạy recognizer")
+
     QDRANT_URL: str = Field(default="http://localhost:6333")
     QDRANT_COLLECTION_NAME: str = Field(default="vicobi_collection")
     
     # Rate Limiting Configuration
     RATE_LIMIT_TIMES: int = Field(default=10, description="Số lượng request tối đa")
     RATE_LIMIT_SECONDS: int = Field(default=60, description="Thời gian (giây) để reset rate limit")
-    
+
+    # Execution Pools Configuration
+    INFERENCE_POOL_SIZE: int = Field(default=2, ge=1, description="Số thread tối đa cho model inference (ASR, OCR, classifier)")
+    IO_POOL_SIZE: int = Field(default=16, ge=1, description="Số thread tối đa cho blocking I/O (MongoDB, Qdrant, cache)")
+
+    # ASR Backend Configuration
+    ASR_BACKEND: Literal["pytorch", "onnx"] = Field(default="pytorch", description="Backend chạy PhoWhisper: pytorch hoặc onnx (int8)")
+    ASR_ONNX_DIR: str = Field(default="app/ai_models/saved_models/phowhisper-onnx-int8", description="Thư mục chứa model ONNX int8 đã export")
+    ASR_ONNX_THREADS: int = Field(default=0, ge=0, description="Số thread intra-op của ONNX Runtime (0 = mặc định)")
+    ASR_ASSISTANT_MODEL: Optional[str] = Field(default=None, description="Draft model cho speculative decoding, ví dụ vinai/PhoWhisper-tiny (chỉ backend pytorch)")
+
+    # ASR Micro-batching Configuration
+    ASR_BATCH_MAX_SIZE: int = Field(default=8, ge=1, description="Số clip tối đa trong một batch PhoWhisper")
+    ASR_BATCH_MAX_WAIT_MS: float = Field(default=50.0, ge=0, description="Thời gian (ms) tối đa chờ gom batch")
+    ASR_CHUNK_LENGTH_S: float = Field(default=30.0, gt=0, le=30, description="Độ dài (giây) mỗi window khi transcribe audio dài")
+    ASR_CHUNK_STRIDE_S: float = Field(default=5.0, ge=0, description="Độ dài (giây) phần chồng lấn giữa hai window liên tiếp")
+    ASR_STREAM_INTERVAL_S: float = Field(default=2.0, gt=0, description="Khoảng audio mới (giây) giữa hai lần gửi partial transcript khi streaming")
+    ASR_STREAM_MAX_SECONDS: float = Field(default=600.0, gt=0, description="Thời lượng (giây) tối đa của một stream voice")
+
+    # Voice Batch Processing Configuration
+    VOICE_BATCH_MAX_FILES: int = Field(default=20, ge=1, description="Số file audio tối đa trong một batch request")
+    VOICE_BATCH_EXTRACT_CONCURRENCY: int = Field(default=4, ge=1, description="Số Bedrock extraction chạy song song trong một batch")
+
+    # Voice Activity Detection Configuration
+    VAD_ENABLED: bool = Field(default=True, description="Bật/tắt bước loại bỏ im lặng trước ASR")
+    VAD_THRESHOLD_DB: float = Field(default=15.0, gt=0, description="Mức (dB) trên noise floor để coi là tiếng nói")
+    VAD_MIN_SPEECH_DB: float = Field(default=-55.0, description="Năng lượng (dBFS) tối thiểu của một frame tiếng nói")
+    VAD_PADDING_MS: int = Field(default=200, ge=0, description="Thời gian (ms) giữ lại quanh mỗi đoạn tiếng nói")
+    VAD_MIN_SILENCE_MS: int = Field(default=400, ge=0, description="Khoảng lặng (ms) ngắn nhất bị loại bỏ")
+
+    # Transcript Cache Configuration
+    TRANSCRIPT_CACHE_ENABLED: bool = Field(default=True, description="Bật/tắt cache kết quả transcribe")
+    TRANSCRIPT_CACHE_MAX_ENTRIES: int = Field(default=1024, ge=1, description="Số transcript tối đa trong LRU cache bộ nhớ")
+    TRANSCRIPT_CACHE_DIR: Optional[str] = Field(default=None, description="Thư mục cache trên đĩa (để trống để tắt)")
+    TRANSCRIPT_CACHE_DISK_MAX_MB: int = Field(default=256, ge=1, description="Dung lượng (MB) tối đa của cache trên đĩa")
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -14,6 +14,7 @@ from app.ai_models.voice import get_transcriber
 from app.services.voice_service import VoiceService
 from app.services.bill_service import BillService
 from app.services.chatbot_service import get_chatbot_service_instance
+from app.services.executors import shutdown_executors
 
 ai_services_ready = False
 bedrock_service = None
@@ -50,7 +51,7 @@ async def main_lifespan(app: FastAPI):
             get_transcriber()
             from app.ai_models.voice import is_transcriber_ready
             if not is_transcriber_ready():
-                raise RuntimeError("Failed to load PhoWhisper model")
+                raise RuntimeError("Failed to load PhoWhisper model (or its draft model)")
             
             logger.info("Loading Embedding model for chatbot...")
             from app.ai_models.embeddings import get_embedding_model, is_embedding_model_ready
@@ -60,7 +61,7 @@ async def main_lifespan(app: FastAPI):
             
             from app.ai_models.bill import is_bill_model_ready
             if not is_bill_model_ready():
-                raise RuntimeError("Failed to load Bill classifier model")
+                raise RuntimeError("Failed to load EasyOCR or Bill classifier model")
             logger.info("Bill classifier and EasyOCR ready")
             
             # Auto-initialize context files từ folder context
@@ -82,6 +83,9 @@ async def main_lifespan(app: FastAPI):
         
         logger.info("SHUTDOWN: Cleaning up resources...")
         ai_services_ready = False
+        if bedrock_service is not None:
+            bedrock_service.close()
+        shutdown_executors()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
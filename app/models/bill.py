@@ -30,6 +30,8 @@ class Bill(Document):
 
     processing_time = fields.FloatField(min_value=0)
     tokens_used = fields.IntField(min_value=0)
+    cache_read_tokens = fields.IntField(min_value=0)
+    cache_write_tokens = fields.IntField(min_value=0)
 
     meta = {
         'collection': 'bills',
@@ -69,5 +71,7 @@ class Bill(Document):
             "money_type": self.money_type,
             "utc_time": self.utc_time,
             "processing_time": self.processing_time,
-            "tokens_used": self.tokens_used
+            "tokens_used": self.tokens_used,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens
         }
\ No newline at end of file
@@ -0,0 +1,32 @@
+from mongoengine import Document, fields
+from datetime import datetime, timezone
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ExtractionCacheEntry(Document):
+    """MongoDB document cache kết quả Bedrock extraction theo input đã chuẩn hóa"""
+    cache_key = fields.StringField(required=True, unique=True, max_length=64)
+    kind = fields.StringField(required=True, choices=["voice", "bill"])
+    model_id = fields.StringField(required=True, max_length=200)
+    template_version = fields.StringField(required=True, max_length=16)
+    result = fields.DictField(required=True)
+
+    hits = fields.IntField(default=0, min_value=0)
+    created_at = fields.DateTimeField(default=_utc_now)
+    last_hit_at = fields.DateTimeField(default=_utc_now)
+    # Thời điểm hết hạn tính lúc ghi, nên đổi EXTRACTION_CACHE_TTL_HOURS không cần sửa index
+    expires_at = fields.DateTimeField(required=True)
+
+    meta = {
+        'collection': 'extraction_cache',
+        'indexes': [
+            'last_hit_at',
+            {
+                'fields': ['expires_at'],
+                'expireAfterSeconds': 0
+            },
+        ]
+    }
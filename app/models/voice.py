@@ -34,6 +34,8 @@ class Voice(Document):
     raw_transcription = fields.StringField()
     processing_time = fields.FloatField(min_value=0)
     tokens_used = fields.IntField(min_value=0)
+    cache_read_tokens = fields.IntField(min_value=0)
+    cache_write_tokens = fields.IntField(min_value=0)
     
     meta = {
         'collection': 'voices',
@@ -82,5 +84,7 @@ class Voice(Document):
             "money_type": self.money_type,
             "utc_time": self.utc_time,
             "processing_time": self.processing_time,
-            "tokens_used": self.tokens_used
+            "tokens_used": self.tokens_used,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens
         }
@@ -1,5 +1,5 @@
-from typing import Optional
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from app.auth import verify_jwt
@@ -7,6 +7,9 @@ from app.config import settings
 from app.schemas.bill import BillResponse
 from app.database import is_mongodb_connected
 from app.services.bill_service import BillService
+from app.ai_models.bill import get_bill_gate_metrics, get_ocr_metrics
+from app.services.bill_cache import get_bill_cache_metrics
+from app.services.extraction_cache import get_extraction_cache_metrics
 
 router = APIRouter(
     prefix=f"{settings.API_PREFIX}/bills",
@@ -34,7 +37,14 @@ async def health_check(
         "providers": {
             "bedrock": "connected" if bedrock_ready else "not_configured"
         },
-        "mongodb": "connected" if mongo_ready else "disconnected"
+        "mongodb": "connected" if mongo_ready else "disconnected",
+        "bill_gate": get_bill_gate_metrics(),
+        "ocr_batching": get_ocr_metrics(),
+        "bill_cache": get_bill_cache_metrics(),
+        "bedrock_transport": service.bedrock_extractor.transport.metrics() if bedrock_ready else None,
+        "bedrock_singleflight": service.bedrock_extractor.singleflight.metrics()
+        if bedrock_ready and service.bedrock_extractor.singleflight else None,
+        "extraction_cache": get_extraction_cache_metrics()
     }
 
 @router.post("/extract", response_model=BillResponse)
@@ -42,6 +52,7 @@ async def health_check(
 async def extract_bill(
     request: Request,
     file: UploadFile = File(...), 
+    mode: Optional[Literal["ocr", "vision"]] = Query(default=None, description="ocr hoặc vision, mặc định theo BILL_EXTRACTION_MODE"),
     user=Depends(verify_jwt),
     service: BillService = Depends(get_bill_service)
 ):
@@ -50,4 +61,19 @@ async def extract_bill(
     if not cog_sub:
         raise HTTPException(status_code=401, detail="User chưa được xác thực")
     
-    return await service.process_via_bedrock(file, cog_sub)
\ No newline at end of file
+    return await service.process_via_bedrock(file, cog_sub, mode)
+
+@router.post("/extract-document", response_model=BillResponse)
+@limiter.limit(f"{settings.RATE_LIMIT_TIMES}/{settings.RATE_LIMIT_SECONDS}seconds")
+async def extract_bill_document(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    user=Depends(verify_jwt),
+    service: BillService = Depends(get_bill_service)
+):
+    """Extract one bill from several photos (hóa đơn dài chụp nhiều phần) or a multi-page PDF"""
+    cog_sub = user.get("sub")
+    if not cog_sub:
+        raise HTTPException(status_code=401, detail="User chưa được xác thực")
+
+    return await service.process_document_via_bedrock(files, cog_sub)
\ No newline at end of file
@@ -6,6 +6,7 @@ from app.auth import verify_admin, verify_jwt
 from app.config import settings
 from app.database import is_mongodb_connected
 from app.services.chatbot_service import ChatbotService
+from app.services.executors import run_io
 from app.schemas.chatbot import ChatRequest, ChatResponse
 
 router = APIRouter(
@@ -50,7 +51,7 @@ async def get_files_list(
     if not cog_sub:
         raise HTTPException(status_code=401, detail="User chưa được xác thực")
     
-    return service.get_files_list()
+    return await run_io(service.get_files_list)
 
 @router.post("/ingest")
 async def ingest(
@@ -86,7 +87,7 @@ async def ask(
     if not cog_sub:
         raise HTTPException(status_code=401, detail="User chưa được xác thực")
     
-    answer = service.ask(req.question)
+    answer = await service.ask(req.question)
     return ChatResponse(answer=answer)
 
 @router.delete("/files/{filename}")
@@ -100,7 +101,7 @@ async def delete_file(
     if not cog_sub:
         raise HTTPException(status_code=401, detail="User chưa được xác thực")
     
-    result = service.delete_file(filename)
+    result = await run_io(service.delete_file, filename)
     if result.get("status") == "error":
         raise HTTPException(status_code=404, detail=result.get("message"))
     return result
@@ -115,4 +116,4 @@ async def reset(
     if not cog_sub:
         raise HTTPException(status_code=401, detail="User chưa được xác thực")
     
-    return service.clear_memory()
\ No newline at end of file
+    return await run_io(service.clear_memory)
\ No newline at end of file
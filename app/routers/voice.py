@@ -1,12 +1,16 @@
-from typing import Optional
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request
+from typing import List, Optional
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, WebSocket, status
 from slowapi import Limiter
 from slowapi.util import get_remote_address
-from app.auth import verify_jwt
+from app.auth import verify_jwt, verify_websocket_jwt
 from app.config import settings
-from app.schemas.voice import VoiceResponse
+from app.schemas.voice import VoiceResponse, VoiceBatchResponse
 from app.database import is_mongodb_connected
 from app.services.voice_service import VoiceService
+from app.ai_models.voice import get_transcription_metrics, get_transcriber_status
+from app.ai_models.vad import get_vad_metrics
+from app.services.transcript_cache import get_transcript_cache_metrics
+from app.services.extraction_cache import get_extraction_cache_metrics
 
 router = APIRouter(
     prefix=f"{settings.API_PREFIX}/voices",
@@ -41,7 +45,15 @@ async def health_check(
         "providers": {
             "bedrock": "connected" if bedrock_ready else "not_configured",
         },
-        "mongodb": "connected" if mongo_ready else "disconnected"
+        "mongodb": "connected" if mongo_ready else "disconnected",
+        "asr": get_transcriber_status(),
+        "asr_batching": get_transcription_metrics(),
+        "vad": get_vad_metrics(),
+        "transcript_cache": get_transcript_cache_metrics(),
+        "bedrock_transport": service.bedrock_extractor.transport.metrics() if bedrock_ready else None,
+        "bedrock_singleflight": service.bedrock_extractor.singleflight.metrics()
+        if bedrock_ready and service.bedrock_extractor.singleflight else None,
+        "extraction_cache": get_extraction_cache_metrics()
     }
 
 @router.post("/process", response_model=VoiceResponse)
@@ -57,4 +69,38 @@ async def process_audio(
     if not cog_sub:
         raise HTTPException(status_code=401, detail="User chưa được xác thực")
     
-    return await service.process_via_bedrock(file, cog_sub)
\ No newline at end of file
+    return await service.process_via_bedrock(file, cog_sub)
+
+@router.post("/process-batch", response_model=VoiceBatchResponse)
+@limiter.limit(f"{settings.RATE_LIMIT_TIMES}/{settings.RATE_LIMIT_SECONDS}seconds")
+async def process_audio_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    user=Depends(verify_jwt),
+    service: VoiceService = Depends(get_voice_service)
+):
+    """Process many audio files in one request; returns per-file results and errors"""
+    cog_sub = user.get("sub")
+    if not cog_sub:
+        raise HTTPException(status_code=401, detail="User chưa được xác thực")
+
+    return await service.process_batch_via_bedrock(files, cog_sub)
+
+@router.websocket("/stream")
+async def stream_audio(websocket: WebSocket):
+    """
+    Live voice input: client gửi PCM s16le mono 16 kHz theo từng frame, nhận partial transcript
+    trong lúc nói và kết quả trích xuất (Bedrock) sau khi gửi text frame "end".
+    Xác thực bằng query param `token` hoặc header Authorization.
+    """
+    user = await verify_websocket_jwt(websocket)
+    if user is None:
+        return
+
+    cog_sub = user.get("sub")
+    if not cog_sub or voice_service is None:
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR if cog_sub else status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    await voice_service.process_stream(websocket, cog_sub)
\ No newline at end of file
@@ -16,6 +16,8 @@ class BillResponse(BaseModel):
     utc_time: datetime
     processing_time: Optional[float] = Field(default=None, description="Thời gian xử lý AI (giây)")
     tokens_used: Optional[int] = Field(default=None, description="Số token đã sử dụng")
+    cache_read_tokens: Optional[int] = Field(default=None, description="Số input token đọc từ prompt cache của Bedrock")
+    cache_write_tokens: Optional[int] = Field(default=None, description="Số input token ghi vào prompt cache của Bedrock")
 
     model_config = ConfigDict(
         from_attributes=True,
@@ -37,7 +39,9 @@ class BillResponse(BaseModel):
                 "money_type": "VND",
                 "utc_time": "2025-11-12T10:30:00.000Z",
                 "processing_time": 2.45,
-                "tokens_used": 1250
+                "tokens_used": 1250,
+                "cache_read_tokens": 620,
+                "cache_write_tokens": 0
             }
         }
     )
\ No newline at end of file
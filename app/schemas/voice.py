@@ -3,7 +3,7 @@ Voice schemas for API responses
 """
 from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 from .base import VoiceTotalAmountSchema, VoiceTransactionsSchema
 
 
@@ -16,6 +16,8 @@ class VoiceResponse(BaseModel):
     utc_time: datetime
     processing_time: Optional[float] = Field(default=None, description="Thời gian xử lý AI (giây)")
     tokens_used: Optional[int] = Field(default=None, description="Số token đã sử dụng")
+    cache_read_tokens: Optional[int] = Field(default=None, description="Số input token đọc từ prompt cache của Bedrock")
+    cache_write_tokens: Optional[int] = Field(default=None, description="Số input token ghi vào prompt cache của Bedrock")
 
     model_config = ConfigDict(
         from_attributes=True,
@@ -45,7 +47,28 @@ class VoiceResponse(BaseModel):
                 "money_type": "VND",
                 "utc_time": "2025-11-12T10:30:00.000Z",
                 "processing_time": 2.45,
-                "tokens_used": 1250
+                "tokens_used": 1250,
+                "cache_read_tokens": 620,
+                "cache_write_tokens": 0
             }
         }
     )
+
+
+class VoiceBatchItem(BaseModel):
+    """Kết quả xử lý của một file trong batch"""
+    filename: str
+    status: Literal["success", "error"]
+    status_code: int
+    saved: Optional[bool] = Field(default=None, description="Kết quả đã được lưu vào MongoDB hay chưa")
+    result: Optional[VoiceResponse] = None
+    error: Optional[str] = None
+
+
+class VoiceBatchResponse(BaseModel):
+    """Schema response cho batch voice processing"""
+    total: int
+    succeeded: int
+    failed: int
+    saved: int = Field(default=0, description="Số kết quả đã được lưu vào MongoDB")
+    items: List[VoiceBatchItem]
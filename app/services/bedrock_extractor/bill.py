@@ -1,25 +1,34 @@
+import base64
 import time
 import json
 import re
-import boto3
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
 from botocore.exceptions import ClientError
 from loguru import logger
 from .config import Config
+from .prompting import static_prompt, usage_tokens
+from .singleflight import SingleFlight, extraction_key
+from .transport import BedrockTransport
+from ..executors import run_io
+from ..extraction_cache import get_extraction_cache
+from ...config import settings
+from ...ai_models.bill_layout import ocr_to_layout_text
 from ...schemas.base import BillTotalAmountSchema, BillTransactionsSchema, BillTransactionDetailSchema
 
 class BedrockBillExtractor:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, transport: Optional[BedrockTransport] = None):
         self.config = config
-        self.client = None
-        self.model_id = None
+        self.transport = transport or BedrockTransport(config)
+        self.model_id = self.transport.model_id
         self.prompt_template = self._load_prompt_template()
-        self._initialize_client()
+        self.vision_prompt_template = self._load_prompt_template("extraction_bill_vision_en.txt")
+        self.system_prompt = static_prompt(self.prompt_template)
+        self.singleflight = SingleFlight() if config.get('aws.single_flight_enabled', True) else None
     
-    def _load_prompt_template(self) -> str:
-        """Tải mẫu prompt từ extraction_bill_vi.txt"""
-        prompt_path = Path(__file__).parent.parent.parent / "prompts" / "extraction_bill_en.txt"
+    def _load_prompt_template(self, file_name: str = "extraction_bill_en.txt") -> str:
+        """Tải mẫu prompt từ thư mục prompts (mặc định extraction_bill_en.txt)"""
+        prompt_path = Path(__file__).parent.parent.parent / "prompts" / file_name
         try:
             if prompt_path.exists():
                 with open(prompt_path, 'r', encoding='utf-8') as f:
@@ -28,78 +37,123 @@ class BedrockBillExtractor:
             pass
         return "Extract invoice data to JSON"
     
-    def _initialize_client(self) -> None:
-        region = self.config.get('aws.region', 'ap-southeast-1')
-        self.model_id = self.config.get('aws.model_id', 'anthropic.claude-3-5-sonnet-20240620-v1:0')
-        self.client = boto3.client(service_name='bedrock-runtime', region_name=region)
-        
     def _ocr_list_to_string(self, ocr_output: list) -> str:
         if not ocr_output:
             return ""
+        if settings.BILL_LAYOUT_ENABLED:
+            return ocr_to_layout_text(ocr_output, settings.OCR_MIN_CONFIDENCE)
         lines = [entry["text"] for entry in ocr_output if isinstance(entry, dict) and "text" in entry]
         return "\n".join(lines)
     
-    def extract_from_text(self, text: str | list, return_raw: bool = False) -> Dict[str, Any]:
-        if self.client is None:
-            raise RuntimeError("Bedrock Client not initialized")
+    def ocr_to_text(self, ocr_output: list) -> str:
+        """Text gửi Bedrock cho một output EasyOCR (dùng khi ghép nhiều trang)"""
+        return self._ocr_list_to_string(ocr_output)
 
+    def _text_content(self, text: str | list) -> str:
         if isinstance(text, list):
             text = self._ocr_list_to_string(text)
 
         if not text or not text.strip():
             raise ValueError("Text cannot be empty")
         
-        full_prompt = f"{self.prompt_template}\n\nTranscript:\n{text}"
-        body = json.dumps({
+        return f"Transcript:\n{text}"
+
+    def _image_content(self, image_bytes: bytes, media_type: str) -> list:
+        if not image_bytes:
+            raise ValueError("Image cannot be empty")
+
+        return [
+            {
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": media_type,
+                    "data": base64.b64encode(image_bytes).decode("ascii")
+                }
+            }
+        ]
+
+    def _build_request(self, content: str | list, system_prompt: Optional[str] = None) -> Dict[str, Any]:
+        """Template tĩnh nằm ở system (được cache), content là phần thay đổi theo request"""
+        return {
             "anthropic_version": "bedrock-2023-05-31",
             "max_tokens": 4096,
             "temperature": self.config.get('aws.generation.temperature', 0.1),
+            "system": self.transport.system(system_prompt or self.system_prompt),
             "messages": [
                 {
                     "role": "user",
-                    "content": full_prompt
+                    "content": content
                 }
             ]
-        })
+        }
 
-        try:
-            response = self.client.invoke_model(
-                body=body,
-                modelId=self.model_id,
-                accept='application/json',
-                contentType='application/json'
-            )
-            
-            response_body = json.loads(response.get('body').read())
-            
-            response_text = response_body.get('content')[0].get('text').strip()
-            
-            usage = response_body.get('usage', {})
-            tokens_used = usage.get('input_tokens', 0) + usage.get('output_tokens', 0)
-            
-            if return_raw:
-                return {"raw_response": response_text, "tokens_used": tokens_used}
+    def _empty_result(self, error: Exception) -> Dict[str, Any]:
+        return {
+            "total_amount": {"expenses": 0.0},
+            "transactions": {"expenses": []},
+            "money_type": "VND",
+            **usage_tokens({}),
+            "error": str(error),
+            "raw_response": str(error)
+        }
 
-            json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-            if json_match:
-                response_text = json_match.group(1)
-            
+    def _parse_response(self, response_body: Dict[str, Any], return_raw: bool = False) -> Dict[str, Any]:
+        response_text = response_body.get('content')[0].get('text').strip()
+        
+        usage = usage_tokens(response_body.get('usage', {}))
+        
+        if return_raw:
+            return {"raw_response": response_text, **usage}
+
+        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
+        if json_match:
+            response_text = json_match.group(1)
+        
+        try:
             result = json.loads(response_text)
-            result.setdefault("total_amount", {"expenses": 0.0})
-            result.setdefault("transactions", {"expenses": []})
-            result.setdefault("money_type", "VND")
-            result["tokens_used"] = tokens_used
-            return result
+        except json.JSONDecodeError as e:
+            return self._empty_result(e)
 
-        except (ClientError, json.JSONDecodeError) as e:
-            return {
-                "total_amount": {"expenses": 0.0},
-                "transactions": {"expenses": []},
-                "money_type": "VND",
-                "tokens_used": 0,
-                "error": str(e),
-                "raw_response": str(e)
-            }
+        result.setdefault("total_amount", {"expenses": 0.0})
+        result.setdefault("transactions", {"expenses": []})
+        result.setdefault("money_type", "VND")
+        result.update(usage)
+        return result
+
+    def _invoke(
+        self,
+        content: str | list,
+        return_raw: bool = False,
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        try:
+            return self._parse_response(self.transport.invoke(self._build_request(content, system_prompt)), return_raw)
+        except ClientError as e:
+            return self._empty_result(e)
+
+    async def _ainvoke(
+        self,
+        content: str | list,
+        return_raw: bool = False,
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        try:
+            return self._parse_response(await self.transport.ainvoke(self._build_request(content, system_prompt)), return_raw)
+        except ClientError as e:
+            return self._empty_result(e)
+
+    def extract_from_text(self, text: str | list, return_raw: bool = False) -> Dict[str, Any]:
+        return self._invoke(self._text_content(text), return_raw)
+
+    def extract_from_image(
+        self,
+        image_bytes: bytes,
+        media_type: str = "image/jpeg",
+        return_raw: bool = False
+    ) -> Dict[str, Any]:
+        """Gửi trực tiếp ảnh hóa đơn (đã nén) cho Claude, bỏ qua bước OCR"""
+        return self._invoke(self._image_content(image_bytes, media_type), return_raw, self.vision_prompt_template)
     
     def extract_to_schema(self, text: str | list) -> Dict[str, Any]:
         """Convert extraction output to standard bill schema"""
@@ -108,7 +162,63 @@ class BedrockBillExtractor:
 
         start_time = time.time()
         json_result = self.extract_from_text(text, return_raw=False)
-        
+        return self._to_schema(json_result, start_time)
+
+    def extract_image_to_schema(self, image_bytes: bytes, media_type: str = "image/jpeg") -> Dict[str, Any]:
+        """Vision mode: convert extraction output of a bill image to standard bill schema"""
+        start_time = time.time()
+        json_result = self.extract_from_image(image_bytes, media_type)
+        return self._to_schema(json_result, start_time)
+
+    async def aextract_to_schema(self, text: str | list) -> Dict[str, Any]:
+        """
+        Awaitable extract_to_schema, chạy qua thread pool của Bedrock transport.
+        OCR text đã có trong extraction cache được trả về mà không gọi Bedrock.
+        """
+        start_time = time.time()
+        content = self._text_content(text)
+        cache = get_extraction_cache()
+        key = cache.make_key("bill", self.model_id, self.system_prompt, content) if cache else None
+        if cache is not None:
+            cached = await run_io(cache.get, key)
+            if cached is not None:
+                try:
+                    return self._to_schema(cached, start_time)
+                except ValueError:
+                    await run_io(cache.delete, key)
+
+        json_result = await self._coalesced(self.system_prompt, content, lambda: self._ainvoke(content))
+        schema_result = self._to_schema(json_result, start_time)
+        if cache is not None and "error" not in json_result:
+            await run_io(cache.set, key, "bill", self.model_id, self.system_prompt, json_result)
+        return schema_result
+
+    async def aextract_image_to_schema(self, image_bytes: bytes, media_type: str = "image/jpeg") -> Dict[str, Any]:
+        """Awaitable extract_image_to_schema"""
+        start_time = time.time()
+        content = self._image_content(image_bytes, media_type)
+        json_result = await self._coalesced(
+            self.vision_prompt_template,
+            image_bytes,
+            lambda: self._ainvoke(content, system_prompt=self.vision_prompt_template)
+        )
+        return self._to_schema(json_result, start_time)
+
+    async def _coalesced(
+        self,
+        template: str,
+        payload: Union[str, bytes],
+        func: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        Hóa đơn trùng (cùng OCR text hoặc cùng ảnh) đang xử lý đồng thời dùng chung một lời gọi.
+        OCR text giữ nguyên khoảng cách cột khi tạo key.
+        """
+        if self.singleflight is None:
+            return await func()
+        return await self.singleflight.do(extraction_key(self.model_id, template, payload, preserve_layout=True), func)
+
+    def _to_schema(self, json_result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
         try:
             total_amount_data = json_result.get('total_amount', {})
             total_amount = BillTotalAmountSchema(
@@ -134,7 +244,9 @@ class BedrockBillExtractor:
                 'transactions': transactions,
                 'money_type': json_result.get('money_type', 'VND'),
                 'processing_time': round(processing_time, 2),
-                'tokens_used': json_result.get('tokens_used', 0)
+                'tokens_used': json_result.get('tokens_used', 0),
+                'cache_read_tokens': json_result.get('cache_read_tokens', 0),
+                'cache_write_tokens': json_result.get('cache_write_tokens', 0)
             }
             
         except Exception as e:
@@ -1,16 +1,16 @@
-import json
-import boto3
 from pathlib import Path
+from typing import Any, Dict, Optional
 from botocore.exceptions import ClientError
 from .config import Config
+from .resilience import BedrockUnavailableError
+from .transport import BedrockTransport
 
 class BedrockChatExtractor:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, transport: Optional[BedrockTransport] = None):
         self.config = config
-        self.client = None
-        self.model_id = None
+        self.transport = transport or BedrockTransport(config)
+        self.model_id = self.transport.model_id
         self.prompt_template = self._load_prompt_template()
-        self._initialize_client()
 
     def _load_prompt_template(self) -> str:
         prompt_path = Path(__file__).parent.parent.parent / "prompts" / "chat_system_prompt.txt"
@@ -24,48 +24,45 @@ class BedrockChatExtractor:
 Dựa vào thông tin được cung cấp trong phần <context>, hãy trả lời câu hỏi của người dùng.
 Nếu thông tin không có trong context, hãy nói là không biết."""
 
-    def _initialize_client(self) -> None:
-        region = self.config.get('aws.region', 'ap-southeast-1')
-        self.model_id = self.config.get('aws.model_id', 'anthropic.claude-3-5-sonnet-20240620-v1:0')
-        self.client = boto3.client(service_name='bedrock-runtime', region_name=region)
-
-    def generate_response(self, context: str, question: str) -> str:
-        if self.client is None:
-            raise RuntimeError("Bedrock Client not initialized")
-
-        system_prompt = self.prompt_template
-        
+    def _build_request(self, context: str, question: str) -> Dict[str, Any]:
         user_message = f"""<context>
 {context}
 </context>
 
 {question}"""
 
-        body = json.dumps({
+        return {
             "anthropic_version": "bedrock-2023-05-31",
             "max_tokens": 2048,
             "temperature": self.config.get('aws.generation.temperature', 0.3),
-            "system": system_prompt,
+            "system": self.transport.system(self.prompt_template),
             "messages": [
                 {
                     "role": "user",
                     "content": user_message
                 }
             ]
-        })
+        }
+
+    @staticmethod
+    def _parse_response(response_body: Dict[str, Any]) -> str:
+        return response_body.get('content')[0].get('text').strip()
 
+    def generate_response(self, context: str, question: str) -> str:
         try:
-            response = self.client.invoke_model(
-                body=body,
-                modelId=self.model_id,
-                accept='application/json',
-                contentType='application/json'
-            )
-            
-            response_body = json.loads(response.get('body').read())
-            response_text = response_body.get('content')[0].get('text').strip()
-            
-            return response_text
+            return self._parse_response(self.transport.invoke(self._build_request(context, question)))
+        except BedrockUnavailableError:
+            # Để caller trả 503 + Retry-After thay vì một câu trả lời lỗi
+            raise
+        except (ClientError, Exception) as e:
+            return f"Xin lỗi, tôi gặp sự cố khi xử lý yêu cầu: {str(e)}"
 
+    async def agenerate_response(self, context: str, question: str) -> str:
+        """Awaitable generate_response, chạy qua thread pool của Bedrock transport"""
+        try:
+            return self._parse_response(await self.transport.ainvoke(self._build_request(context, question)))
+        except BedrockUnavailableError:
+            # Để caller trả 503 + Retry-After thay vì một câu trả lời lỗi
+            raise
         except (ClientError, Exception) as e:
-            return f"Xin lỗi, tôi gặp sự cố khi xử lý yêu cầu: {str(e)}"
\ No newline at end of file
+            return f"Xin lỗi, tôi gặp sự cố khi xử lý yêu cầu: {str(e)}"
@@ -34,6 +34,23 @@ def load_config() -> Config:
             "region": settings.REGION,
             "model_id": settings.BEDROCK_MODEL_ID,
             "timeout": settings.BEDROCK_TIMEOUT,
+            "connect_timeout": settings.BEDROCK_CONNECT_TIMEOUT,
+            "max_pool_connections": settings.BEDROCK_MAX_POOL_CONNECTIONS,
+            "max_attempts": settings.BEDROCK_MAX_ATTEMPTS,
+            "prompt_cache_enabled": settings.BEDROCK_PROMPT_CACHE_ENABLED,
+            "single_flight_enabled": settings.BEDROCK_SINGLE_FLIGHT_ENABLED,
+            "retry": {
+                "deadline_s": settings.BEDROCK_RETRY_DEADLINE_S,
+                "backoff_base_s": settings.BEDROCK_BACKOFF_BASE_S,
+                "backoff_cap_s": settings.BEDROCK_BACKOFF_CAP_S,
+                "hedge_after_s": settings.BEDROCK_HEDGE_AFTER_S
+            },
+            "breaker": {
+                "window_size": settings.BEDROCK_BREAKER_WINDOW,
+                "min_calls": settings.BEDROCK_BREAKER_MIN_CALLS,
+                "failure_rate": settings.BEDROCK_BREAKER_FAILURE_RATE,
+                "cooldown_s": settings.BEDROCK_BREAKER_COOLDOWN_S
+            },
             "access_key_id": settings.AWS_ACCESS_KEY_ID,
             "secret_access_key": settings.AWS_SECRET_ACCESS_KEY,
             "generation": {
@@ -0,0 +1,57 @@
+"""
+Bedrock Prompt Caching
+
+Phần tĩnh của prompt (template extraction, chat system prompt) được gửi dưới dạng system block
+có cache_control để Bedrock cache prefix giữa các request; phần thay đổi (transcript, OCR, ảnh,
+câu hỏi) nằm trong user message phía sau prefix đó.
+"""
+from typing import Any, Dict, List
+
+TRANSCRIPT_PLACEHOLDER = "{{TRANSCRIPT}}"
+TRANSCRIPT_HINT = "(provided in the user message)"
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def static_prompt(template: str) -> str:
+    """Thay placeholder {{TRANSCRIPT}} để template không phụ thuộc input và cache được"""
+    return template.replace(TRANSCRIPT_PLACEHOLDER, TRANSCRIPT_HINT)
+
+
+def system_blocks(text: str, cache: bool) -> List[Dict[str, Any]]:
+    block: Dict[str, Any] = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = dict(CACHE_CONTROL)
+    return [block]
+
+
+def has_cache_control(body: Any) -> bool:
+    if isinstance(body, dict):
+        return "cache_control" in body or any(has_cache_control(v) for v in body.values())
+    if isinstance(body, list):
+        return any(has_cache_control(v) for v in body)
+    return False
+
+
+def strip_cache_control(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Bản sao của request body không còn cache_control (cho model không hỗ trợ prompt caching)"""
+    def _strip(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {k: _strip(v) for k, v in value.items() if k != "cache_control"}
+        if isinstance(value, list):
+            return [_strip(v) for v in value]
+        return value
+    return _strip(body)
+
+
+def usage_tokens(usage: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Tách usage của Bedrock thành tokens_used (tổng input + output, kể cả phần đọc/ghi cache)
+    và số token đọc/ghi prompt cache.
+    """
+    cache_read = usage.get('cache_read_input_tokens', 0) or 0
+    cache_write = usage.get('cache_creation_input_tokens', 0) or 0
+    return {
+        "tokens_used": usage.get('input_tokens', 0) + usage.get('output_tokens', 0) + cache_read + cache_write,
+        "cache_read_tokens": cache_read,
+        "cache_write_tokens": cache_write,
+    }
@@ -0,0 +1,180 @@
+"""
+Bedrock Resilience
+
+Các thành phần chống quá tải cho lời gọi Bedrock:
+- phân loại lỗi tạm thời (throttling, 5xx, timeout mạng) có thể retry,
+- backoff exponential "full jitter" để các request không retry cùng lúc,
+- circuit breaker theo cửa sổ trượt: khi tỉ lệ lỗi vượt ngưỡng thì từ chối ngay (503)
+  thay vì tiếp tục dồn request vào một endpoint đang throttle.
+"""
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+THROTTLING_ERROR_CODES = frozenset({
+    "ThrottlingException",
+    "TooManyRequestsException",
+})
+
+TRANSIENT_ERROR_CODES = THROTTLING_ERROR_CODES | frozenset({
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+})
+
+TRANSIENT_NETWORK_ERRORS = (
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+)
+
+
+class BedrockUnavailableError(Exception):
+    """Bedrock đang quá tải / không phản hồi (hết retry hoặc circuit breaker đang mở)"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """Header Retry-After (giây, làm tròn lên) cho response 503"""
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+def error_code(error: BaseException) -> str:
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code", "")
+    return type(error).__name__
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    return isinstance(error, ClientError) and error_code(error) in THROTTLING_ERROR_CODES
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Lỗi tạm thời đáng retry; lỗi request (ValidationException, AccessDenied...) thì không"""
+    if isinstance(error, TRANSIENT_NETWORK_ERRORS):
+        return True
+    return isinstance(error, ClientError) and error_code(error) in TRANSIENT_ERROR_CODES
+
+
+def backoff_delay(attempt: int, base_s: float, cap_s: float) -> float:
+    """Full jitter: uniform(0, min(cap, base * 2^attempt))"""
+    return random.uniform(0, min(cap_s, base_s * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker theo cửa sổ trượt N lời gọi gần nhất.
+
+    closed    -> mọi request đi qua; mở khi có >= min_calls kết quả và tỉ lệ lỗi >= failure_rate.
+    open      -> từ chối ngay trong cooldown_s giây.
+    half_open -> cho một request thăm dò đi qua; thành công thì đóng, lỗi thì mở lại.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window_size: int = 20, min_calls: int = 10, failure_rate: float = 0.5, cooldown_s: float = 30.0):
+        self.window_size = window_size
+        self.min_calls = min(min_calls, window_size)
+        self.failure_rate = failure_rate
+        self.cooldown_s = cooldown_s
+
+        self._results: deque = deque(maxlen=window_size)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+        self.opened_count = 0
+        self.rejected_count = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_s:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._results.clear()
+        self.opened_count += 1
+
+    def retry_after(self) -> float:
+        """Số giây còn lại trước khi breaker cho request thăm dò"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.cooldown_s - (time.monotonic() - self._opened_at))
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected_count += 1
+            return False
+
+    def release(self) -> None:
+        """Trả lại lượt thăm dò khi request bị hủy giữa chừng (không có kết quả)"""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._probe_in_flight = False
+                self._results.clear()
+            self._results.append(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._open()
+                return
+            if self._state == self.OPEN:
+                return
+            self._results.append(False)
+            failures = self._results.count(False)
+            if len(self._results) >= self.min_calls and failures / len(self._results) >= self.failure_rate:
+                self._open()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            calls = len(self._results)
+            failures = self._results.count(False)
+            return {
+                "state": self._state,
+                "window_calls": calls,
+                "window_failure_rate": round(failures / calls, 4) if calls else 0.0,
+                "opened_count": self.opened_count,
+                "rejected_count": self.rejected_count,
+            }
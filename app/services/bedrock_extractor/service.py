@@ -1,5 +1,6 @@
 from typing import Optional
 from .config import Config, load_config
+from .transport import BedrockTransport
 from .voice import BedrockVoiceExtractor
 from .bill import BedrockBillExtractor
 from .chatbot import BedrockChatExtractor
@@ -7,9 +8,11 @@ from .chatbot import BedrockChatExtractor
 class BedrockService:
     def __init__(self, config: Optional[Config] = None):
         self.config = config or load_config()
-        self.voice_extractor = BedrockVoiceExtractor(self.config)
-        self.bill_extractor = BedrockBillExtractor(self.config)
-        self.chat_extractor = BedrockChatExtractor(self.config)
+        # Một client/connection pool dùng chung cho cả ba extractor
+        self.transport = BedrockTransport(self.config)
+        self.voice_extractor = BedrockVoiceExtractor(self.config, self.transport)
+        self.bill_extractor = BedrockBillExtractor(self.config, self.transport)
+        self.chat_extractor = BedrockChatExtractor(self.config, self.transport)
 
     def is_ready(self) -> bool:
         return (
@@ -18,6 +21,9 @@ class BedrockService:
             self.chat_extractor is not None
         )
     
+    def close(self) -> None:
+        self.transport.close()
+
     def get_model_id(self) -> Optional[str]:
         if self.config:
             return self.config.get('aws.model_id')
@@ -33,4 +39,6 @@ def get_bedrock_service(config: Optional[Config] = None) -> BedrockService:
 
 def reset_bedrock_service() -> None:
     global _bedrock_service_instance
+    if _bedrock_service_instance is not None:
+        _bedrock_service_instance.close()
     _bedrock_service_instance = None
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Bedrock Single-flight
+
+Gộp các lời gọi extraction giống hệt nhau đang chạy đồng thời (client gửi trùng, hai worker
+xử lý cùng transcript/OCR text) thành một lần invoke_model; các request đến sau chờ kết quả
+của lời gọi đang chạy. Key gồm model, phiên bản prompt template và input đã chuẩn hóa.
+"""
+import asyncio
+import copy
+import hashlib
+import re
+import threading
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict, TypeVar, Union
+
+T = TypeVar("T")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_SPACE_RE = re.compile(r"[ \t]+$", re.MULTILINE)
+
+
+def normalize_input(text: str, preserve_layout: bool = False) -> str:
+    """
+    Chuẩn hóa Unicode NFC và khoảng trắng để các input chỉ khác cách gõ dùng chung key.
+    preserve_layout=True (OCR text hóa đơn dựng theo cột) chỉ chuẩn hóa xuống dòng và khoảng
+    trắng cuối dòng, giữ nguyên khoảng cách giữa các cột.
+    """
+    text = unicodedata.normalize("NFC", text)
+    if preserve_layout:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return _TRAILING_SPACE_RE.sub("", text).strip("\n")
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def template_version(template: str) -> str:
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+def extraction_key(
+    model_id: str,
+    template: str,
+    payload: Union[str, bytes],
+    preserve_layout: bool = False
+) -> str:
+    """Key của một lời gọi extraction: model + hash template + input đã chuẩn hóa (hoặc bytes ảnh)"""
+    if isinstance(payload, str):
+        payload = normalize_input(payload, preserve_layout).encode("utf-8")
+    digest = hashlib.sha256()
+    for part in (model_id.encode("utf-8"), template_version(template).encode("ascii"), payload):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """
+    Async single-flight: mỗi key chỉ có một lời gọi đang chạy. Lời gọi chạy trong task riêng
+    nên request đầu tiên bị hủy (client ngắt kết nối) không làm hỏng các request đang chờ.
+    Mỗi caller nhận một bản deepcopy của kết quả.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        with self._lock:
+            task = self._calls.get(key)
+            if task is None:
+                task = asyncio.ensure_future(func())
+                self._calls[key] = task
+                task.add_done_callback(lambda done, key=key: self._forget(key, done))
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is task:
+                del self._calls[key]
+        # Lấy exception để asyncio không cảnh báo khi mọi caller đã bị hủy
+        if not task.cancelled():
+            task.exception()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls)
+        total = self.executed + self.coalesced
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": in_flight,
+            "coalesce_rate": round(self.coalesced / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,262 @@
+"""
+Bedrock Transport
+
+Một bedrock-runtime client dùng chung cho mọi extractor (voice, bill, chatbot): connection pool
+cấu hình được, connect/read timeout và TCP keep-alive.
+Có API awaitable: mỗi lời gọi chạy trên thread pool riêng có số thread bằng số connection,
+nên request đồng thời không phải xếp hàng chờ socket và event loop không bị block.
+
+System prompt tĩnh được đánh dấu cache_control (prompt caching); nếu model không hỗ trợ,
+transport tự gửi lại không có cache_control và tắt prompt caching cho các request sau.
+
+Retry do transport tự làm (botocore chỉ gọi một lần): backoff có jitter tới deadline,
+circuit breaker dùng chung cho mọi extractor và hedged request (tùy chọn) ở API awaitable.
+"""
+import asyncio
+import functools
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
+from loguru import logger
+from .config import Config
+from .prompting import has_cache_control, strip_cache_control, system_blocks
+from .resilience import (
+    BedrockUnavailableError,
+    CircuitBreaker,
+    backoff_delay,
+    error_code,
+    is_throttling_error,
+    is_transient_error,
+)
+
+T = TypeVar("T")
+
+DEFAULT_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+
+
+class BedrockTransport:
+    """Shared, pooled bedrock-runtime client with sync and awaitable invoke, retry and circuit breaker"""
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.model_id = config.get('aws.model_id', DEFAULT_MODEL_ID)
+        self.max_pool_connections = config.get('aws.max_pool_connections', 50)
+
+        boto_config = BotoConfig(
+            region_name=config.get('aws.region', 'ap-southeast-1'),
+            max_pool_connections=self.max_pool_connections,
+            connect_timeout=config.get('aws.connect_timeout', 5),
+            read_timeout=config.get('aws.timeout', 60),
+            tcp_keepalive=True,
+            # Retry nằm ở invoke/ainvoke để có deadline, jitter và circuit breaker chung
+            retries={"mode": "standard", "total_max_attempts": 1}
+        )
+
+        self.prompt_cache_enabled = config.get('aws.prompt_cache_enabled', True)
+        self.max_attempts = config.get('aws.max_attempts', 3)
+        self.retry_deadline_s = config.get('aws.retry.deadline_s', 20.0)
+        self.backoff_base_s = config.get('aws.retry.backoff_base_s', 0.5)
+        self.backoff_cap_s = config.get('aws.retry.backoff_cap_s', 8.0)
+        self.hedge_after_s = config.get('aws.retry.hedge_after_s', 0.0)
+        self.breaker = CircuitBreaker(
+            window_size=config.get('aws.breaker.window_size', 20),
+            min_calls=config.get('aws.breaker.min_calls', 10),
+            failure_rate=config.get('aws.breaker.failure_rate', 0.5),
+            cooldown_s=config.get('aws.breaker.cooldown_s', 30.0),
+        )
+        self._metrics = {
+            "calls": 0,
+            "attempts": 0,
+            "retries": 0,
+            "throttled": 0,
+            "unavailable": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+        }
+        self._metrics_lock = threading.Lock()
+
+        credentials = {}
+        if config.get('aws.access_key_id') and config.get('aws.secret_access_key'):
+            credentials = {
+                "aws_access_key_id": config.get('aws.access_key_id'),
+                "aws_secret_access_key": config.get('aws.secret_access_key'),
+            }
+
+        self.client = boto3.client(service_name='bedrock-runtime', config=boto_config, **credentials)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_pool_connections,
+                        thread_name_prefix="bedrock"
+                    )
+        return self._executor
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._metrics_lock:
+            self._metrics[key] += value
+
+    def system(self, text: str) -> List[Dict[str, Any]]:
+        """System block cho phần prompt tĩnh, có cache_control khi prompt caching đang bật"""
+        return system_blocks(text, self.prompt_cache_enabled)
+
+    def _call(self, body: Dict[str, Any], model_id: Optional[str]) -> Dict[str, Any]:
+        """Một lần gọi invoke_model, không retry"""
+        try:
+            return self._invoke_model(body, model_id)
+        except ClientError as e:
+            message = f"{e.response.get('Error', {}).get('Message', '')} {e}".lower()
+            if error_code(e) != "ValidationException" or "cach" not in message or not has_cache_control(body):
+                raise
+            if self.prompt_cache_enabled:
+                logger.warning(f"Model {model_id or self.model_id} does not accept prompt caching, disabling it: {e}")
+                self.prompt_cache_enabled = False
+            return self._invoke_model(strip_cache_control(body), model_id)
+
+    def _invoke_model(self, body: Dict[str, Any], model_id: Optional[str]) -> Dict[str, Any]:
+        response = self.client.invoke_model(
+            body=json.dumps(body),
+            modelId=model_id or self.model_id,
+            accept='application/json',
+            contentType='application/json'
+        )
+        return json.loads(response.get('body').read())
+
+    def _acquire(self) -> None:
+        """Xin phép circuit breaker trước mỗi attempt"""
+        self._count("attempts")
+        if not self.breaker.allow_request():
+            self._count("unavailable")
+            raise BedrockUnavailableError(
+                "Bedrock đang quá tải, vui lòng thử lại sau",
+                retry_after=self.breaker.retry_after()
+            )
+
+    def _next_delay(self, error: Exception, attempt: int, deadline: float) -> float:
+        """
+        Ghi nhận lỗi của một attempt và trả về thời gian chờ trước lần thử tiếp theo.
+        Lỗi không tạm thời được raise lại nguyên vẹn; hết lượt hoặc quá deadline thì raise
+        BedrockUnavailableError.
+        """
+        if not is_transient_error(error):
+            # Bedrock vẫn phản hồi (request sai, quyền...) -> không tính là endpoint lỗi
+            self.breaker.record_success()
+            raise error
+
+        self.breaker.record_failure()
+        if is_throttling_error(error):
+            self._count("throttled")
+
+        delay = backoff_delay(attempt, self.backoff_base_s, self.backoff_cap_s)
+        if attempt + 1 >= self.max_attempts or time.monotonic() + delay > deadline:
+            self._count("unavailable")
+            logger.warning(f"Bedrock unavailable after {attempt + 1} attempt(s): {error_code(error)}")
+            raise BedrockUnavailableError(
+                f"Bedrock không phản hồi ({error_code(error)}), vui lòng thử lại sau",
+                retry_after=max(self.breaker.retry_after(), self.backoff_cap_s)
+            ) from error
+
+        self._count("retries")
+        logger.debug(f"Bedrock {error_code(error)}, retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+    def invoke(self, body: Dict[str, Any], model_id: Optional[str] = None) -> Dict[str, Any]:
+        """Gọi invoke_model (blocking) có retry, trả về response body đã parse JSON"""
+        self._count("calls")
+        deadline = time.monotonic() + self.retry_deadline_s
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                result = self._call(body, model_id)
+            except Exception as e:
+                delay = self._next_delay(e, attempt, deadline)
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            time.sleep(delay)
+            attempt += 1
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Chạy một hàm blocking dùng transport này trên thread pool của Bedrock"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+
+    async def _hedged_call(self, body: Dict[str, Any], model_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Gửi request; nếu sau hedge_after_s chưa có kết quả thì gửi thêm một bản sao và lấy
+        kết quả về trước. Không hedge khi breaker không ở trạng thái closed (đang quá tải).
+        """
+        primary = asyncio.ensure_future(self.run(self._call, body, model_id))
+        if self.hedge_after_s <= 0:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after_s)
+        if done or self.breaker.state != CircuitBreaker.CLOSED:
+            return await primary
+
+        self._count("hedged")
+        hedge = asyncio.ensure_future(self.run(self._call, body, model_id))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+            # Cả hai đều lỗi: trả lỗi của request gốc
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def ainvoke(self, body: Dict[str, Any], model_id: Optional[str] = None) -> Dict[str, Any]:
+        """Awaitable invoke_model có retry (asyncio.sleep) và hedged request"""
+        self._count("calls")
+        deadline = time.monotonic() + self.retry_deadline_s
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                result = await self._hedged_call(body, model_id)
+            except Exception as e:
+                delay = self._next_delay(e, attempt, deadline)
+            except BaseException:
+                self.breaker.release()
+                raise
+            else:
+                self.breaker.record_success()
+                return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Số liệu retry/hedge và trạng thái circuit breaker"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics["prompt_cache_enabled"] = self.prompt_cache_enabled
+        metrics["breaker"] = self.breaker.metrics()
+        return metrics
+
+    def close(self) -> None:
+        """Đóng thread pool và connection pool khi ứng dụng shutdown"""
+        with self._executor_lock:
+            if self._executor is not None:
+                logger.info("Shutting down Bedrock transport...")
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+        self.client.close()
@@ -1,20 +1,25 @@
 import json
 import re
 import time
-import boto3
 from pathlib import Path
-from typing import Dict, Any
+from typing import Any, Awaitable, Callable, Dict, Optional
 from botocore.exceptions import ClientError
 from .config import Config
+from .prompting import static_prompt, usage_tokens
+from .singleflight import SingleFlight, extraction_key
+from .transport import BedrockTransport
+from ..executors import run_io
+from ..extraction_cache import get_extraction_cache
 from ...schemas.base import VoiceTotalAmountSchema, VoiceTransactionsSchema, VoiceTransactionDetailSchema
 
 class BedrockVoiceExtractor:
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, transport: Optional[BedrockTransport] = None):
         self.config = config
-        self.client = None
-        self.model_id = None
+        self.transport = transport or BedrockTransport(config)
+        self.model_id = self.transport.model_id
         self.prompt_template = self._load_prompt_template()
-        self._initialize_client()
+        self.system_prompt = static_prompt(self.prompt_template)
+        self.singleflight = SingleFlight() if config.get('aws.single_flight_enabled', True) else None
     
     def _load_prompt_template(self) -> str:
         prompt_path = Path(__file__).parent.parent.parent / "prompts" / "extraction_voice_en.txt"
@@ -26,77 +31,104 @@ class BedrockVoiceExtractor:
             pass
         return "Extract transaction data from this voice transcript and convert to JSON"
     
-    def _initialize_client(self) -> None:
-        region = self.config.get('aws.region', 'ap-southeast-1')
-        self.model_id = self.config.get('aws.model_id', 'anthropic.claude-3-5-sonnet-20240620-v1:0')
-        self.client = boto3.client(service_name='bedrock-runtime', region_name=region)
-    
-    def extract_from_text(self, text: str, return_raw: bool = False) -> Dict[str, Any]:
-        if self.client is None:
-            raise RuntimeError("Bedrock Client not initialized")
-        
+    def _build_request(self, text: str) -> Dict[str, Any]:
         if not text or not text.strip():
             raise ValueError("Text cannot be empty")
         
-        full_prompt = f"{self.prompt_template}\n\nTranscript:\n{text}"
-        
-        body = json.dumps({
+        # Template tĩnh nằm ở system (được cache), chỉ transcript thay đổi theo request
+        return {
             "anthropic_version": "bedrock-2023-05-31",
             "max_tokens": 4096,
             "temperature": self.config.get('aws.generation.temperature', 0.1),
-            "messages": [{"role": "user", "content": full_prompt}]
-        })
+            "system": self.transport.system(self.system_prompt),
+            "messages": [{"role": "user", "content": f"Transcript:\n{text}"}]
+        }
+
+    def _empty_result(self, error: Exception, usage: Optional[Dict[str, int]] = None, response_text: str = "") -> Dict[str, Any]:
+        return {
+            "total_amount": {"incomes": 0.0, "expenses": 0.0},
+            "transactions": {"incomes": [], "expenses": []},
+            "money_type": "VND",
+            **(usage or usage_tokens({})),
+            "error": str(error),
+            "raw_response": response_text
+        }
+
+    def _parse_response(self, response_body: Dict[str, Any], return_raw: bool = False) -> Dict[str, Any]:
+        response_text = response_body.get('content')[0].get('text').strip()
+        usage = usage_tokens(response_body.get('usage', {}))
         
-        tokens_used = 0
-        response_text = ""
+        if return_raw:
+            return {"raw_response": response_text, **usage}
 
+        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
+        if json_match:
+            response_text = json_match.group(1)
+        
         try:
-            response = self.client.invoke_model(
-                body=body,
-                modelId=self.model_id,
-                accept='application/json',
-                contentType='application/json'
-            )
-            
-            response_body = json.loads(response.get('body').read())
-            response_text = response_body.get('content')[0].get('text').strip()
-            usage = response_body.get('usage', {})
-            tokens_used = usage.get('input_tokens', 0) + usage.get('output_tokens', 0)
-            
-            if return_raw:
-                return {"raw_response": response_text, "tokens_used": tokens_used}
-
-            json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
-            if json_match:
-                response_text = json_match.group(1)
-            
             result = json.loads(response_text)
-            
-            if "total_amount" not in result:
-                result["total_amount"] = {"incomes": 0.0, "expenses": 0.0}
-            if "transactions" not in result:
-                result["transactions"] = {"incomes": [], "expenses": []}
-            if "money_type" not in result:
-                result["money_type"] = "VND"
-            
-            result["tokens_used"] = tokens_used
-            return result
+        except json.JSONDecodeError as e:
+            return self._empty_result(e, usage, response_text)
+        
+        if "total_amount" not in result:
+            result["total_amount"] = {"incomes": 0.0, "expenses": 0.0}
+        if "transactions" not in result:
+            result["transactions"] = {"incomes": [], "expenses": []}
+        if "money_type" not in result:
+            result["money_type"] = "VND"
+        
+        result.update(usage)
+        return result
 
-        except (ClientError, json.JSONDecodeError) as e:
-            return {
-                "total_amount": {"incomes": 0.0, "expenses": 0.0},
-                "transactions": {"incomes": [], "expenses": []},
-                "money_type": "VND",
-                "tokens_used": tokens_used,
-                "error": str(e),
-                "raw_response": response_text
-            }
+    def extract_from_text(self, text: str, return_raw: bool = False) -> Dict[str, Any]:
+        body = self._build_request(text)
+        try:
+            return self._parse_response(self.transport.invoke(body), return_raw)
+        except ClientError as e:
+            return self._empty_result(e)
+
+    async def aextract_from_text(self, text: str, return_raw: bool = False) -> Dict[str, Any]:
+        """Awaitable extract_from_text, chạy qua thread pool của Bedrock transport"""
+        body = self._build_request(text)
+        try:
+            return self._parse_response(await self.transport.ainvoke(body), return_raw)
+        except ClientError as e:
+            return self._empty_result(e)
     
     def extract_to_schema(self, text: str) -> Dict[str, Any]:
         """Convert extraction output to standard schema"""
         start_time = time.time()
         json_result = self.extract_from_text(text, return_raw=False)
-        
+        return self._to_schema(json_result, start_time)
+
+    async def aextract_to_schema(self, text: str) -> Dict[str, Any]:
+        """
+        Awaitable extract_to_schema. Transcript đã có trong extraction cache được trả về ngay;
+        transcript trùng đang xử lý đồng thời dùng chung một lời gọi Bedrock.
+        """
+        start_time = time.time()
+        cache = get_extraction_cache()
+        key = cache.make_key("voice", self.model_id, self.system_prompt, text) if cache else None
+        if cache is not None:
+            cached = await run_io(cache.get, key)
+            if cached is not None:
+                try:
+                    return self._to_schema(cached, start_time)
+                except ValueError:
+                    await run_io(cache.delete, key)
+
+        json_result = await self._coalesced(text, lambda: self.aextract_from_text(text, return_raw=False))
+        schema_result = self._to_schema(json_result, start_time)
+        if cache is not None and "error" not in json_result:
+            await run_io(cache.set, key, "voice", self.model_id, self.system_prompt, json_result)
+        return schema_result
+
+    async def _coalesced(self, text: str, func: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        if self.singleflight is None:
+            return await func()
+        return await self.singleflight.do(extraction_key(self.model_id, self.system_prompt, text), func)
+
+    def _to_schema(self, json_result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
         try:
             total_amount_data = json_result.get('total_amount', {})
             total_amount = VoiceTotalAmountSchema(
@@ -122,7 +154,9 @@ class BedrockVoiceExtractor:
                 'transactions': transactions,
                 'money_type': json_result.get('money_type', 'VND'),
                 'processing_time': round(processing_time, 2),
-                'tokens_used': json_result.get('tokens_used', 0)
+                'tokens_used': json_result.get('tokens_used', 0),
+                'cache_read_tokens': json_result.get('cache_read_tokens', 0),
+                'cache_write_tokens': json_result.get('cache_write_tokens', 0)
             }
             
         except Exception as e:
@@ -0,0 +1,191 @@
+"""
+Bill Cache
+
+Cache kết quả OCR và Bedrock extraction của ảnh hóa đơn, để người dùng chụp lại cùng một
+hóa đơn không phải chạy lại toàn bộ pipeline. Tra cứu theo hai tầng:
+    1. sha256 của file upload (trùng từng byte, không cần decode ảnh): dùng lại toàn bộ kết quả
+    2. perceptual hash (DCT 256-bit) của ảnh đã chuẩn hóa, so khớp theo khoảng cách Hamming:
+       chỉ dùng lại kết quả OCR, Bedrock vẫn chạy lại trên OCR text đó. Hai hóa đơn khác nhau
+       cùng mẫu của một cửa hàng có thể có hash gần nhau, nên số tiền không bao giờ được lấy
+       từ một ảnh chỉ "gần giống".
+Entry được tách theo user (cog_sub) và extraction mode để không bao giờ trả kết quả của người
+khác hoặc của mode khác.
+"""
+import copy
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+import cv2
+import numpy as np
+from app.config import settings
+from app.ai_models.bill_preprocess import find_receipt_region
+from app.services.cache import LRUCache
+
+_HASH_SIZE = 16
+_DCT_SIZE = 64
+HASH_BITS = _HASH_SIZE * _HASH_SIZE
+
+# Exact hit trả lại kết quả cũ mà không gọi OCR hay Bedrock
+_CACHED_USAGE = {"processing_time": 0.0, "tokens_used": 0, "cache_read_tokens": 0, "cache_write_tokens": 0}
+
+
+def perceptual_hash(image: np.ndarray) -> int:
+    """
+    256-bit DCT perceptual hash of a decoded BGR bill image.
+    Ảnh được crop về vùng hóa đơn trước khi hash để khác biệt khung hình ít ảnh hưởng.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    region = find_receipt_region(gray)
+    if region is not None:
+        x, y, w, h = region
+        gray = gray[y:y + h, x:x + w]
+
+    small = cv2.resize(gray, (_DCT_SIZE, _DCT_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low_freq = cv2.dct(small)[:_HASH_SIZE, :_HASH_SIZE].flatten()
+    # Bỏ hệ số DC (độ sáng trung bình) khi tính ngưỡng
+    bits = low_freq > np.median(low_freq[1:])
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BillCache:
+    """In-memory LRU cache of OCR/extraction results with exact and near-duplicate lookup"""
+
+    def __init__(self, max_entries: int, max_distance: int):
+        self.max_distance = max_distance
+        self.memory = LRUCache(max_entries, on_evict=self._on_evict)
+        self._index: Dict[str, Dict[str, int]] = {}
+        self._index_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.lookups = 0
+
+    @staticmethod
+    def make_key(content: bytes, cog_sub: str, mode: str) -> str:
+        """Exact key: sha256(user + extraction mode + raw upload bytes)"""
+        digest = hashlib.sha256(f"{cog_sub}:{mode}".encode("utf-8"))
+        digest.update(content)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _index_key(cog_sub: str, mode: str) -> str:
+        return f"{cog_sub}:{mode}"
+
+    def _on_evict(self, key: str, entry: Dict[str, Any]) -> None:
+        index_key = self._index_key(entry["cog_sub"], entry["mode"])
+        with self._index_lock:
+            user_index = self._index.get(index_key, {})
+            user_index.pop(key, None)
+            if not user_index:
+                self._index.pop(index_key, None)
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_exact(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Fast path: cùng một file đã được xử lý trước đó. Mỗi request gọi đúng một lần nên đây
+        là nơi đếm lookup. Kết quả trả về không tốn token Bedrock hay thời gian AI nào.
+        """
+        self._count("lookups")
+        entry = self.memory.get(key)
+        if entry is None:
+            return None
+        self._count("exact_hits")
+        entry = copy.deepcopy(entry)
+        entry["schema_result"].update(_CACHED_USAGE)
+        return entry
+
+    def find_similar(self, cog_sub: str, mode: str, phash: int) -> Optional[Dict[str, Any]]:
+        """
+        Tìm ảnh gần giống nhất của cùng user và mode trong ngưỡng Hamming, None nếu không có.
+        Caller chỉ được dùng lại ocr_result của entry, không dùng schema_result.
+        """
+        with self._index_lock:
+            candidates = list(self._index.get(self._index_key(cog_sub, mode), {}).items())
+
+        best_key, best_distance = None, self.max_distance + 1
+        for key, candidate_hash in candidates:
+            distance = hamming_distance(phash, candidate_hash)
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+
+        entry = self.memory.get(best_key) if best_key is not None else None
+        if entry is None:
+            return None
+        self._count("near_hits")
+        return copy.deepcopy(entry)
+
+    def set(
+        self,
+        key: str,
+        cog_sub: str,
+        mode: str,
+        phash: Optional[int],
+        ocr_result: Any,
+        schema_result: Dict[str, Any]
+    ) -> None:
+        entry = {
+            "cog_sub": cog_sub,
+            "mode": mode,
+            "phash": phash,
+            "ocr_result": copy.deepcopy(ocr_result),
+            "schema_result": copy.deepcopy(schema_result),
+        }
+        self.memory.set(key, entry)
+        if phash is not None:
+            with self._index_lock:
+                self._index.setdefault(self._index_key(cog_sub, mode), {})[key] = phash
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            hits = self.exact_hits + self.near_hits
+            lookups = self.lookups
+            return {
+                "enabled": True,
+                "entries": len(self.memory),
+                "max_entries": self.memory.max_entries,
+                "max_distance": self.max_distance,
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": lookups - hits,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_cache_lock = threading.Lock()
+_bill_cache: Optional[BillCache] = None
+
+
+def get_bill_cache() -> Optional[BillCache]:
+    """Get the bill cache instance (Singleton), None nếu cache bị tắt"""
+    global _bill_cache
+
+    if not settings.BILL_CACHE_ENABLED:
+        return None
+
+    if _bill_cache is None:
+        with _cache_lock:
+            if _bill_cache is None:
+                _bill_cache = BillCache(
+                    max_entries=settings.BILL_CACHE_MAX_ENTRIES,
+                    max_distance=settings.BILL_CACHE_MAX_DISTANCE
+                )
+    return _bill_cache
+
+
+def get_bill_cache_metrics() -> Dict[str, Any]:
+    """Exact/near-duplicate hit counters của bill cache"""
+    cache = get_bill_cache()
+    if cache is None:
+        return {"enabled": False}
+    return cache.stats()
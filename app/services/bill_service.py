@@ -1,14 +1,29 @@
-import os
+import asyncio
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 from fastapi import HTTPException, UploadFile
 from loguru import logger
 from app.models.bill import Bill, BillTotalAmount, BillTransactionDetail, BillTransactions
 from app.schemas.bill import BillResponse
 from app.services.utils import Utils
-from app.ai_models.bill import extract_bill_using_ocr_model, is_bill
+from app.services.executors import run_inference, run_io
+from app.ai_models.bill import (
+    decode_image,
+    detect_text_regions,
+    encode_image_for_vision,
+    extract_bill_using_ocr_model,
+    is_any_bill,
+    is_bill,
+    load_pdf_pages,
+    submit_recognition
+)
 from app.database import is_mongodb_connected
+from app.services.bill_cache import get_bill_cache, perceptual_hash
+from app.services.einvoice import cross_check_total, extract_from_document, extract_from_image_qr
+from app.ai_models.bill_layout import stitch_pages
+from app.config import settings
 from app.services.bedrock_extractor.bill import BedrockBillExtractor
+from app.services.bedrock_extractor.resilience import BedrockUnavailableError
 
 
 class BillService:
@@ -20,67 +35,264 @@ class BillService:
     ):
         self.bedrock_extractor = bedrock_extractor
 
-    async def process_via_bedrock(self, file: UploadFile, cog_sub: str) -> BillResponse:
-        """Process bill using AWS Bedrock Claude 3"""
+    async def process_via_bedrock(self, file: UploadFile, cog_sub: str, mode: Optional[str] = None) -> BillResponse:
+        """Process bill using AWS Bedrock Claude 3 (mode: ocr | vision, mặc định BILL_EXTRACTION_MODE)"""
         if not self.bedrock_extractor:
             raise HTTPException(status_code=503, detail="Bedrock Bill Service chưa được cấu hình")
         
-        return await self._process_pipeline(file, cog_sub, self.bedrock_extractor, "bedrock")
+        return await self._process_pipeline(
+            file, cog_sub, self.bedrock_extractor, "bedrock", mode or settings.BILL_EXTRACTION_MODE
+        )
+
+    async def process_document_via_bedrock(self, files: List[UploadFile], cog_sub: str) -> BillResponse:
+        """
+        Process one bill made of several photos and/or a multi-page PDF:
+        OCR các trang song song, nối text theo thứ tự, một lần gọi Bedrock, lưu một Bill
+        """
+        if not self.bedrock_extractor:
+            raise HTTPException(status_code=503, detail="Bedrock Bill Service chưa được cấu hình")
+
+        if not files:
+            raise HTTPException(status_code=400, detail="Cần ít nhất một file")
+
+        provider_name = "bedrock"
+        try:
+            pages: List[Any] = []
+            continuous: List[bool] = []
+            previous_is_photo = False
+            for file in files:
+                filename = file.filename or ""
+                content = await file.read()
+
+                if filename.lower().endswith(".pdf"):
+                    if settings.BILL_STRUCTURED_FAST_PATH_ENABLED and len(files) == 1:
+                        structured = await run_inference(extract_from_document, content, filename)
+                        if structured is not None:
+                            raw_text, schema_result = structured
+                            return await self._save_and_respond(filename, cog_sub, provider_name, schema_result, raw_text)
+
+                    try:
+                        pdf_pages = await run_inference(load_pdf_pages, content)
+                    except ValueError as e:
+                        raise HTTPException(status_code=400, detail=f"{filename}: {e}")
+                    pages.extend(pdf_pages)
+                    continuous.extend([False] * len(pdf_pages))
+                    previous_is_photo = False
+
+                elif Utils.is_valid_image_file(filename):
+                    try:
+                        pages.append(await run_inference(decode_image, content))
+                    except ValueError as e:
+                        raise HTTPException(status_code=400, detail=f"{filename}: {e}")
+                    # Ảnh chụp liền sau một ảnh khác được coi là phần tiếp theo của cùng hóa đơn
+                    continuous.append(previous_is_photo)
+                    previous_is_photo = True
+
+                else:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Định dạng file không hợp lệ: {filename}. Hỗ trợ: ảnh và pdf."
+                    )
+
+                if len(pages) > settings.BILL_DOCUMENT_MAX_PAGES:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Tối đa {settings.BILL_DOCUMENT_MAX_PAGES} trang/ảnh mỗi hóa đơn"
+                    )
+
+            photos = [page for page in pages if not isinstance(page, str)]
+            if settings.BILL_GATE_ENABLED and photos and not await run_inference(is_any_bill, photos):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Hệ thống nhận diện đây không phải là hình ảnh hóa đơn hợp lệ."
+                )
+
+            page_texts = await asyncio.gather(*(self._page_text(page) for page in pages))
+            document_text = stitch_pages(page_texts, continuous)
+
+            schema_result = await self.bedrock_extractor.aextract_to_schema(document_text)
+            return await self._save_and_respond(files[0].filename, cog_sub, provider_name, schema_result, document_text)
+
+        except HTTPException:
+            raise
+        except BedrockUnavailableError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers=e.headers)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Schema validation failed ({provider_name}): {str(e)}")
+        except Exception as e:
+            logger.error(f"Error in {provider_name} bill document pipeline: {e}")
+            raise HTTPException(status_code=500, detail=f"Lỗi xử lý hóa đơn: {str(e)}")
+
+    async def _page_text(self, page: Any) -> str:
+        """Text của một trang: text layer của PDF giữ nguyên, ảnh được OCR rồi dựng lại dòng"""
+        if isinstance(page, str):
+            return page
+        return self.bedrock_extractor.ocr_to_text(await self.run_ocr(page))
+
+    async def run_ocr(self, image: Any) -> List[Dict[str, Any]]:
+        """
+        OCR một ảnh đã decode. Detection chạy trên inference pool, recognition được gom
+        với các request khác qua batcher (chờ bằng asyncio nên không giữ inference thread)
+        """
+        if not settings.OCR_BATCH_ENABLED:
+            return await run_inference(extract_bill_using_ocr_model, image)
+
+        image_list = await run_inference(detect_text_regions, image)
+        return await asyncio.wrap_future(submit_recognition(image_list))
+
+    async def _extract(
+        self,
+        image: Any,
+        extractor: BedrockBillExtractor,
+        mode: str
+    ) -> Tuple[Any, Dict[str, Any]]:
+        """OCR (hoặc nén ảnh ở vision mode) rồi gọi Bedrock, trả về (ocr_result, schema_result)"""
+        if mode == "vision":
+            image_bytes = await run_inference(encode_image_for_vision, image)
+            return "", await extractor.aextract_image_to_schema(image_bytes)
+
+        ocr_result = await self.run_ocr(image)
+        return ocr_result, await extractor.aextract_to_schema(ocr_result)
 
     async def _process_pipeline(
         self,
         file: UploadFile,
         cog_sub: str,
         extractor: Union[BedrockBillExtractor],
-        provider_name: str
+        provider_name: str,
+        mode: str = "ocr"
     ) -> BillResponse:
-        """Common processing pipeline: Validate -> Check is_bill -> OCR -> Extract -> Save DB"""
-        temp_input_path = None
-        
+        """
+        Common processing pipeline: Validate -> Decode -> QR fast path -> Check is_bill -> OCR -> Extract -> QR total check -> Save DB.
+        Ở vision mode, bước OCR được thay bằng nén ảnh và gửi thẳng cho Bedrock.
+        File XML/PDF hóa đơn điện tử được parse trực tiếp, không qua OCR hay Bedrock;
+        PDF không có XML đính kèm được OCR từng trang như luồng document.
+        """
         try:
-            if not Utils.is_valid_image_file(file.filename):
+            is_einvoice = Utils.is_valid_einvoice_file(file.filename)
+            if not (is_einvoice or Utils.is_valid_image_file(file.filename)):
                 raise HTTPException(
                     status_code=400,
-                    detail="Định dạng file không hợp lệ. Hỗ trợ: jpg, jpeg, png, bmp, tiff, gif."
+                    detail="Định dạng file không hợp lệ. Hỗ trợ: jpg, jpeg, png, bmp, tiff, gif, xml, pdf."
                 )
 
             content = await file.read()
-            
-            # if not is_bill(content):
-            #     raise HTTPException(
-            #         status_code=400,
-            #         detail="Hệ thống nhận diện đây không phải là hình ảnh hóa đơn hợp lệ."
-            #     )
 
-            temp_input_path = Utils.save_temp_file(file, content)
+            if is_einvoice:
+                structured = await run_inference(extract_from_document, content, file.filename)
+                if structured is not None:
+                    raw_text, schema_result = structured
+                    return await self._save_and_respond(file.filename, cog_sub, provider_name, schema_result, raw_text)
+                if not file.filename.lower().endswith(".pdf"):
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Không tìm thấy dữ liệu hóa đơn điện tử (XML) trong file."
+                    )
+                # PDF scan/in thông thường không có XML đính kèm: quay về OCR + LLM
+                return await self._process_pdf(content, file.filename, cog_sub, extractor, provider_name)
+
+            # Cache: trùng file (sha256) dùng lại toàn bộ kết quả; ảnh gần giống (perceptual hash)
+            # chỉ dùng lại OCR, Bedrock vẫn trích xuất lại
+            cache = get_bill_cache()
+            cache_key = cache.make_key(content, cog_sub, mode) if cache else None
+            cached = cache.get_exact(cache_key) if cache else None
+            similar = None
+            phash = None
+            qr_total = None
 
-            ocr_result = extract_bill_using_ocr_model(temp_input_path)
+            if cached is None:
+                try:
+                    image = await run_inference(decode_image, content)
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
 
-            schema_result = extractor.extract_to_schema(ocr_result)
+                if settings.BILL_STRUCTURED_FAST_PATH_ENABLED:
+                    structured, qr_total = await run_inference(extract_from_image_qr, image)
+                    if structured is not None:
+                        cached = {"ocr_result": structured[0], "schema_result": structured[1], "phash": None}
 
-            bill_id = Utils.generate_unique_filename("bill", file.filename).replace(" ", "_")
-            bill_id = f"{bill_id}_{provider_name}"
-            utc_time = datetime.now(timezone.utc)
+            if cached is None:
+                if settings.BILL_GATE_ENABLED and not await run_inference(is_bill, image):
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Hệ thống nhận diện đây không phải là hình ảnh hóa đơn hợp lệ."
+                    )
 
-            raw_text_for_db = str(ocr_result) if isinstance(ocr_result, list) else ocr_result
-            self.save_to_database(bill_id, cog_sub, schema_result, raw_text_for_db, utc_time)
+                if cache:
+                    phash = await run_inference(perceptual_hash, image)
+                    # Vision mode không có OCR để dùng lại
+                    similar = cache.find_similar(cog_sub, mode, phash) if mode == "ocr" else None
 
-            
-            return self.create_response(bill_id, schema_result, utc_time)
+            if cached is not None:
+                logger.info(f"Bill for user {cog_sub} served from cache or QR, skipping OCR and Bedrock")
+                ocr_result, schema_result = cached["ocr_result"], cached["schema_result"]
+                phash = cached["phash"] if phash is None else phash
+            elif similar is not None:
+                logger.info(f"Near-duplicate bill for user {cog_sub}, reusing OCR and re-running Bedrock")
+                ocr_result = similar["ocr_result"]
+                schema_result = cross_check_total(await extractor.aextract_to_schema(ocr_result), qr_total)
+            else:
+                ocr_result, schema_result = await self._extract(image, extractor, mode)
+                schema_result = cross_check_total(schema_result, qr_total)
+
+            if cache:
+                cache.set(cache_key, cog_sub, mode, phash, ocr_result, schema_result)
+
+            raw_text_for_db = str(ocr_result) if isinstance(ocr_result, list) else ocr_result
+            return await self._save_and_respond(file.filename, cog_sub, provider_name, schema_result, raw_text_for_db)
 
         except HTTPException:
             raise
+        except BedrockUnavailableError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers=e.headers)
         except ValueError as e:
             raise HTTPException(status_code=422, detail=f"Schema validation failed ({provider_name}): {str(e)}")
         except Exception as e:
             logger.error(f"Error in {provider_name} bill pipeline: {e}")
             raise HTTPException(status_code=500, detail=f"Lỗi xử lý hóa đơn: {str(e)}")
-        finally:
-            if temp_input_path and os.path.exists(temp_input_path):
-                try:
-                    os.remove(temp_input_path)
-                except Exception:
-                    pass
+
+    async def _process_pdf(
+        self,
+        content: bytes,
+        filename: str,
+        cog_sub: str,
+        extractor: BedrockBillExtractor,
+        provider_name: str
+    ) -> BillResponse:
+        """PDF không có XML hóa đơn điện tử: rasterize/lấy text layer từng trang -> OCR -> Extract -> Save DB"""
+        try:
+            pages = await run_inference(load_pdf_pages, content)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{filename}: {e}")
+
+        photos = [page for page in pages if not isinstance(page, str)]
+        if settings.BILL_GATE_ENABLED and photos and not await run_inference(is_any_bill, photos):
+            raise HTTPException(
+                status_code=400,
+                detail="Hệ thống nhận diện đây không phải là hình ảnh hóa đơn hợp lệ."
+            )
+
+        page_texts = await asyncio.gather(*(self._page_text(page) for page in pages))
+        document_text = stitch_pages(page_texts, [False] * len(page_texts))
+
+        schema_result = await extractor.aextract_to_schema(document_text)
+        return await self._save_and_respond(filename, cog_sub, provider_name, schema_result, document_text)
+
+    async def _save_and_respond(
+        self,
+        filename: str,
+        cog_sub: str,
+        provider_name: str,
+        schema_result: Dict[str, Any],
+        raw_text_for_db: str
+    ) -> BillResponse:
+        bill_id = Utils.generate_unique_filename("bill", filename).replace(" ", "_")
+        bill_id = f"{bill_id}_{provider_name}"
+        utc_time = datetime.now(timezone.utc)
+
+        await run_io(self.save_to_database, bill_id, cog_sub, schema_result, raw_text_for_db, utc_time)
+
+        return self.create_response(bill_id, schema_result, utc_time)
 
     def save_to_database(
         self,
@@ -121,7 +333,9 @@ class BillService:
                 utc_time=utc_time,
                 money_type=schema_result.get("money_type", "VND"),
                 processing_time=schema_result.get("processing_time"),
-                tokens_used=schema_result.get("tokens_used")
+                tokens_used=schema_result.get("tokens_used"),
+                cache_read_tokens=schema_result.get("cache_read_tokens"),
+                cache_write_tokens=schema_result.get("cache_write_tokens")
             )
 
             bill_doc.save()
@@ -146,5 +360,7 @@ class BillService:
             money_type=schema_result.get("money_type", "VND"),
             utc_time=utc_time,
             processing_time=schema_result.get("processing_time"),
-            tokens_used=schema_result.get("tokens_used")
+            tokens_used=schema_result.get("tokens_used"),
+            cache_read_tokens=schema_result.get("cache_read_tokens"),
+            cache_write_tokens=schema_result.get("cache_write_tokens")
         )
\ No newline at end of file
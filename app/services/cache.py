@@ -0,0 +1,145 @@
+"""
+Cache Utilities
+
+LRU cache trong bộ nhớ và cache trên đĩa (giới hạn theo dung lượng) dùng chung cho các service.
+"""
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with hit/miss counters"""
+
+    def __init__(self, max_entries: int, on_evict: Optional[Callable[[str, Any], None]] = None):
+        self.max_entries = max(1, max_entries)
+        self.on_evict = on_evict
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                evicted_key, evicted_value = self._data.popitem(last=False)
+                if self.on_evict is not None:
+                    self.on_evict(evicted_key, evicted_value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class DiskCache:
+    """
+    JSON-file cache on local disk with size-based eviction.
+    Mỗi entry là một file; file ít được dùng gần đây nhất (theo mtime) bị xóa trước.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._total_bytes = sum(f.stat().st_size for f in self.directory.glob("*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Disk cache read failed for {path.name}: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        try:
+            payload = json.dumps(value, ensure_ascii=False).encode("utf-8")
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+
+            with self._lock:
+                previous = path.stat().st_size if path.exists() else 0
+                os.replace(temp_path, path)
+                self._total_bytes += len(payload) - previous
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+        except Exception as e:
+            logger.warning(f"Disk cache write failed for {path.name}: {e}")
+
+    def _evict(self) -> None:
+        files = []
+        for f in self.directory.glob("*.json"):
+            try:
+                stat = f.stat()
+                files.append((stat.st_mtime, stat.st_size, f))
+            except FileNotFoundError:
+                continue
+
+        self._total_bytes = sum(size for _, size, _ in files)
+        for _, size, f in sorted(files):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                f.unlink()
+                self._total_bytes -= size
+            except FileNotFoundError:
+                continue
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": str(self.directory),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
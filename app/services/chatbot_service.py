@@ -1,11 +1,14 @@
 from typing import List, Dict, Any, Optional
+from fastapi import HTTPException
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from loguru import logger
 from app.services.bedrock_extractor.chatbot import BedrockChatExtractor
+from app.services.bedrock_extractor.resilience import BedrockUnavailableError
 from app.ai_models.embeddings import get_embedding_model, get_embedding_dimension
 from app.config import settings
+from app.services.executors import run_inference, run_io
 import PyPDF2
 import io
 from datetime import datetime
@@ -65,7 +68,7 @@ class ChatbotService:
         """Ingest data from TXT or PDF file into Qdrant vector store"""
         try:
             if filename.endswith('.pdf'):
-                text_content = self._extract_text_from_pdf(file_content)
+                text_content = await run_inference(self._extract_text_from_pdf, file_content)
             elif filename.endswith('.txt'):
                 text_content = self._extract_text_from_txt(file_content)
             else:
@@ -91,7 +94,7 @@ class ChatbotService:
             ]
             
             # Thêm vào vector store với metadata
-            ids = self.vector_store.add_texts(texts=chunks, metadatas=metadatas)
+            ids = await run_inference(self.vector_store.add_texts, texts=chunks, metadatas=metadatas)
             
             return {
                 "status": "success",
@@ -140,25 +143,27 @@ class ChatbotService:
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
-    def ask(self, question: str) -> str:
+    async def ask(self, question: str) -> str:
         """RAG process: Retrieve similar vectors, contextualize, and generate response"""
         if not self.bedrock_extractor:
             return "Lỗi: Bedrock Chat Extractor chưa được khởi tạo."
 
         try:
-            docs = self.vector_store.similarity_search(question, k=3)
+            docs = await run_io(self.vector_store.similarity_search, question, k=3)
             
             if not docs:
                 return "Xin lỗi, tôi không tìm thấy thông tin liên quan trong dữ liệu."
 
             context_text = "\n\n".join([d.page_content for d in docs])
             
-            answer = self.bedrock_extractor.generate_response(
+            answer = await self.bedrock_extractor.agenerate_response(
                 context=context_text, 
                 question=question
             )
             return answer
 
+        except BedrockUnavailableError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers=e.headers)
         except Exception as e:
             return f"Đã xảy ra lỗi hệ thống: {str(e)}"
     
@@ -0,0 +1,250 @@
+"""
+E-invoice Fast Path
+
+Lấy dữ liệu hóa đơn có sẵn ở dạng máy đọc được, không cần OCR hay gọi LLM:
+    - QR code trên ảnh (OpenCV) chứa XML hóa đơn điện tử
+    - File XML hóa đơn điện tử theo Thông tư 78/2021/TT-BTC (HDon/DLHDon/NDHDon)
+    - File PDF hóa đơn điện tử có đính kèm XML gốc
+Kết quả có cùng dạng với BedrockBillExtractor.extract_to_schema; trả về None khi không tìm
+thấy dữ liệu có cấu trúc để pipeline quay về OCR + LLM.
+
+QR thanh toán (VietQR/EMVCo) hoặc chuỗi key=value chỉ có tổng tiền, không có các dòng hàng,
+nên chỉ được dùng để đối chiếu total_amount sau khi trích xuất bình thường.
+"""
+import re
+import time
+import zlib
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional, Tuple
+import cv2
+import defusedxml.ElementTree as SafeET
+import numpy as np
+from defusedxml import DefusedXmlException
+from loguru import logger
+from app.schemas.base import BillTotalAmountSchema, BillTransactionDetailSchema, BillTransactionsSchema
+
+# QR nhỏ trên hóa đơn vẫn đọc được ở độ phân giải này, ảnh lớn hơn chỉ làm chậm detector
+_QR_MAX_SIDE = 2000
+_MAX_PDF_STREAM_BYTES = 10 * 1024 * 1024
+
+# Tính chất dòng hàng (TChat) theo TT78: 1 hàng hóa, 2 khuyến mại, 3 chiết khấu, 4 ghi chú
+_SKIPPED_ITEM_KINDS = {"3", "4"}
+_AMOUNT_KEYS = ("tgtttbso", "tongtien", "tongthanhtoan", "sotien", "amount", "total")
+# Chênh lệch tương đối cho phép giữa tổng tiền trích xuất và số tiền trên QR thanh toán
+_QR_TOTAL_TOLERANCE = 0.01
+
+
+def _parse_amount(value: Optional[str]) -> Optional[float]:
+    """Số tiền dạng 125000, 125000.50 hoặc kiểu Việt Nam 125.000 / 1,250,000"""
+    if value is None:
+        return None
+    value = re.sub(r"[^\d.,-]", "", str(value))
+    if not value:
+        return None
+    if re.fullmatch(r"-?\d{1,3}([.,]\d{3})+", value):
+        value = re.sub(r"[.,]", "", value)
+    else:
+        value = value.replace(",", ".")
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def build_schema_result(
+    items: List[Dict[str, Any]],
+    total: Optional[float],
+    money_type: str = "VND",
+    start_time: Optional[float] = None
+) -> Optional[Dict[str, Any]]:
+    """Map dữ liệu có cấu trúc sang schema chuẩn của bill, None nếu không có gì dùng được"""
+    expenses = [
+        BillTransactionDetailSchema(
+            description=item["description"][:500],
+            amount=item["amount"],
+            quantity=item.get("quantity") or 1.0
+        )
+        for item in items
+        if item.get("description") and item.get("amount") is not None and item["amount"] >= 0
+    ]
+    if total is None:
+        total = sum(expense.amount for expense in expenses)
+    if not expenses and not total:
+        return None
+
+    return {
+        "total_amount": BillTotalAmountSchema(expenses=total),
+        "transactions": BillTransactionsSchema(expenses=expenses),
+        "money_type": money_type or "VND",
+        "processing_time": round(time.time() - start_time, 2) if start_time else 0.0,
+        "tokens_used": 0,
+        "cache_read_tokens": 0,
+        "cache_write_tokens": 0
+    }
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _find(element: ET.Element, name: str) -> Optional[ET.Element]:
+    """Tìm phần tử con đầu tiên theo tên, bỏ qua namespace"""
+    for child in element.iter():
+        if _local_name(child.tag) == name:
+            return child
+    return None
+
+
+def _find_text(element: ET.Element, name: str) -> Optional[str]:
+    found = _find(element, name)
+    return found.text.strip() if found is not None and found.text else None
+
+
+def parse_einvoice_xml(content: bytes | str) -> Optional[Dict[str, Any]]:
+    """Parse hóa đơn điện tử XML theo TT78 (HDon), None nếu không đúng định dạng"""
+    start_time = time.time()
+    try:
+        root = SafeET.fromstring(content)
+    except (ET.ParseError, DefusedXmlException):
+        return None
+
+    invoice = root if _local_name(root.tag) == "HDon" else _find(root, "HDon")
+    if invoice is None:
+        return None
+
+    items = []
+    for element in invoice.iter():
+        if _local_name(element.tag) != "HHDVu":
+            continue
+        if _find_text(element, "TChat") in _SKIPPED_ITEM_KINDS:
+            continue
+        quantity = _parse_amount(_find_text(element, "SLuong"))
+        amount = _parse_amount(_find_text(element, "ThTien"))
+        if amount is None:
+            unit_price = _parse_amount(_find_text(element, "DGia"))
+            amount = unit_price * (quantity or 1.0) if unit_price is not None else None
+        items.append({
+            "description": _find_text(element, "THHDVu"),
+            "quantity": quantity,
+            "amount": amount,
+        })
+
+    total = _parse_amount(_find_text(invoice, "TgTTTBSo"))
+    money_type = _find_text(invoice, "DVTTe") or "VND"
+    return build_schema_result(items, total, money_type, start_time)
+
+
+def _parse_emv_tlv(payload: str) -> Dict[str, str]:
+    fields, position = {}, 0
+    while position + 4 <= len(payload):
+        tag, length = payload[position:position + 2], payload[position + 2:position + 4]
+        if not length.isdigit():
+            break
+        fields[tag] = payload[position + 4:position + 4 + int(length)]
+        position += 4 + int(length)
+    return fields
+
+
+def parse_qr_payload(payload: str) -> Optional[Dict[str, Any]]:
+    """Parse QR chứa XML hóa đơn điện tử (HDon), None với mọi loại QR khác"""
+    payload = payload.strip()
+    if "<HDon" not in payload:
+        return None
+    return parse_einvoice_xml(payload.encode("utf-8"))
+
+
+def parse_qr_total(payload: str) -> Optional[float]:
+    """
+    Tổng tiền trong QR thanh toán: VietQR/EMVCo (tag 54) hoặc chuỗi key=value có trường
+    tổng tiền. None nếu QR không có số tiền (VD: VietQR tĩnh).
+    """
+    payload = payload.strip()
+    if payload.startswith("000201"):
+        return _parse_amount(_parse_emv_tlv(payload).get("54")) or None
+
+    pairs = dict(
+        (key.strip().lower().replace("_", ""), value.strip())
+        for key, value in re.findall(r"([A-Za-z_]+)\s*[=:]\s*([^;|&\n]+)", payload)
+    )
+    return next((_parse_amount(pairs[key]) for key in _AMOUNT_KEYS if key in pairs), None) or None
+
+
+def cross_check_total(schema_result: Dict[str, Any], qr_total: Optional[float]) -> Dict[str, Any]:
+    """
+    Đối chiếu total_amount đã trích xuất với số tiền trên QR thanh toán: chỉ điền vào khi
+    không trích xuất được tổng tiền, lệch nhau thì log cảnh báo và giữ kết quả trích xuất
+    """
+    if not qr_total:
+        return schema_result
+
+    extracted = schema_result["total_amount"].expenses
+    if not extracted:
+        logger.info(f"Bill total missing from extraction, using payment QR amount {qr_total}")
+        schema_result["total_amount"] = BillTotalAmountSchema(expenses=qr_total)
+    elif abs(extracted - qr_total) > max(1.0, qr_total * _QR_TOTAL_TOLERANCE):
+        logger.warning(f"Bill total {extracted} differs from payment QR amount {qr_total}")
+    return schema_result
+
+
+def decode_qr_codes(image: np.ndarray) -> List[str]:
+    """Detect and decode every QR code in a decoded BGR image"""
+    scale = min(1.0, _QR_MAX_SIDE / max(image.shape[:2]))
+    if scale < 1.0:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    try:
+        ok, decoded, _, _ = cv2.QRCodeDetector().detectAndDecodeMulti(image)
+    except cv2.error as e:
+        logger.warning(f"QR detection failed: {e}")
+        return []
+    return [text for text in decoded if text] if ok else []
+
+
+def extract_from_image_qr(
+    image: np.ndarray
+) -> Tuple[Optional[Tuple[str, Dict[str, Any]]], Optional[float]]:
+    """
+    Đọc QR trên ảnh một lần: ((nội dung QR, schema_result) của QR hóa đơn điện tử đầu tiên
+    hoặc None, tổng tiền của QR thanh toán đầu tiên hoặc None)
+    """
+    qr_total = None
+    for payload in decode_qr_codes(image):
+        result = parse_qr_payload(payload)
+        if result is not None:
+            logger.info("Bill extracted from e-invoice QR code, skipping OCR and Bedrock")
+            return (payload, result), None
+        qr_total = qr_total or parse_qr_total(payload)
+    return None, qr_total
+
+
+def find_xml_in_pdf(content: bytes) -> Optional[bytes]:
+    """
+    Tìm XML hóa đơn điện tử đính kèm trong PDF bằng cách giải nén từng stream
+    (không cần thư viện PDF; file đính kèm là stream FlateDecode hoặc không nén)
+    """
+    for match in re.finditer(rb"stream\r?\n(.*?)\r?\nendstream", content, re.DOTALL):
+        data = match.group(1)
+        if b"<HDon" not in data:
+            try:
+                data = zlib.decompressobj().decompress(data, _MAX_PDF_STREAM_BYTES)
+            except zlib.error:
+                continue
+        if b"<HDon" in data:
+            start = data.find(b"<?xml")
+            start = start if 0 <= start < data.find(b"<HDon") else data.find(b"<HDon")
+            # Cắt tại thẻ đóng để byte thừa sau </HDon> không làm hỏng XML
+            end = data.rfind(b"</HDon>")
+            return data[start:end + len(b"</HDon>")] if end > start else data[start:]
+    return None
+
+
+def extract_from_document(content: bytes, filename: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Fast path cho file .xml/.pdf hóa đơn điện tử: (XML gốc, schema_result) hoặc None"""
+    xml_content = find_xml_in_pdf(content) if filename.lower().endswith(".pdf") else content
+    if not xml_content:
+        return None
+
+    result = parse_einvoice_xml(xml_content)
+    if result is None:
+        return None
+    return xml_content.decode("utf-8", errors="replace"), result
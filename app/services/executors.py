@@ -0,0 +1,79 @@
+"""
+Execution Layer
+
+Các thread pool riêng biệt cho công việc blocking, để event loop của uvicorn luôn rảnh:
+- inference pool: CPU-bound model inference (PhoWhisper, EasyOCR, bill classifier)
+- io pool: blocking network I/O (MongoEngine, Qdrant); Bedrock có pool riêng trong BedrockTransport
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+from loguru import logger
+from app.config import settings
+
+T = TypeVar("T")
+
+_executor_lock = threading.Lock()
+_inference_executor: Optional[ThreadPoolExecutor] = None
+_io_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_inference_executor() -> ThreadPoolExecutor:
+    """Get the bounded pool for CPU-bound model inference (Singleton)"""
+    global _inference_executor
+
+    if _inference_executor is None:
+        with _executor_lock:
+            if _inference_executor is None:
+                _inference_executor = ThreadPoolExecutor(
+                    max_workers=settings.INFERENCE_POOL_SIZE,
+                    thread_name_prefix="inference"
+                )
+    return _inference_executor
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Get the bounded pool for blocking network I/O (Singleton)"""
+    global _io_executor
+
+    if _io_executor is None:
+        with _executor_lock:
+            if _io_executor is None:
+                _io_executor = ThreadPoolExecutor(
+                    max_workers=settings.IO_POOL_SIZE,
+                    thread_name_prefix="blocking-io"
+                )
+    return _io_executor
+
+
+async def run_inference(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a CPU-bound model call in the inference pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_inference_executor(),
+        functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_io(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking network call in the I/O pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_io_executor(),
+        functools.partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_executors() -> None:
+    """Đóng các thread pool khi ứng dụng shutdown"""
+    global _inference_executor, _io_executor
+
+    with _executor_lock:
+        for name, executor in (("inference", _inference_executor), ("io", _io_executor)):
+            if executor is not None:
+                logger.info(f"Shutting down {name} executor...")
+                executor.shutdown(wait=True, cancel_futures=True)
+        _inference_executor = None
+        _io_executor = None
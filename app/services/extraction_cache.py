@@ -0,0 +1,151 @@
+"""
+Extraction Cache
+
+Cache bền (MongoDB) kết quả Bedrock extraction theo hash của model ID, prompt template và
+input đã chuẩn hóa, để các transcript / OCR text lặp lại (VD: "ăn sáng ba mươi nghìn")
+không phải gọi lại Bedrock. Entry hết hạn bằng TTL index (expires_at) của MongoDB và bị xóa bớt theo số
+lượng (ít dùng gần đây nhất trước). Sửa file prompt làm đổi template hash nên các entry cũ
+tự động không còn được dùng.
+"""
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from loguru import logger
+from app.config import settings
+from app.database import is_mongodb_connected
+from app.models.extraction_cache import ExtractionCacheEntry
+from app.services.bedrock_extractor.singleflight import extraction_key, template_version
+
+# Các field usage không được cache: một lần hit không tốn token Bedrock nào
+_USAGE_FIELDS = ("tokens_used", "cache_read_tokens", "cache_write_tokens")
+
+
+class ExtractionCache:
+    """MongoDB-backed extraction result cache with TTL and count-based eviction"""
+
+    def __init__(self, max_entries: int, evict_every: int = 50):
+        self.max_entries = max(1, max_entries)
+        self.evict_every = max(1, evict_every)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalid = 0
+        self.errors = 0
+
+    @staticmethod
+    def make_key(kind: str, model_id: str, template: str, text: str) -> str:
+        """OCR text hóa đơn giữ khoảng cách cột, transcript voice được gộp khoảng trắng"""
+        return extraction_key(f"{kind}:{model_id}", template, text, preserve_layout=kind == "bill")
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Kết quả extraction đã cache (JSON chưa chuyển schema), None nếu miss"""
+        try:
+            # Đọc và cập nhật hits/last_hit_at trong một lần find-and-modify
+            entry = ExtractionCacheEntry.objects(cache_key=key).only("result").modify(
+                inc__hits=1,
+                set__last_hit_at=datetime.now(timezone.utc)
+            )
+        except Exception as e:
+            logger.warning(f"Extraction cache read failed: {e}")
+            self._count("errors")
+            return None
+
+        if entry is None:
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        return dict(entry.result)
+
+    def set(self, key: str, kind: str, model_id: str, template: str, result: Dict[str, Any]) -> None:
+        value = {k: v for k, v in result.items() if k not in _USAGE_FIELDS and k != "raw_response"}
+        now = datetime.now(timezone.utc)
+        try:
+            ExtractionCacheEntry.objects(cache_key=key).update_one(
+                upsert=True,
+                set__kind=kind,
+                set__model_id=model_id,
+                set__template_version=template_version(template),
+                set__result=value,
+                set__created_at=now,
+                set__last_hit_at=now,
+                set__expires_at=now + timedelta(hours=settings.EXTRACTION_CACHE_TTL_HOURS)
+            )
+        except Exception as e:
+            logger.warning(f"Extraction cache write failed: {e}")
+            self._count("errors")
+            return
+
+        with self._lock:
+            self._writes += 1
+            should_evict = self._writes % self.evict_every == 0
+        if should_evict:
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        """Xóa entry không còn hợp lệ với schema hiện tại"""
+        self._count("invalid")
+        try:
+            ExtractionCacheEntry.objects(cache_key=key).delete()
+        except Exception as e:
+            logger.warning(f"Extraction cache delete failed: {e}")
+
+    def _evict(self) -> None:
+        """Giữ tối đa max_entries entry, xóa entry lâu không được dùng nhất"""
+        try:
+            overflow = ExtractionCacheEntry.objects.count() - self.max_entries
+            if overflow <= 0:
+                return
+            stale_ids = [
+                entry.id for entry in
+                ExtractionCacheEntry.objects.order_by("last_hit_at").only("id").limit(overflow)
+            ]
+            ExtractionCacheEntry.objects(id__in=stale_ids).delete()
+            logger.info(f"Extraction cache evicted {len(stale_ids)} entries")
+        except Exception as e:
+            logger.warning(f"Extraction cache eviction failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "max_entries": self.max_entries,
+                "ttl_hours": settings.EXTRACTION_CACHE_TTL_HOURS,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalid": self.invalid,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_cache_lock = threading.Lock()
+_extraction_cache: Optional[ExtractionCache] = None
+
+
+def get_extraction_cache() -> Optional[ExtractionCache]:
+    """Get the extraction cache instance (Singleton), None nếu cache bị tắt hoặc chưa có MongoDB"""
+    global _extraction_cache
+
+    if not settings.EXTRACTION_CACHE_ENABLED or not is_mongodb_connected():
+        return None
+
+    if _extraction_cache is None:
+        with _cache_lock:
+            if _extraction_cache is None:
+                _extraction_cache = ExtractionCache(max_entries=settings.EXTRACTION_CACHE_MAX_ENTRIES)
+    return _extraction_cache
+
+
+def get_extraction_cache_metrics() -> Dict[str, Any]:
+    """Hit/miss counters của extraction cache"""
+    cache = get_extraction_cache()
+    if cache is None:
+        return {"enabled": False}
+    return cache.stats()
@@ -0,0 +1,95 @@
+"""
+Transcript Cache
+
+Cache kết quả transcribe theo hash của audio đã giải mã + tên model, để các lần
+upload lại cùng một voice note không phải chạy lại PhoWhisper.
+"""
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+import numpy as np
+from app.config import settings
+from app.services.cache import DiskCache, LRUCache
+
+
+class TranscriptCache:
+    """Two-tier transcript cache: in-memory LRU, then optional on-disk tier"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 0
+    ):
+        self.memory = LRUCache(max_entries)
+        self.disk = DiskCache(disk_dir, disk_max_bytes) if disk_dir else None
+
+    @staticmethod
+    def make_key(audio: np.ndarray, model_name: str) -> str:
+        """Content-addressed key: sha256(model name + decoded samples)"""
+        digest = hashlib.sha256(model_name.encode("utf-8"))
+        digest.update(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        text = self.memory.get(key)
+        if text is not None:
+            return text
+
+        if self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                text = entry.get("text")
+                self.memory.set(key, text)
+                return text
+        return None
+
+    def set(self, key: str, text: str) -> None:
+        self.memory.set(key, text)
+        if self.disk is not None:
+            self.disk.set(key, {"text": text})
+
+    def stats(self) -> Dict[str, Any]:
+        memory_stats = self.memory.stats()
+        disk_stats = self.disk.stats() if self.disk is not None else None
+        hits = memory_stats["hits"] + (disk_stats["hits"] if disk_stats else 0)
+        misses = disk_stats["misses"] if disk_stats else memory_stats["misses"]
+        lookups = hits + misses
+        return {
+            "enabled": True,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "memory": memory_stats,
+            "disk": disk_stats,
+        }
+
+
+_cache_lock = threading.Lock()
+_transcript_cache: Optional[TranscriptCache] = None
+
+
+def get_transcript_cache() -> Optional[TranscriptCache]:
+    """Get the transcript cache instance (Singleton), None nếu cache bị tắt"""
+    global _transcript_cache
+
+    if not settings.TRANSCRIPT_CACHE_ENABLED:
+        return None
+
+    if _transcript_cache is None:
+        with _cache_lock:
+            if _transcript_cache is None:
+                _transcript_cache = TranscriptCache(
+                    max_entries=settings.TRANSCRIPT_CACHE_MAX_ENTRIES,
+                    disk_dir=settings.TRANSCRIPT_CACHE_DIR,
+                    disk_max_bytes=settings.TRANSCRIPT_CACHE_DISK_MAX_MB * 1024 * 1024
+                )
+    return _transcript_cache
+
+
+def get_transcript_cache_metrics() -> Dict[str, Any]:
+    """Hit/miss counters của transcript cache"""
+    cache = get_transcript_cache()
+    if cache is None:
+        return {"enabled": False}
+    return cache.stats()
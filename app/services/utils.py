@@ -1,11 +1,9 @@
 import datetime
 from datetime import datetime, timezone
 import os
+import subprocess
 import tempfile
-from fastapi import UploadFile
-from pathlib import Path
-from typing import Union
-from pydub import AudioSegment
+import numpy as np
 
 
 class Utils:
@@ -17,6 +15,13 @@ class Utils:
         valid_extensions = [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".gif"]
         return any(filename.lower().endswith(ext) for ext in valid_extensions)
     
+    @staticmethod
+    def is_valid_einvoice_file(filename: str) -> bool:
+        """Kiểm tra file hóa đơn điện tử (XML hoặc PDF có đính kèm XML)"""
+        if not filename:
+            return False
+        return filename.lower().endswith((".xml", ".pdf"))
+
     @staticmethod
     def is_valid_audio_file(filename: str) -> bool:
         """Kiểm tra định dạng file âm thanh hợp lệ"""
@@ -25,23 +30,6 @@ class Utils:
         valid_extensions = [".mp3", ".wav", ".m4a", ".flac", ".aac", ".ogg"]
         return any(filename.lower().endswith(ext) for ext in valid_extensions)
     
-    @staticmethod
-    def save_temp_file(file: UploadFile, content: bytes) -> str:
-        """Lưu file tải lên vào thư mục tạm thời"""
-        temp_dir = tempfile.gettempdir()
-        temp_path = os.path.join(temp_dir, f"input_{file.filename}")
-        
-        with open(temp_path, "wb") as buffer:
-            buffer.write(content)
-        
-        return temp_path
-    
-    @staticmethod
-    def remove_temp_file(file_path: str):
-        """Xóa file tạm thời"""
-        if os.path.exists(file_path):
-            os.remove(file_path)
-
     @staticmethod
     def generate_unique_filename(prefix: str, original_filename: str) -> str:
         """Tạo tên file duy nhất dựa trên tên gốc và timestamp"""
@@ -51,47 +39,60 @@ class Utils:
         return unique_filename
     
     @staticmethod
-    def convert_audio_to_wav(
-        input_file: Union[str, Path],
-        output_file: Union[str, Path, None] = None,
+    def decode_audio_bytes(
+        content: bytes,
         sample_rate: int = 16000,
         channels: int = 1
-    ) -> str:
+    ) -> np.ndarray:
         """
-        Chuyển đổi file âm thanh bất kỳ (mp3, aac, m4a, ogg, flac, mp2, v.v.) sang định dạng .wav
-        
+        Giải mã file âm thanh bất kỳ (mp3, aac, m4a, ogg, flac, wav, v.v.) trực tiếp trong bộ nhớ
+        bằng một tiến trình ffmpeg, trả về buffer float32 mono dùng cho speech recognition
+
         Args:
-            input_file: Đường dẫn đến file âm thanh đầu vào
-            output_file: Đường dẫn đến file .wav đầu ra (nếu None, sẽ tạo file tạm)
+            content: Nội dung file âm thanh đầu vào
             sample_rate: Tần số lấy mẫu (Hz), mặc định 16000 cho speech recognition
             channels: Số kênh âm thanh (1=mono, 2=stereo), mặc định 1
-        
+
         Returns:
-            str: Đường dẫn đến file .wav đã chuyển đổi
+            np.ndarray: Mẫu âm thanh float32 trong khoảng [-1, 1]
         """
-        input_path = Path(input_file)
-        
-        if not input_path.exists():
-            raise FileNotFoundError(f"File không tồn tại: {input_file}")
-        
-        if output_file is None:
-            temp_dir = tempfile.gettempdir()
-            output_file = os.path.join(temp_dir, f"{input_path.stem}_converted.wav")
-        
-        output_path = Path(output_file)
-        
+        output_args = [
+            "-f", "f32le",
+            "-acodec", "pcm_f32le",
+            "-ac", str(channels),
+            "-ar", str(sample_rate),
+            "pipe:1"
+        ]
+
         try:
-            audio = AudioSegment.from_file(str(input_path))
-            audio = audio.set_frame_rate(sample_rate)
-            audio = audio.set_channels(channels)
-            
-            audio.export(
-                str(output_path),
-                format="wav",
-                parameters=["-ac", str(channels), "-ar", str(sample_rate)]
+            process = subprocess.run(
+                ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0", *output_args],
+                input=content,
+                capture_output=True,
+                check=False
             )
-            
-            return str(output_path)
-            
+
+            # Container như m4a/mp4 có moov atom ở cuối file không đọc được từ pipe,
+            # khi đó ffmpeg cần một file có thể seek
+            if process.returncode != 0 or not process.stdout:
+                with tempfile.NamedTemporaryFile(prefix="input_", delete=True) as temp_file:
+                    temp_file.write(content)
+                    temp_file.flush()
+                    process = subprocess.run(
+                        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", temp_file.name, *output_args],
+                        capture_output=True,
+                        check=False
+                    )
+
+            if process.returncode != 0:
+                raise RuntimeError(process.stderr.decode("utf-8", errors="ignore").strip())
+
+        except FileNotFoundError:
+            raise Exception("Lỗi khi giải mã file âm thanh: không tìm thấy ffmpeg")
         except Exception as e:
-            raise Exception(f"Lỗi khi chuyển đổi file âm thanh: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Lỗi khi giải mã file âm thanh: {str(e)}")
+
+        audio = np.frombuffer(process.stdout, dtype=np.float32)
+        if channels > 1:
+            audio = audio.reshape(-1, channels)
+        return audio
@@ -1,14 +1,23 @@
-import os
+import asyncio
+import time
+import numpy as np
 from datetime import datetime, timezone
-from typing import Dict, Any, Union, Optional
-from fastapi import UploadFile, HTTPException
+from typing import Dict, Any, List, Tuple, Union, Optional
+from fastapi import UploadFile, HTTPException, WebSocket, WebSocketDisconnect, status
 from loguru import logger
+from mongoengine.errors import ValidationError
 from app.services.utils import Utils
-from app.ai_models.voice import transcribe_audio_file
+from app.services.executors import run_inference, run_io
+from app.services.transcript_cache import get_transcript_cache
+from app.services.voice_stream import VoiceStreamSession
+from app.ai_models.voice import submit_chunked_transcription, merge_chunk_transcripts, get_transcriber_model_id
+from app.ai_models.vad import trim_silence
 from app.models.voice import Voice, VoiceTransactionDetail, VoiceTransactions, VoiceTotalAmount
 from app.database import is_mongodb_connected
-from app.schemas.voice import VoiceResponse
+from app.schemas.voice import VoiceResponse, VoiceBatchItem, VoiceBatchResponse
+from app.config import settings
 from app.services.bedrock_extractor.voice import BedrockVoiceExtractor
+from app.services.bedrock_extractor.resilience import BedrockUnavailableError
 
 
 class VoiceService:
@@ -20,31 +29,49 @@ class VoiceService:
     ):
         self.bedrock_extractor = bedrock_extractor
 
-    def transcribe_audio(self, audio_path: str) -> str:
-        """Convert audio file to text"""
-        wav_path = Utils.convert_audio_to_wav(
-            input_file=audio_path,
-            sample_rate=16000,
-            channels=1
+    async def transcribe_audio(self, audio: np.ndarray, sample_rate: int = 16000) -> str:
+        """Convert decoded audio samples to text"""
+        if audio.size == 0:
+            raise HTTPException(
+                status_code=400,
+                detail="File âm thanh không có dữ liệu"
+            )
+
+        transcript_cache = get_transcript_cache()
+        cache_key = None
+        if transcript_cache is not None:
+            cache_key = await run_inference(transcript_cache.make_key, audio, get_transcriber_model_id())
+            cached_text = await run_io(transcript_cache.get, cache_key)
+            if cached_text:
+                logger.info(f"ASR: transcript cache hit for {len(audio) / sample_rate:.2f}s audio")
+                return cached_text
+
+        speech, removed_seconds = await run_inference(trim_silence, audio, sample_rate)
+        if speech.size == 0:
+            raise HTTPException(
+                status_code=400,
+                detail="Không phát hiện giọng nói trong file âm thanh"
+            )
+
+        asr_start = time.perf_counter()
+        futures = submit_chunked_transcription(speech, sample_rate)
+        chunk_texts = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        transcription_text = merge_chunk_transcripts(list(chunk_texts))
+
+        logger.info(
+            f"ASR: {len(audio) / sample_rate:.2f}s audio, VAD removed {removed_seconds:.2f}s, "
+            f"transcribed in {time.perf_counter() - asr_start:.2f}s"
         )
         
-        try:
-            transcription_result = transcribe_audio_file(wav_path)
-            transcription_text = transcription_result.get("text", "")
-            
-            if not transcription_text:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Không thể transcribe được nội dung từ file âm thanh"
-                )
-            return transcription_text
-            
-        finally:
-            if os.path.exists(wav_path):
-                try:
-                    os.remove(wav_path)
-                except Exception:
-                    pass
+        if not transcription_text:
+            raise HTTPException(
+                status_code=400,
+                detail="Không thể transcribe được nội dung từ file âm thanh"
+            )
+
+        if transcript_cache is not None:
+            await run_io(transcript_cache.set, cache_key, transcription_text)
+        return transcription_text
 
     async def process_via_bedrock(self, file: UploadFile, cog_sub: str) -> VoiceResponse:
         """Process audio file using AWS Bedrock Claude 3 for data extraction"""
@@ -60,9 +87,7 @@ class VoiceService:
         extractor: Union[BedrockVoiceExtractor],
         provider_name: str
     ) -> VoiceResponse:
-        """Common processing pipeline: Validate -> Save Temp -> Transcribe -> Extract -> Save DB"""
-        temp_input_path = None
-        
+        """Common processing pipeline: Validate -> Decode -> Transcribe -> Extract -> Save DB"""
         try:
             if not Utils.is_valid_audio_file(file.filename):
                 raise HTTPException(
@@ -71,33 +96,221 @@ class VoiceService:
                 )
             
             content = await file.read()
-            temp_input_path = Utils.save_temp_file(file, content)
+            audio = await run_inference(Utils.decode_audio_bytes, content, sample_rate=16000, channels=1)
             
-            transcription_text = self.transcribe_audio(temp_input_path)
+            transcription_text = await self.transcribe_audio(audio, sample_rate=16000)
             
-            schema_result = extractor.extract_to_schema(transcription_text)
-            
-            voice_id = Utils.generate_unique_filename("voice", file.filename).replace(" ", "_")
-            voice_id = f"{voice_id}_{provider_name}" 
-            utc_time = datetime.now(timezone.utc)
-            
-            self.save_to_database(voice_id, cog_sub, schema_result, transcription_text, utc_time)
-            
-            return self.create_response(voice_id, schema_result, utc_time)
+            return await self._extract_and_save(transcription_text, file.filename, cog_sub, extractor, provider_name)
             
         except HTTPException:
             raise
+        except BedrockUnavailableError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers=e.headers)
         except ValueError as e:
             raise HTTPException(status_code=422, detail=f"Schema validation failed ({provider_name}): {str(e)}")
         except Exception as e:
             logger.error(f"Error in {provider_name} pipeline: {e}")
             raise HTTPException(status_code=500, detail=f"Lỗi xử lý hệ thống: {str(e)}")
+
+    @staticmethod
+    def _error_detail(error: Exception, provider_name: str) -> Tuple[int, str]:
+        """Map một lỗi của pipeline sang (status_code, detail) giống _process_pipeline"""
+        if isinstance(error, HTTPException):
+            return error.status_code, error.detail
+        if isinstance(error, BedrockUnavailableError):
+            return 503, str(error)
+        if isinstance(error, ValueError):
+            return 422, f"Schema validation failed ({provider_name}): {str(error)}"
+        logger.error(f"Error in {provider_name} pipeline: {error}")
+        return 500, f"Lỗi xử lý hệ thống: {str(error)}"
+
+    async def process_batch_via_bedrock(self, files: List[UploadFile], cog_sub: str) -> VoiceBatchResponse:
+        """
+        Process many audio files in one request: decode concurrently, transcribe through the
+        shared micro-batcher, extract with bounded Bedrock parallelism, then bulk insert to MongoDB
+        """
+        if not self.bedrock_extractor:
+            raise HTTPException(status_code=503, detail="Bedrock Service chưa được cấu hình")
+
+        if not files:
+            raise HTTPException(status_code=400, detail="Không có file nào được tải lên")
+
+        if len(files) > settings.VOICE_BATCH_MAX_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Tối đa {settings.VOICE_BATCH_MAX_FILES} file mỗi request"
+            )
+
+        extractor = self.bedrock_extractor
+        provider_name = "bedrock"
+        extract_semaphore = asyncio.Semaphore(settings.VOICE_BATCH_EXTRACT_CONCURRENCY)
+
+        async def process_one(file: UploadFile) -> Tuple[str, Dict[str, Any], str, datetime]:
+            if not Utils.is_valid_audio_file(file.filename):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Định dạng file không hợp lệ. Hỗ trợ: mp3, wav, m4a, flac, aac, ogg."
+                )
+
+            content = await file.read()
+            audio = await run_inference(Utils.decode_audio_bytes, content, sample_rate=16000, channels=1)
+            transcription_text = await self.transcribe_audio(audio, sample_rate=16000)
+
+            async with extract_semaphore:
+                schema_result = await extractor.aextract_to_schema(transcription_text)
+
+            voice_id = Utils.generate_unique_filename("voice", file.filename).replace(" ", "_")
+            return f"{voice_id}_{provider_name}", schema_result, transcription_text, datetime.now(timezone.utc)
+
+        outcomes = await asyncio.gather(*(process_one(file) for file in files), return_exceptions=True)
+
+        items: List[VoiceBatchItem] = []
+        voice_docs: List[Voice] = []
+        for file, outcome in zip(files, outcomes):
+            if isinstance(outcome, BaseException):
+                if not isinstance(outcome, Exception):
+                    raise outcome
+                status_code, detail = self._error_detail(outcome, provider_name)
+                items.append(VoiceBatchItem(
+                    filename=file.filename or "",
+                    status="error",
+                    status_code=status_code,
+                    error=str(detail)
+                ))
+                continue
+
+            voice_id, schema_result, transcription_text, utc_time = outcome
+            voice_doc = self.build_document(voice_id, cog_sub, schema_result, transcription_text, utc_time)
+            try:
+                # Validate từng document để một item lỗi không làm hỏng cả bulk insert
+                voice_doc.validate()
+            except ValidationError as e:
+                logger.warning(f"Invalid voice document for {file.filename}: {e}")
+                items.append(VoiceBatchItem(
+                    filename=file.filename or "",
+                    status="error",
+                    status_code=422,
+                    saved=False,
+                    error=f"Schema validation failed ({provider_name}): {str(e)}"
+                ))
+                continue
+
+            voice_docs.append(voice_doc)
+            items.append(VoiceBatchItem(
+                filename=file.filename or "",
+                status="success",
+                status_code=200,
+                result=self.create_response(voice_id, schema_result, utc_time)
+            ))
+
+        saved = await run_io(self.save_many_to_database, voice_docs)
+        for item in items:
+            if item.status == "success":
+                item.saved = saved
+
+        succeeded = sum(1 for item in items if item.status == "success")
+        return VoiceBatchResponse(
+            total=len(items),
+            succeeded=succeeded,
+            failed=len(items) - succeeded,
+            saved=len(voice_docs) if saved else 0,
+            items=items
+        )
+
+    async def _extract_and_save(
+        self,
+        transcription_text: str,
+        source_name: str,
+        cog_sub: str,
+        extractor: Union[BedrockVoiceExtractor],
+        provider_name: str
+    ) -> VoiceResponse:
+        """Extract -> Save DB -> Response cho một transcript"""
+        schema_result = await extractor.aextract_to_schema(transcription_text)
+        
+        voice_id = Utils.generate_unique_filename("voice", source_name).replace(" ", "_")
+        voice_id = f"{voice_id}_{provider_name}" 
+        utc_time = datetime.now(timezone.utc)
+        
+        await run_io(self.save_to_database, voice_id, cog_sub, schema_result, transcription_text, utc_time)
+        
+        return self.create_response(voice_id, schema_result, utc_time)
+
+    async def process_stream(self, websocket: WebSocket, cog_sub: str) -> None:
+        """
+        Live voice input: nhận PCM frames qua WebSocket, đẩy partial transcript về client
+        trong lúc người dùng đang nói, và chạy Bedrock extraction khi stream kết thúc.
+
+        Protocol:
+            client -> server: binary frames PCM s16le mono 16 kHz; text frame "end" để kết thúc
+            server -> client: {"type": "partial", "text": ...}
+                              {"type": "final", "transcript": ..., "result": VoiceResponse}
+                              {"type": "error", "status_code": ..., "detail": ...}
+        """
+        if not self.bedrock_extractor:
+            await websocket.send_json({"type": "error", "status_code": 503, "detail": "Bedrock Service chưa được cấu hình"})
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+            return
+
+        session = VoiceStreamSession(sample_rate=16000)
+        partial_task: Optional[asyncio.Task] = None
+
+        async def send_partial() -> None:
+            try:
+                text = await session.update()
+                if text:
+                    await websocket.send_json({"type": "partial", "text": text})
+            except Exception as e:
+                logger.warning(f"Partial transcription failed: {e}")
+
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+
+                if message.get("bytes"):
+                    session.append(message["bytes"])
+                    if session.partial_due and (partial_task is None or partial_task.done()):
+                        partial_task = asyncio.create_task(send_partial())
+                elif (message.get("text") or "").strip().lower() == "end":
+                    break
+
+            if partial_task is not None:
+                await partial_task
+
+            transcription_text = await session.update()
+            if not transcription_text:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Không thể transcribe được nội dung từ stream âm thanh"
+                )
+
+            response = await self._extract_and_save(
+                transcription_text, "stream", cog_sub, self.bedrock_extractor, "bedrock"
+            )
+            await websocket.send_json({
+                "type": "final",
+                "transcript": transcription_text,
+                "result": response.model_dump(mode="json")
+            })
+            await websocket.close()
+
+        except WebSocketDisconnect:
+            logger.info("Voice stream disconnected by client")
+        except Exception as e:
+            status_code, detail = self._error_detail(e, "bedrock")
+
+            try:
+                await websocket.send_json({"type": "error", "status_code": status_code, "detail": detail})
+                await websocket.close(
+                    code=status.WS_1008_POLICY_VIOLATION if status_code < 500 else status.WS_1011_INTERNAL_ERROR
+                )
+            except Exception:
+                pass
         finally:
-            if temp_input_path and os.path.exists(temp_input_path):
-                try:
-                    os.remove(temp_input_path)
-                except Exception:
-                    pass
+            if partial_task is not None and not partial_task.done():
+                partial_task.cancel()
 
     def save_to_database(
         self,
@@ -113,36 +326,7 @@ class VoiceService:
             return False
         
         try:
-            total_amount_doc = VoiceTotalAmount(
-                incomes=schema_result["total_amount"].incomes,
-                expenses=schema_result["total_amount"].expenses
-            )
-            
-            income_transactions = [
-                VoiceTransactionDetail(**t.model_dump()) for t in schema_result["transactions"].incomes
-            ]
-            
-            expense_transactions = [
-                VoiceTransactionDetail(**t.model_dump()) for t in schema_result["transactions"].expenses
-            ]
-            
-            transactions_doc = VoiceTransactions(
-                incomes=income_transactions,
-                expenses=expense_transactions
-            )
-            
-            voice_doc = Voice(
-                voice_id=voice_id,
-                cog_sub=cog_sub,
-                total_amount=total_amount_doc,
-                transactions=transactions_doc,
-                money_type=schema_result["money_type"],
-                utc_time=utc_time,
-                raw_transcription=transcription_text,
-                processing_time=schema_result.get("processing_time"),
-                tokens_used=schema_result.get("tokens_used")
-            )
-            
+            voice_doc = self.build_document(voice_id, cog_sub, schema_result, transcription_text, utc_time)
             voice_doc.save()
             logger.success(f"Saved voice_id={voice_id} to database")
             return True
@@ -150,6 +334,69 @@ class VoiceService:
         except Exception as e:
             logger.error(f"Failed to save to database: {e}")
             return False
+
+    def save_many_to_database(self, voice_docs: List[Voice]) -> bool:
+        """Lưu nhiều document (đã validate) vào MongoDB bằng một thao tác bulk insert"""
+        if not voice_docs:
+            return True
+
+        if not is_mongodb_connected():
+            logger.warning("MongoDB not available, skipping database save")
+            return False
+
+        try:
+            utc_now = datetime.now(timezone.utc)
+            for voice_doc in voice_docs:
+                voice_doc.updated_at = utc_now
+
+            Voice.objects.insert(voice_docs, load_bulk=False)
+            logger.success(f"Saved {len(voice_docs)} voice records to database")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to bulk save to database: {e}")
+            return False
+
+    def build_document(
+        self,
+        voice_id: str,
+        cog_sub: str,
+        schema_result: Dict[str, Any],
+        transcription_text: str,
+        utc_time: datetime
+    ) -> Voice:
+        """Tạo Voice document từ kết quả trích xuất"""
+        total_amount_doc = VoiceTotalAmount(
+            incomes=schema_result["total_amount"].incomes,
+            expenses=schema_result["total_amount"].expenses
+        )
+        
+        income_transactions = [
+            VoiceTransactionDetail(**t.model_dump()) for t in schema_result["transactions"].incomes
+        ]
+        
+        expense_transactions = [
+            VoiceTransactionDetail(**t.model_dump()) for t in schema_result["transactions"].expenses
+        ]
+        
+        transactions_doc = VoiceTransactions(
+            incomes=income_transactions,
+            expenses=expense_transactions
+        )
+        
+        return Voice(
+            voice_id=voice_id,
+            cog_sub=cog_sub,
+            total_amount=total_amount_doc,
+            transactions=transactions_doc,
+            money_type=schema_result["money_type"],
+            utc_time=utc_time,
+            raw_transcription=transcription_text,
+            processing_time=schema_result.get("processing_time"),
+            tokens_used=schema_result.get("tokens_used"),
+            cache_read_tokens=schema_result.get("cache_read_tokens"),
+            cache_write_tokens=schema_result.get("cache_write_tokens")
+        )
     
     def create_response(
         self,
@@ -165,5 +412,7 @@ class VoiceService:
             money_type=schema_result["money_type"],
             utc_time=utc_time,
             processing_time=schema_result.get("processing_time"),
-            tokens_used=schema_result.get("tokens_used")
+            tokens_used=schema_result.get("tokens_used"),
+            cache_read_tokens=schema_result.get("cache_read_tokens"),
+            cache_write_tokens=schema_result.get("cache_write_tokens")
         )
\ No newline at end of file
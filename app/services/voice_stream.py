@@ -0,0 +1,72 @@
+"""
+Voice Streaming
+
+Transcribe tăng dần trên rolling buffer cho live voice input qua WebSocket.
+"""
+import asyncio
+from typing import List
+import numpy as np
+from fastapi import HTTPException
+from app.config import settings
+from app.ai_models.voice import submit_chunked_transcription, merge_chunk_transcripts
+
+
+class VoiceStreamSession:
+    """
+    Rolling-buffer incremental transcription for one live stream.
+
+    Audio chưa chốt nằm trong `buffer` (tối đa một window ASR). Khi buffer đầy một
+    window, window đó được transcribe và chốt vào `committed`, buffer giữ lại phần
+    chồng lấn để ghép text giống như chế độ long-form.
+    """
+
+    def __init__(self, sample_rate: int = 16000):
+        self.sample_rate = sample_rate
+        self.window = int(settings.ASR_CHUNK_LENGTH_S * sample_rate)
+        self.overlap = min(int(settings.ASR_CHUNK_STRIDE_S * sample_rate), self.window // 2)
+        self.interval = int(settings.ASR_STREAM_INTERVAL_S * sample_rate)
+        self.max_samples = int(settings.ASR_STREAM_MAX_SECONDS * sample_rate)
+
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.committed: List[str] = []
+        self.total_samples = 0
+        self.samples_since_update = 0
+        self._lock = asyncio.Lock()
+
+    def append(self, frame: bytes) -> None:
+        """Thêm một frame PCM s16le mono vào buffer"""
+        usable = len(frame) - len(frame) % 2
+        samples = np.frombuffer(frame[:usable], dtype="<i2").astype(np.float32) / 32768.0
+
+        if self.total_samples + len(samples) > self.max_samples:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Stream vượt quá thời lượng tối đa {settings.ASR_STREAM_MAX_SECONDS} giây"
+            )
+
+        self.buffer = np.concatenate([self.buffer, samples])
+        self.total_samples += len(samples)
+        self.samples_since_update += len(samples)
+
+    @property
+    def partial_due(self) -> bool:
+        return self.samples_since_update >= self.interval
+
+    async def _transcribe(self, audio: np.ndarray) -> str:
+        futures = submit_chunked_transcription(audio, self.sample_rate)
+        texts = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        return merge_chunk_transcripts(list(texts))
+
+    async def update(self) -> str:
+        """Transcribe the rolling buffer and return the running transcript"""
+        async with self._lock:
+            self.samples_since_update = 0
+
+            while len(self.buffer) >= self.window:
+                window = self.buffer[:self.window]
+                self.committed.append(await self._transcribe(window))
+                # Buffer chỉ được nối thêm ở cuối nên phần đầu không đổi trong lúc chờ
+                self.buffer = self.buffer[self.window - self.overlap:]
+
+            tail_text = await self._transcribe(self.buffer) if len(self.buffer) else ""
+            return merge_chunk_transcripts(self.committed + [tail_text])
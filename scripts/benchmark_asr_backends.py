@@ -0,0 +1,137 @@
+"""
+Benchmark ASR backends: real-time factor, peak RSS và WER.
+
+So sánh pipeline PyTorch float32 với backend ONNX int8 trên một test set cố định.
+Test set là một thư mục chứa các file audio, mỗi file có transcript tham chiếu
+cùng tên với đuôi .txt (ví dụ: an_sang.m4a + an_sang.txt).
+
+Mỗi backend chạy trong một tiến trình con riêng để peak RSS không bị lẫn.
+
+Usage:
+    python -m scripts.benchmark_asr_backends --test-set data/asr_test_set [--backends pytorch onnx]
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a", ".flac", ".aac", ".ogg"}
+SAMPLE_RATE = 16000
+
+
+def normalize_words(text: str) -> List[str]:
+    return re.sub(r"[^\w\s]", " ", text.lower()).split()
+
+
+def word_errors(reference: str, hypothesis: str) -> int:
+    """Levenshtein distance giữa hai chuỗi từ"""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, start=1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, start=1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word)
+            )
+        previous = current
+    return previous[-1]
+
+
+def load_test_set(test_set: Path) -> List[Dict[str, Path]]:
+    samples = []
+    for audio_path in sorted(test_set.iterdir()):
+        reference_path = audio_path.with_suffix(".txt")
+        if audio_path.suffix.lower() in AUDIO_EXTENSIONS and reference_path.exists():
+            samples.append({"audio": audio_path, "reference": reference_path})
+    return samples
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss là KB trên Linux, bytes trên macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(backend: str, test_set: Path) -> Dict[str, float]:
+    """Chạy trong tiến trình con: load một backend và transcribe toàn bộ test set"""
+    os.environ["ASR_BACKEND"] = backend
+    os.environ["TRANSCRIPT_CACHE_ENABLED"] = "False"
+
+    from app.services.utils import Utils
+    from app.ai_models.voice import get_transcriber, transcribe_audio_file
+
+    load_start = time.perf_counter()
+    get_transcriber()
+    load_time = time.perf_counter() - load_start
+
+    samples = load_test_set(test_set)
+    audio_seconds = 0.0
+    asr_seconds = 0.0
+    errors = 0
+    reference_words = 0
+
+    for sample in samples:
+        audio = Utils.decode_audio_bytes(sample["audio"].read_bytes(), sample_rate=SAMPLE_RATE)
+        reference = sample["reference"].read_text(encoding="utf-8")
+
+        start = time.perf_counter()
+        hypothesis = transcribe_audio_file(audio, sample_rate=SAMPLE_RATE)["text"]
+        asr_seconds += time.perf_counter() - start
+
+        audio_seconds += len(audio) / SAMPLE_RATE
+        errors += word_errors(reference, hypothesis)
+        reference_words += len(normalize_words(reference))
+
+    return {
+        "backend": backend,
+        "files": len(samples),
+        "audio_seconds": round(audio_seconds, 2),
+        "load_seconds": round(load_time, 2),
+        "asr_seconds": round(asr_seconds, 2),
+        "rtf": round(asr_seconds / audio_seconds, 4) if audio_seconds else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "wer": round(errors / reference_words, 4) if reference_words else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark PhoWhisper ASR backends")
+    parser.add_argument("--test-set", type=Path, required=True, help="Thư mục audio + transcript .txt")
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "onnx"], choices=["pytorch", "onnx"])
+    parser.add_argument("--worker", choices=["pytorch", "onnx"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.test_set)))
+        return
+
+    if not load_test_set(args.test_set):
+        parser.error(f"Không tìm thấy cặp audio/.txt nào trong {args.test_set}")
+
+    results = []
+    for backend in args.backends:
+        process = subprocess.run(
+            [sys.executable, "-m", "scripts.benchmark_asr_backends", "--test-set", str(args.test_set), "--worker", backend],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        results.append(json.loads(process.stdout.strip().splitlines()[-1]))
+
+    header = ["backend", "files", "audio_seconds", "asr_seconds", "rtf", "peak_rss_mb", "wer", "load_seconds"]
+    print("| " + " | ".join(header) + " |")
+    print("|" + "---|" * len(header))
+    for result in results:
+        print("| " + " | ".join(str(result[key]) for key in header) + " |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark bill extraction modes: OCR (EasyOCR + text prompt) so với vision (gửi ảnh trực tiếp).
+
+Dùng một Bedrock stand-in chạy local thay cho bedrock-runtime nên không tốn phí và kết quả
+lặp lại được. Stand-in ước lượng input token (text ~4 ký tự/token, ảnh ~width*height/750
+theo tài liệu Anthropic) và giả lập latency = base + mỗi input token + mỗi output token.
+Chạy với --real-bedrock để gọi Bedrock thật thay cho stand-in.
+
+Với mỗi ảnh và mỗi mode, đo latency end-to-end (decode -> OCR/nén ảnh -> Bedrock),
+kích thước payload gửi Bedrock và số input token.
+
+Usage:
+    python -m scripts.benchmark_bill_extraction_modes --samples data/bill_samples [--modes ocr vision] [--real-bedrock]
+"""
+import argparse
+import base64
+import io
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+_FAKE_RESPONSE = {
+    "total_amount": {"expenses": 125000.0},
+    "transactions": {"expenses": [{"description": "Cà phê sữa đá", "amount": 125000.0, "quantity": 1.0}]},
+    "money_type": "VND"
+}
+
+
+class _Body:
+    def __init__(self, payload: Dict[str, Any]):
+        self._raw = json.dumps(payload).encode("utf-8")
+
+    def read(self) -> bytes:
+        return self._raw
+
+
+class LocalBedrockStandIn:
+    """Giả lập bedrock-runtime.invoke_model cho Claude Messages API"""
+
+    def __init__(self, base_latency_s: float, input_token_ms: float, output_token_ms: float):
+        self.base_latency_s = base_latency_s
+        self.input_token_ms = input_token_ms
+        self.output_token_ms = output_token_ms
+        self.last_payload_bytes = 0
+        self.last_input_tokens = 0
+
+    @staticmethod
+    def _count_input_tokens(messages: List[Dict[str, Any]]) -> int:
+        from PIL import Image
+
+        tokens = 0
+        for message in messages:
+            content = message["content"]
+            blocks = [{"type": "text", "text": content}] if isinstance(content, str) else content
+            for block in blocks:
+                if block["type"] == "text":
+                    tokens += max(1, len(block["text"]) // 4)
+                elif block["type"] == "image":
+                    image = Image.open(io.BytesIO(base64.b64decode(block["source"]["data"])))
+                    tokens += image.width * image.height // 750
+        return tokens
+
+    def invoke_model(self, body: str, modelId: str, accept: str, contentType: str) -> Dict[str, Any]:
+        request = json.loads(body)
+        output_text = json.dumps(_FAKE_RESPONSE, ensure_ascii=False)
+        system = [{"role": "system", "content": request.get("system", [])}]
+        input_tokens = self._count_input_tokens(system + request["messages"])
+        output_tokens = max(1, len(output_text) // 4)
+
+        self.last_payload_bytes = len(body.encode("utf-8"))
+        self.last_input_tokens = input_tokens
+        time.sleep(
+            self.base_latency_s
+            + input_tokens * self.input_token_ms / 1000
+            + output_tokens * self.output_token_ms / 1000
+        )
+        return {"body": _Body({
+            "content": [{"type": "text", "text": output_text}],
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens}
+        })}
+
+
+class _RecordingClient:
+    """Bọc client Bedrock thật để ghi lại payload size và input token"""
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.last_payload_bytes = 0
+        self.last_input_tokens = 0
+
+    def invoke_model(self, body: str, **kwargs) -> Dict[str, Any]:
+        self.last_payload_bytes = len(body.encode("utf-8"))
+        response = self.client.invoke_model(body=body, **kwargs)
+        payload = json.loads(response["body"].read())
+        self.last_input_tokens = payload.get("usage", {}).get("input_tokens", 0)
+        return {"body": _Body(payload)}
+
+
+def run_mode(mode: str, images: List[Path], extractor: Any) -> Dict[str, Any]:
+    from app.ai_models.bill import decode_image, encode_image_for_vision, extract_bill_using_ocr_model
+
+    latencies, payloads, tokens = [], [], []
+    for image_path in images:
+        content = image_path.read_bytes()
+
+        start = time.perf_counter()
+        image = decode_image(content)
+        if mode == "vision":
+            extractor.extract_image_to_schema(encode_image_for_vision(image))
+        else:
+            extractor.extract_to_schema(extract_bill_using_ocr_model(image))
+        latencies.append(time.perf_counter() - start)
+
+        payloads.append(extractor.transport.client.last_payload_bytes)
+        tokens.append(extractor.transport.client.last_input_tokens)
+
+    count = len(images)
+    return {
+        "mode": mode,
+        "images": count,
+        "avg_latency_s": round(sum(latencies) / count, 3),
+        "max_latency_s": round(max(latencies), 3),
+        "avg_payload_kb": round(sum(payloads) / count / 1024, 1),
+        "avg_input_tokens": round(sum(tokens) / count),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark OCR vs vision bill extraction")
+    parser.add_argument("--samples", type=Path, required=True, help="Thư mục ảnh hóa đơn")
+    parser.add_argument("--modes", nargs="+", default=["ocr", "vision"], choices=["ocr", "vision"])
+    parser.add_argument("--real-bedrock", action="store_true", help="Gọi Bedrock thật thay cho stand-in")
+    parser.add_argument("--base-latency", type=float, default=0.6, help="Stand-in: latency cố định (giây)")
+    parser.add_argument("--input-token-ms", type=float, default=0.15, help="Stand-in: ms mỗi input token")
+    parser.add_argument("--output-token-ms", type=float, default=12.0, help="Stand-in: ms mỗi output token")
+    args = parser.parse_args()
+
+    images = sorted(p for p in args.samples.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not images:
+        parser.error(f"Không tìm thấy ảnh nào trong {args.samples}")
+
+    from app.services.bedrock_extractor.bill import BedrockBillExtractor
+    from app.services.bedrock_extractor.config import load_config
+
+    extractor = BedrockBillExtractor(load_config())
+    if args.real_bedrock:
+        extractor.transport.client = _RecordingClient(extractor.transport.client)
+    else:
+        extractor.transport.client = LocalBedrockStandIn(args.base_latency, args.input_token_ms, args.output_token_ms)
+
+    # Warm-up để thời gian load model OCR không bị tính vào ảnh đầu tiên
+    from app.ai_models.bill import decode_image, extract_bill_using_ocr_model
+    extract_bill_using_ocr_model(decode_image(images[0].read_bytes()))
+
+    results = [run_mode(mode, images, extractor) for mode in args.modes]
+
+    header = ["mode", "images", "avg_latency_s", "max_latency_s", "avg_payload_kb", "avg_input_tokens"]
+    print("| " + " | ".join(header) + " |")
+    print("|" + "---|" * len(header))
+    for result in results:
+        print("| " + " | ".join(str(result[key]) for key in header) + " |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark OCR preprocessing profiles: thời gian OCR và độ chính xác trích xuất.
+
+Sample set là một thư mục chứa ảnh hóa đơn, mỗi ảnh có:
+    - <tên>.txt : nội dung text tham chiếu của hóa đơn (bắt buộc)
+    - <tên>.json: kết quả trích xuất mong đợi, ví dụ {"total_amount": 125000} (tùy chọn,
+      chỉ dùng khi chạy với --extract)
+
+Độ chính xác OCR được đo bằng word recall (tỉ lệ từ tham chiếu xuất hiện trong output OCR)
+và amount recall (tỉ lệ số tiền/số lượng tham chiếu đọc đúng). Với --extract, mỗi profile
+còn gọi Bedrock và so sánh total_amount với file .json.
+
+Usage:
+    python -m scripts.benchmark_ocr_profiles --samples data/bill_samples [--profiles fast balanced quality] [--extract]
+"""
+import argparse
+import json
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+PROFILE_NAMES = ["none", "fast", "balanced", "quality"]
+
+
+def normalize_words(text: str) -> List[str]:
+    return re.sub(r"[^\w\s.,]", " ", text.lower()).split()
+
+
+def extract_amounts(text: str) -> List[str]:
+    """Các số (bỏ dấu phân cách nghìn) xuất hiện trong text"""
+    return [re.sub(r"[.,]", "", match) for match in re.findall(r"\d[\d.,]*\d|\d", text)]
+
+
+def recall(reference: List[str], hypothesis: List[str]) -> float:
+    if not reference:
+        return 1.0
+    matched = sum((Counter(reference) & Counter(hypothesis)).values())
+    return matched / len(reference)
+
+
+def load_samples(samples_dir: Path) -> List[Dict[str, Path]]:
+    samples = []
+    for image_path in sorted(samples_dir.iterdir()):
+        reference_path = image_path.with_suffix(".txt")
+        if image_path.suffix.lower() in IMAGE_EXTENSIONS and reference_path.exists():
+            samples.append({
+                "image": image_path,
+                "reference": reference_path,
+                "expected": image_path.with_suffix(".json"),
+            })
+    return samples
+
+
+def run_profile(profile: str, samples: List[Dict[str, Path]], extract: bool) -> Dict[str, float]:
+    from app.ai_models.bill import decode_image, extract_bill_using_ocr_model
+
+    extractor = None
+    if extract:
+        from app.services.bedrock_extractor.service import get_bedrock_service
+        extractor = get_bedrock_service().bill_extractor
+
+    ocr_seconds = 0.0
+    word_recalls, amount_recalls = [], []
+    extracted, correct_totals = 0, 0
+
+    for sample in samples:
+        image = decode_image(sample["image"].read_bytes())
+        reference = sample["reference"].read_text(encoding="utf-8")
+
+        start = time.perf_counter()
+        ocr_result = extract_bill_using_ocr_model(image, profile=profile)
+        ocr_seconds += time.perf_counter() - start
+
+        hypothesis = "\n".join(item["text"] for item in ocr_result)
+        word_recalls.append(recall(normalize_words(reference), normalize_words(hypothesis)))
+        amount_recalls.append(recall(extract_amounts(reference), extract_amounts(hypothesis)))
+
+        if extractor is not None and sample["expected"].exists():
+            expected = json.loads(sample["expected"].read_text(encoding="utf-8"))
+            extracted += 1
+            try:
+                result = extractor.extract_to_schema(ocr_result)
+                if abs(result["total_amount"].expenses - float(expected["total_amount"])) < 0.5:
+                    correct_totals += 1
+            except ValueError:
+                pass
+
+    files = len(samples)
+    return {
+        "profile": profile,
+        "files": files,
+        "ocr_seconds": round(ocr_seconds, 2),
+        "ms_per_image": round(1000 * ocr_seconds / files, 1) if files else 0.0,
+        "word_recall": round(sum(word_recalls) / files, 4) if files else 0.0,
+        "amount_recall": round(sum(amount_recalls) / files, 4) if files else 0.0,
+        "total_accuracy": round(correct_totals / extracted, 4) if extracted else "-",
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark OCR preprocessing profiles")
+    parser.add_argument("--samples", type=Path, required=True, help="Thư mục ảnh hóa đơn + text .txt")
+    parser.add_argument("--profiles", nargs="+", default=PROFILE_NAMES, choices=PROFILE_NAMES)
+    parser.add_argument("--extract", action="store_true", help="Gọi Bedrock và so sánh total_amount với file .json")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    if not samples:
+        parser.error(f"Không tìm thấy cặp ảnh/.txt nào trong {args.samples}")
+
+    # Warm-up để thời gian load model không bị tính vào profile đầu tiên
+    from app.ai_models.bill import decode_image, extract_bill_using_ocr_model
+    extract_bill_using_ocr_model(decode_image(samples[0]["image"].read_bytes()), profile="fast")
+
+    results = [run_profile(profile, samples, args.extract) for profile in args.profiles]
+
+    header = ["profile", "files", "ocr_seconds", "ms_per_image", "word_recall", "amount_recall", "total_accuracy"]
+    print("| " + " | ".join(header) + " |")
+    print("|" + "---|" * len(header))
+    for result in results:
+        print("| " + " | ".join(str(result[key]) for key in header) + " |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Parity check: bill classifier ONNX int8 so với PyTorch float32.
+
+So sánh xác suất p_bill của hai backend trên cùng một batch ảnh (ảnh mẫu nếu có, cộng thêm
+ảnh nhiễu ngẫu nhiên), báo sai lệch tuyệt đối lớn nhất, tỉ lệ quyết định is_bill trùng nhau
+và latency mỗi ảnh. Exit code khác 0 nếu vượt ngưỡng cho phép.
+
+Usage:
+    python -m scripts.check_bill_classifier_parity [--images DIR] [--max-abs-diff 0.05] [--min-agreement 0.99]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List
+import numpy as np
+from app.config import settings
+from app.ai_models.bill import decode_image, predict_bill_probabilities
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def load_images(images_dir: Path, random_images: int) -> List[np.ndarray]:
+    images = []
+    if images_dir:
+        images = [
+            decode_image(path.read_bytes())
+            for path in sorted(images_dir.iterdir())
+            if path.suffix.lower() in IMAGE_EXTENSIONS
+        ]
+    rng = np.random.default_rng(0)
+    images += [rng.integers(0, 256, size=(480, 360, 3), dtype=np.uint8) for _ in range(random_images)]
+    return images
+
+
+def timed_probabilities(images: List[np.ndarray], backend: str, batch_size: int):
+    predict_bill_probabilities(images[:1], backend)  # warm-up
+    probabilities = []
+    start = time.perf_counter()
+    for offset in range(0, len(images), batch_size):
+        probabilities += predict_bill_probabilities(images[offset:offset + batch_size], backend)
+    return np.array(probabilities), (time.perf_counter() - start) * 1000 / len(images)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check ONNX int8 vs PyTorch bill classifier parity")
+    parser.add_argument("--images", type=Path, help="Thư mục ảnh mẫu")
+    parser.add_argument("--random-images", type=int, default=16, help="Số ảnh nhiễu ngẫu nhiên thêm vào")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-abs-diff", type=float, default=0.05)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.random_images)
+    if not images:
+        parser.error("Không có ảnh nào để so sánh")
+
+    reference, pytorch_ms = timed_probabilities(images, "pytorch", args.batch_size)
+    candidate, onnx_ms = timed_probabilities(images, "onnx", args.batch_size)
+
+    threshold = settings.BILL_CLASSIFIER_THRESHOLD
+    max_abs_diff = float(np.max(np.abs(reference - candidate)))
+    agreement = float(np.mean((reference >= threshold) == (candidate >= threshold)))
+
+    print(f"images:            {len(images)}")
+    print(f"max |p diff|:      {max_abs_diff:.4f} (limit {args.max_abs_diff})")
+    print(f"decision agreement: {agreement:.4f} (limit {args.min_agreement})")
+    print(f"pytorch ms/image:  {pytorch_ms:.2f}")
+    print(f"onnx ms/image:     {onnx_ms:.2f}")
+
+    if max_abs_diff > args.max_abs_diff or agreement < args.min_agreement:
+        print("PARITY FAILED")
+        sys.exit(1)
+    print("PARITY OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Export bill classifier sang ONNX int8 cho backend BILL_CLASSIFIER_BACKEND=onnx.
+
+--calibration-dir (thư mục ảnh hóa đơn và ảnh không phải hóa đơn) là bắt buộc: model được
+lượng tử hóa static (QDQ, per-channel). Script từ chối export nếu checkpoint PyTorch chưa load.
+
+Usage:
+    python -m scripts.export_bill_classifier_onnx --calibration-dir DIR [--output FILE] [--batch-size 8]
+"""
+import argparse
+from pathlib import Path
+from typing import Iterator, List
+import numpy as np
+import torch
+from app.config import settings
+from app.ai_models.bill import (
+    CLASSIFIER_INPUT_SIZE,
+    _checkpoint_loaded,
+    _load_classifier_image,
+    decode_image,
+    loaded_model,
+    transform_inference
+)
+from app.ai_models.bill_onnx import export_quantized_classifier
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def calibration_batches(images: List[Path], batch_size: int) -> Iterator[np.ndarray]:
+    for start in range(0, len(images), batch_size):
+        tensors = [
+            transform_inference(_load_classifier_image(decode_image(path.read_bytes())))
+            for path in images[start:start + batch_size]
+        ]
+        yield torch.stack(tensors).numpy()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export the bill classifier to int8 ONNX")
+    parser.add_argument("--output", default=settings.BILL_CLASSIFIER_ONNX_PATH, help="File ONNX đầu ra")
+    parser.add_argument("--calibration-dir", type=Path, required=True, help="Thư mục ảnh calibration cho static quantization")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    if not _checkpoint_loaded:
+        parser.error(f"Checkpoint {settings.MODEL_BILL_FILE_NAME} chưa load được, không export trọng số ngẫu nhiên")
+
+    images = sorted(p for p in args.calibration_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not images:
+        parser.error(f"Không tìm thấy ảnh nào trong {args.calibration_dir}")
+    batches = calibration_batches(images, args.batch_size)
+
+    export_quantized_classifier(loaded_model, args.output, CLASSIFIER_INPUT_SIZE, batches)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+Export PhoWhisper sang ONNX int8 cho backend ASR_BACKEND=onnx.
+
+Usage:
+    python -m scripts.export_phowhisper_onnx [--model vinai/PhoWhisper-small] [--output DIR]
+"""
+import argparse
+from app.config import settings
+from app.ai_models.voice import DEFAULT_MODEL_NAME
+from app.ai_models.voice_onnx import export_quantized_whisper
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export PhoWhisper to int8 ONNX")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="HF model id")
+    parser.add_argument("--output", default=settings.ASR_ONNX_DIR, help="Thư mục lưu model ONNX")
+    args = parser.parse_args()
+
+    export_quantized_whisper(args.model, args.output)
+
+
+if __name__ == "__main__":
+    main()
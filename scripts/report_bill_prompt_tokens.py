@@ -0,0 +1,108 @@
+"""
+Báo cáo mức giảm token input Bedrock khi dùng layout stage cho OCR hóa đơn.
+
+Với mỗi ảnh trong sample set, OCR chạy một lần rồi dựng prompt theo hai cách:
+    - legacy: nối fragment EasyOCR bằng newline theo thứ tự detection
+    - layout: gom hàng theo trục y, sắp trái sang phải, bỏ fragment confidence thấp
+Mặc định số token được ước lượng offline; với --bedrock, mỗi prompt được gửi thật và báo
+input_tokens cùng latency từ Bedrock.
+
+Usage:
+    python -m scripts.report_bill_prompt_tokens --samples data/bill_samples [--min-confidence 0.3] [--bedrock]
+"""
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước lượng token kiểu BPE: mỗi từ/số ~1 token/4 ký tự, mỗi dấu câu 1 token"""
+    return sum(max(1, (len(piece) + 3) // 4) for piece in re.findall(r"\w+|[^\w\s]", text))
+
+
+def legacy_text(ocr_result: List[Dict]) -> str:
+    return "\n".join(entry["text"] for entry in ocr_result)
+
+
+def bedrock_usage(extractor, text: str) -> Tuple[int, float]:
+    """Gửi prompt thật, trả về (input_tokens, latency giây)"""
+    body = json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 4096,
+        "temperature": 0.0,
+        "system": extractor.system_prompt,
+        "messages": [{"role": "user", "content": f"Transcript:\n{text}"}]
+    })
+    start = time.perf_counter()
+    response = extractor.transport.client.invoke_model(
+        body=body, modelId=extractor.model_id, accept="application/json", contentType="application/json"
+    )
+    latency = time.perf_counter() - start
+    usage = json.loads(response["body"].read()).get("usage", {})
+    return usage.get("input_tokens", 0), latency
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report Bedrock prompt token reduction from the OCR layout stage")
+    parser.add_argument("--samples", type=Path, required=True, help="Thư mục ảnh hóa đơn")
+    parser.add_argument("--min-confidence", type=float, default=None, help="Mặc định OCR_MIN_CONFIDENCE")
+    parser.add_argument("--bedrock", action="store_true", help="Đo input_tokens và latency thật qua Bedrock")
+    args = parser.parse_args()
+
+    from app.config import settings
+    from app.ai_models.bill import decode_image, extract_bill_using_ocr_model
+    from app.ai_models.bill_layout import ocr_to_layout_text
+
+    images = sorted(p for p in args.samples.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not images:
+        parser.error(f"Không tìm thấy ảnh nào trong {args.samples}")
+    min_confidence = settings.OCR_MIN_CONFIDENCE if args.min_confidence is None else args.min_confidence
+
+    extractor = None
+    if args.bedrock:
+        from app.services.bedrock_extractor.service import get_bedrock_service
+        extractor = get_bedrock_service().bill_extractor
+
+    header = ["image", "legacy_tokens", "layout_tokens", "reduction"]
+    if extractor is not None:
+        header += ["legacy_latency_s", "layout_latency_s"]
+    print("| " + " | ".join(header) + " |")
+    print("|" + "---|" * len(header))
+
+    totals = {"legacy": 0, "layout": 0}
+    for image_path in images:
+        ocr_result = extract_bill_using_ocr_model(decode_image(image_path.read_bytes()))
+        texts = {
+            "legacy": legacy_text(ocr_result),
+            "layout": ocr_to_layout_text(ocr_result, min_confidence),
+        }
+
+        row = [image_path.name]
+        if extractor is None:
+            tokens = {name: estimate_tokens(text) for name, text in texts.items()}
+            latencies = {}
+        else:
+            measured = {name: bedrock_usage(extractor, text) for name, text in texts.items()}
+            tokens = {name: value[0] for name, value in measured.items()}
+            latencies = {name: round(value[1], 2) for name, value in measured.items()}
+
+        totals["legacy"] += tokens["legacy"]
+        totals["layout"] += tokens["layout"]
+        reduction = 1 - tokens["layout"] / tokens["legacy"] if tokens["legacy"] else 0.0
+        row += [tokens["legacy"], tokens["layout"], f"{reduction:.1%}"]
+        if latencies:
+            row += [latencies["legacy"], latencies["layout"]]
+        print("| " + " | ".join(str(value) for value in row) + " |")
+
+    overall = 1 - totals["layout"] / totals["legacy"] if totals["legacy"] else 0.0
+    source = "Bedrock input_tokens (gồm prompt template)" if extractor else "ước lượng offline (chỉ phần OCR)"
+    print(f"\nTổng: {totals['legacy']} -> {totals['layout']} tokens ({overall:.1%} giảm), {source}")
+
+
+if __name__ == "__main__":
+    main()